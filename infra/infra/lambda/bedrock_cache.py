@@ -0,0 +1,73 @@
+"""
+Bedrock cache — réponses Converse mises en cache dans PrenCacheTable.
+
+Clé : sha256 du prompt rendu + BEDROCK_MODEL_ID + inferenceConfig (JSON trié). Même
+texte, même modèle, mêmes paramètres => même réponse réutilisée : retries Step
+Functions, ré-ingestions d'un corpus, pages de boilerplate identiques d'un document
+à l'autre. Changer le prompt, le modèle ou la température change la clé.
+
+Item : {"pk": "BEDROCK#<sha256>", "output": <texte brut>, "usage": {...},
+        "model_id": ..., "created_at": ..., "expires_at": <epoch, attribut TTL>}
+
+Seules les réponses parsées avec succès sont écrites (voir bedrock_handler).
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger()
+
+CACHE_TABLE = os.environ.get("BEDROCK_CACHE_TABLE", "")
+CACHE_TTL_SECONDS = float(os.environ.get("BEDROCK_CACHE_TTL_DAYS", "30")) * 86400
+
+_table = None
+
+
+def _get_table():
+    global _table
+    if _table is None and CACHE_TABLE:
+        import boto3
+        _table = boto3.resource("dynamodb").Table(CACHE_TABLE)
+    return _table
+
+
+def cache_key(prompt: str, model_id: str, inference_config: dict) -> str:
+    material = json.dumps({"model": model_id, "config": inference_config, "prompt": prompt},
+                          sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return "BEDROCK#" + hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def get(key: str):
+    """Réponse en cache {"output", "usage"} ou None (absente, expirée, cache désactivé ou en erreur)."""
+    table = _get_table()
+    if table is None:
+        return None
+    try:
+        item = table.get_item(Key={"pk": key}).get("Item")
+    except Exception as e:
+        logger.warning(f"Bedrock cache read failed: {e}")
+        return None
+    # Le TTL DynamoDB supprime en différé : un item expiré peut encore être lu
+    if not item or float(item.get("expires_at", 0)) <= time.time():
+        return None
+    return {"output": item["output"], "usage": json.loads(item.get("usage") or "{}")}
+
+
+def put(key: str, output: str, usage: dict, model_id: str):
+    table = _get_table()
+    if table is None:
+        return
+    try:
+        table.put_item(Item={
+            "pk": key,
+            "output": output,
+            "usage": json.dumps(usage or {}),
+            "model_id": model_id,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "expires_at": int(time.time() + CACHE_TTL_SECONDS),
+        })
+    except Exception as e:
+        logger.warning(f"Bedrock cache write failed: {e}")
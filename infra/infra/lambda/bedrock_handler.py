@@ -1,18 +1,40 @@
 """
 Bedrock handler — structure le texte extrait par Textract en signaux JSON normalisés.
-Utilise Amazon Nova Micro (eu.amazon.nova-micro-v1:0) via l'API Converse.
+Utilise Amazon Nova Micro (eu.amazon.nova-micro-v1:0) via l'API ConverseStream.
+
+La réponse est parsée au fil du stream (nova_stream) : chaque signal est validé et
+préparé pour l'écriture (résolution IRIS comprise) dès qu'il est complet, et un
+stream qui ne peut plus donner de JSON valide est coupé puis relancé une fois
+(BEDROCK_JSON_ATTEMPTS) sans attendre la fin de la réponse. Les items ne sont écrits
+qu'une fois le document complet et valide.
 """
+import functools
 import json
 import logging
 import os
+import time
 import boto3
 from datetime import datetime
 
+import bedrock_cache
+import cities
+import metrics
+import nova_stream
+import profiling
+import rate_limiter
+import relevance
+import reqlog
+from gazetteer import get_gazetteer
+from tracing import Trace
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 SIGNALS_TABLE = os.environ.get("SIGNALS_TABLE", "")
 BEDROCK_MODEL_ID = os.environ.get("BEDROCK_MODEL_ID", "eu.amazon.nova-micro-v1:0")
+INFERENCE_CONFIG = {"maxTokens": 2000, "temperature": 0.1}
+JSON_ATTEMPTS = int(os.environ.get("BEDROCK_JSON_ATTEMPTS", "2"))
+MAX_SIGNALS = 10
 
 bedrock = boto3.client("bedrock-runtime", region_name="eu-west-3")
 dynamodb = boto3.resource("dynamodb")
@@ -32,7 +54,8 @@ Format attendu :
       "description": "description courte du signal en francais",
       "impact": "positive|negative|neutral",
       "confidence": 0.0,
-      "location_hint": "quartier ou zone mentionne si disponible"
+      "location_hint": "quartier ou zone mentionne si disponible",
+      "evidence_span": "citation exacte du texte justifiant le signal (max 200 caracteres)"
     }}
   ],
   "summary": "resume en 1-2 phrases du document",
@@ -44,17 +67,129 @@ Texte a analyser :
 """
 
 
-def _parse_nova_json(raw: str) -> dict:
-    """Nettoie et parse la sortie JSON de Nova (retire les backticks si présents)."""
-    clean = raw.strip()
-    if clean.startswith("```"):
-        lines = clean.split("\n")
-        clean = "\n".join(lines[1:]) if len(lines) > 1 else clean[3:]
-    if clean.endswith("```"):
-        clean = clean[:-3]
-    return json.loads(clean.strip())
+def _store_trace(trace: Trace):
+    """Persiste la trace complète du document (dernière étape du pipeline) : pk=DOC#, sk=TRACE."""
+    if not signals_table or not trace.doc_id:
+        return
+    try:
+        signals_table.put_item(Item={
+            "pk": f"DOC#{trace.doc_id}",
+            "sk": "TRACE",
+            "run_id": trace.run_id or "",
+            "trace": json.dumps(trace.to_dict()),
+            "stage_totals": json.dumps(trace.stage_totals()),
+            "created_at": datetime.utcnow().isoformat()
+        })
+    except Exception as e:
+        logger.error(f"Trace write error: {e}")
+
+
+class _ItemBuilder:
+    """Items DynamoDB préparés au fil des signaux (IRIS résolu via le gazetteer de la ville, sans géocodage externe)."""
+
+    def __init__(self, s3_key: str, doc_type: str, city: str, timestamp: str):
+        self.s3_key, self.doc_type, self.city, self.timestamp = s3_key, doc_type, city, timestamp
+        self.items: list = []
+        self._gaz = False  # chargé au premier signal (une seule tentative par document)
+
+    def add(self, signal: dict):
+        if len(self.items) >= MAX_SIGNALS:
+            return
+        item = {
+            "pk": f"DOC#{self.s3_key}",
+            "sk": f"SIGNAL#{len(self.items):03d}",
+            "doc_type": self.doc_type,
+            "city": self.city,
+            "city_key": cities.slug(self.city),
+            "signal_type": signal["type"],
+            "description": signal["description"],
+            "impact": signal["impact"],
+            "confidence": str(signal["confidence"]),
+            "location_hint": signal["location_hint"],
+            "evidence_span": signal["evidence_span"][:300],
+            "created_at": self.timestamp
+        }
+        with metrics.timer("GazetteerLatency"):
+            if self._gaz is False:
+                self._gaz = get_gazetteer(self.city)
+            match = self._gaz.resolve_many([signal["location_hint"]])[0] if self._gaz else None
+        if match:
+            item["iris_id"] = match["iris_id"]
+            item["iris_match_score"] = str(match["score"])
+        self.items.append(item)
+
+    def add_all(self, signals: list):
+        for signal in signals:
+            self.add(signal)
+
+
+def _stream_once(prompt: str, attempt: dict, new_builder, started: float, first_signal: list):
+    """
+    Un appel ConverseStream. attempt["stream"] / attempt["builder"] sont recréés à chaque
+    appel (retry sur throttling compris) et restent lisibles si le stream est coupé.
+    """
+    attempt.update(stream=nova_stream.SignalStream(), builder=new_builder(), usage={})
+    response = bedrock.converse_stream(
+        modelId=BEDROCK_MODEL_ID,
+        messages=[{"role": "user", "content": [{"text": prompt}]}],
+        inferenceConfig=INFERENCE_CONFIG
+    )
+    events = response["stream"]
+    try:
+        for event in events:
+            if "contentBlockDelta" in event:
+                signals = attempt["stream"].feed(event["contentBlockDelta"]["delta"].get("text", ""))
+                if signals and not first_signal:
+                    first_signal.append((time.perf_counter() - started) * 1000)
+                attempt["builder"].add_all(signals)
+            elif "metadata" in event:
+                attempt["usage"] = event["metadata"].get("usage", {})
+    except nova_stream.StreamInvalid:
+        # Couper la connexion : les tokens restants ne seraient pas exploitables
+        close = getattr(events, "close", None)
+        if close:
+            close()
+        raise
+    return attempt["stream"].result()
 
 
+def _structure_streaming(prompt: str, context, trace: Trace, new_builder):
+    """
+    Jusqu'à JSON_ATTEMPTS streams ; retourne (document, stream, builder, usage). Le
+    document vaut None si toutes les tentatives ont produit une sortie invalide.
+    """
+    started = time.perf_counter()
+    first_signal: list = []
+    usage = {"inputTokens": 0, "outputTokens": 0}
+    structured, attempt = None, {}
+    for n in range(1, JSON_ATTEMPTS + 1):
+        attempt = {}
+        try:
+            with metrics.timer("BedrockLatency"), trace.span("bedrock_chunk", chunk=0, attempt=n):
+                # Débit partagé entre workers + retry jittered sur ThrottlingException
+                structured = rate_limiter.call(
+                    "bedrock", _stream_once, prompt, attempt, new_builder, started, first_signal,
+                    deadline=rate_limiter.deadline_for(context)
+                )
+        except nova_stream.StreamInvalid as e:
+            metrics.put("BedrockStreamAbort", 1, "Count")
+            reqlog.note(f"Stream attempt {n} aborted: {e}")
+            logger.warning(f"Invalid Nova output (attempt {n}/{JSON_ATTEMPTS}): {e}")
+        for k in usage:
+            usage[k] += attempt.get("usage", {}).get(k, 0)
+        if structured is not None:
+            break
+
+    if first_signal:
+        metrics.put("BedrockFirstSignalMs", round(first_signal[0], 3))
+    metrics.put("TokensIn", usage["inputTokens"], "Count")
+    metrics.put("TokensOut", usage["outputTokens"], "Count")
+    return structured, attempt.get("stream") or nova_stream.SignalStream(), attempt.get("builder") or new_builder(), usage
+
+
+@metrics.instrument("bedrock")
+@reqlog.logged("bedrock")
+@profiling.profiled("bedrock")
 def handler(event, context):
     """
     Input event (depuis textract_handler output) :
@@ -67,8 +202,6 @@ def handler(event, context):
       "extraction_method": "textract"
     }
     """
-    logger.info("Bedrock structuring request")
-
     # Accepte l'event directement ou encapsulé dans body (Step Functions)
     if "body" in event and isinstance(event["body"], str):
         payload = json.loads(event["body"])
@@ -83,56 +216,73 @@ def handler(event, context):
     if not extracted_text:
         return {"statusCode": 400, "body": json.dumps({"error": "extracted_text required"})}
 
+    trace = Trace.from_payload(payload, s3_key)
+
+    # Texte déjà compacté par textract_handler ; une invocation directe passe ici par le même filtre
+    if "relevance" not in payload:
+        with trace.span("relevance"):
+            extracted_text, _ = relevance.compact_text(extracted_text)
+
     prompt = STRUCTURING_PROMPT.format(
         doc_type=doc_type,
         city=city,
-        text=extracted_text[:5000]
+        text=extracted_text
     )
 
-    # Appel Nova via API Converse
-    try:
-        response = bedrock.converse(
-            modelId=BEDROCK_MODEL_ID,
-            messages=[{"role": "user", "content": [{"text": prompt}]}],
-            inferenceConfig={"maxTokens": 2000, "temperature": 0.1}
-        )
-        raw_output = response["output"]["message"]["content"][0]["text"]
-        usage = response.get("usage", {})
-        logger.info(f"Nova tokens: input={usage.get('inputTokens')} output={usage.get('outputTokens')}")
-    except Exception as e:
-        logger.error(f"Bedrock error: {e}")
-        return {"statusCode": 500, "body": json.dumps({"error": f"Bedrock failed: {e}"})}
+    # Cache de réponses (prompt rendu + modèle + inferenceConfig) avant tout appel Nova
+    cache_key = bedrock_cache.cache_key(prompt, BEDROCK_MODEL_ID, INFERENCE_CONFIG)
+    with trace.span("bedrock_cache"):
+        cached = bedrock_cache.get(cache_key)
+    metrics.put("BedrockCacheHit" if cached else "BedrockCacheMiss", 1, "Count")
 
-    # Parser le JSON
-    try:
-        structured = _parse_nova_json(raw_output)
-    except json.JSONDecodeError:
-        logger.warning(f"JSON parse failed: {raw_output[:300]}")
-        structured = {"signals": [], "summary": "Parsing failed", "signal_count": 0, "raw": raw_output[:500]}
+    new_builder = functools.partial(_ItemBuilder, s3_key, doc_type, city, datetime.utcnow().isoformat())
+    builder = new_builder()
+    structured, stream = None, None
+    if cached:
+        # Seules des sorties valides sont en cache : même chemin de validation que le stream
+        stream = nova_stream.SignalStream()
+        try:
+            builder.add_all(stream.feed(cached["output"]))
+            structured = stream.result()
+        except nova_stream.StreamInvalid:
+            builder = new_builder()
+    cache_hit = structured is not None
 
-    # Stocker les signaux dans DynamoDB
+    if structured is None:
+        try:
+            structured, stream, builder, usage = _structure_streaming(prompt, context, trace, new_builder)
+        except Exception as e:
+            logger.error(f"Bedrock error: {e}")
+            return {"statusCode": 500, "body": json.dumps({"error": f"Bedrock failed: {e}"})}
+        if structured is not None:
+            bedrock_cache.put(cache_key, stream.text, usage, BEDROCK_MODEL_ID)
+        else:
+            logger.warning(f"JSON parse failed: {stream.text[:300]}")
+            structured = {"signals": [], "summary": "Parsing failed", "signal_count": 0, "raw": stream.text[:500]}
+            builder = new_builder()
+
+    # Stocker les signaux (préparés pendant le stream) dans DynamoDB
     stored = 0
-    if signals_table and structured.get("signals"):
-        timestamp = datetime.utcnow().isoformat()
-        for i, signal in enumerate(structured["signals"][:10]):
+    if signals_table and builder.items:
+        write_t0 = time.perf_counter()
+        write_at = time.time()
+        for item in builder.items:
             try:
-                signals_table.put_item(Item={
-                    "pk": f"DOC#{s3_key}",
-                    "sk": f"SIGNAL#{i:03d}",
-                    "doc_type": doc_type,
-                    "city": city,
-                    "signal_type": signal.get("type", "unknown"),
-                    "description": signal.get("description", ""),
-                    "impact": signal.get("impact", "neutral"),
-                    "confidence": str(signal.get("confidence", 0.5)),
-                    "location_hint": signal.get("location_hint", ""),
-                    "created_at": timestamp
-                })
+                signals_table.put_item(Item=item)
                 stored += 1
             except Exception as e:
                 logger.error(f"DynamoDB write error: {e}")
+        write_ms = (time.perf_counter() - write_t0) * 1000
+        metrics.put("DynamoDBWriteLatency", round(write_ms, 3))
+        trace.add("dynamodb_write", write_ms, write_at, items=stored)
+
+    metrics.put("SignalsStored", stored, "Count")
+
+    reqlog.field("s3_key", s3_key)
+    reqlog.note(f"Structured {len(structured.get('signals', []))} signals ({stream.rejected if stream else 0} "
+                f"rejected), stored {stored} in DynamoDB")
 
-    logger.info(f"Structured {len(structured.get('signals', []))} signals, stored {stored} in DynamoDB")
+    _store_trace(trace)
 
     result = {
         "s3_key": s3_key,
@@ -141,6 +291,8 @@ def handler(event, context):
         "structured_signals": structured,
         "signals_stored": stored,
         "model_id": BEDROCK_MODEL_ID,
-        "status": "structured"
+        "cache_hit": cache_hit,
+        "status": "structured",
+        "trace": trace.to_dict()
     }
     return {"statusCode": 200, "body": json.dumps(result)}
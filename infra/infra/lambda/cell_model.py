@@ -0,0 +1,265 @@
+"""
+Cell model — score à la demande d'une maille de ~500 m, sans ligne pré-calculée.
+
+Le batch de scoring (scoring_handler) sérialise, pour chaque ville et chaque version,
+un modèle compact dans s3://ARTIFACTS_BUCKET/geo/<city>/cell_model/<version>.bin :
+
+  en-tête    "PRCM", format, grille (origine, pas en degrés, lignes x colonnes)
+  modèle     coefficients de scoring.score_matrix (poids par type, échelle, seuils
+             de momentum, échelle de volume)
+  features   float32 [lignes x colonnes x n_features], même disposition que la matrice
+             de scoring.py ; maille sans IRIS voisin = NaN
+
+Les features d'une maille sont la moyenne, pondérée par un noyau gaussien (sigma une
+maille), des features des IRIS dont le centroïde tombe dans les 3 x 3 mailles
+voisines — une maille sans ligne en base a donc un score cohérent avec ses voisins.
+
+Côté API (sans numpy) : le fichier de la version active est copié une fois dans /tmp
+puis ouvert en mmap ; un score = un struct.unpack_from de n_features floats et
+quelques opérations (quelques µs), mis en cache LRU par (ville, version, maille). Le
+modèle suit le pointeur de version : un publish ou un rollback change de fichier.
+"""
+import io
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import cities
+import metrics
+
+logger = logging.getLogger()
+
+CELL_METERS = float(os.environ.get("CELL_METERS", "500"))
+CELL_MODEL_DIR = os.environ.get("CELL_MODEL_DIR", "/tmp")
+CELL_CACHE_SIZE = int(os.environ.get("CELL_CACHE_SIZE", "4096"))
+MODEL_DIR_NAME = "cell_model"
+
+MAGIC = b"PRCM"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sHHIIdddd")       # magic, format, n_types, lignes, colonnes, lat0, lng0, dlat, dlng
+_COEFS_TAIL = struct.Struct("<dddd")         # score_scale, seuil High, seuil Medium, échelle de volume
+_M_PER_DEG_LAT = 111_320.0
+
+_models: dict = {}     # city -> CellModel (version active seulement)
+_retry_at: dict = {}   # (city, version) -> time.monotonic() du prochain essai
+_results: OrderedDict = OrderedDict()
+_lock = threading.Lock()
+s3_client = None
+
+
+def model_key(city: str, version: str) -> str:
+    return cities.artifact_key(city, f"{MODEL_DIR_NAME}/{version}.bin")
+
+
+# --- Construction (batch, numpy) ---------------------------------------------------
+
+def grid_for(city: str) -> tuple:
+    """(lat0, lng0, dlat, dlng, lignes, colonnes) de la grille de la ville (emprise du registre)."""
+    lat_min, lat_max, lng_min, lng_max = cities.CITIES[city]["bbox"]
+    dlat = CELL_METERS / _M_PER_DEG_LAT
+    dlng = CELL_METERS / (_M_PER_DEG_LAT * math.cos(math.radians((lat_min + lat_max) / 2)))
+    rows = max(1, math.ceil((lat_max - lat_min) / dlat))
+    cols = max(1, math.ceil((lng_max - lng_min) / dlng))
+    return lat_min, lng_min, dlat, dlng, rows, cols
+
+
+def build(city: str, centroids: dict, iris_ids: list, X, coefficients: dict) -> bytes:
+    """
+    Sérialise le modèle d'une ville. `centroids` : iris_id -> (lat, lng) ; `X` : matrice de
+    features de scoring.build_feature_matrix (lignes alignées sur iris_ids) ;
+    `coefficients` : type_weights, score_scale, momentum_high, momentum_medium, volume_scale.
+    """
+    import numpy as np
+
+    lat0, lng0, dlat, dlng, n_rows, n_cols = grid_for(city)
+    n_types = len(coefficients["type_weights"])
+    n_features = X.shape[1]
+    if n_features != n_types + 5:
+        raise ValueError(f"feature layout mismatch: {n_features} columns for {n_types} signal types")
+
+    keep = [k for k, iris_id in enumerate(iris_ids) if iris_id in centroids]
+    lat = np.array([centroids[iris_ids[k]][0] for k in keep])
+    lng = np.array([centroids[iris_ids[k]][1] for k in keep])
+    feats = X[keep]
+    newest = n_features - 1
+    ci = np.floor((lat - lat0) / dlat).astype(np.int64)
+    cj = np.floor((lng - lng0) / dlng).astype(np.int64)
+
+    acc = np.zeros((n_rows, n_cols, n_features))
+    weight = np.zeros((n_rows, n_cols))
+    age = np.full((n_rows, n_cols), np.inf)
+    for di in (-1, 0, 1):
+        for dj in (-1, 0, 1):
+            ti, tj = ci + di, cj + dj
+            inside = (ti >= 0) & (ti < n_rows) & (tj >= 0) & (tj < n_cols)
+            # Distance centroïde -> centre de la maille cible, en mailles
+            d2 = (((ti + 0.5) * dlat + lat0 - lat) / dlat) ** 2 + (((tj + 0.5) * dlng + lng0 - lng) / dlng) ** 2
+            w = np.exp(-d2 / 2.0)[inside]
+            rows, cols = ti[inside], tj[inside]
+            np.add.at(acc, (rows, cols), feats[inside] * w[:, None])
+            np.add.at(weight, (rows, cols), w)
+            np.minimum.at(age, (rows, cols), feats[inside, newest])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cells = acc / weight[..., None]
+    cells[..., newest] = age
+    cells[weight == 0] = np.nan
+
+    out = io.BytesIO()
+    out.write(_HEADER.pack(MAGIC, FORMAT_VERSION, n_types, n_rows, n_cols, lat0, lng0, dlat, dlng))
+    out.write(struct.pack(f"<{n_types}d", *coefficients["type_weights"]))
+    out.write(_COEFS_TAIL.pack(coefficients["score_scale"], coefficients["momentum_high"],
+                               coefficients["momentum_medium"], coefficients["volume_scale"]))
+    out.write(b"\0" * (-out.tell() % 16))     # features alignées sur 16 octets
+    out.write(cells.astype("<f4").tobytes())
+    return out.getvalue()
+
+
+# --- Lecture (API, sans numpy) ------------------------------------------------------
+
+class CellModel:
+    """Modèle d'une (ville, version) ouvert en mmap."""
+
+    def __init__(self, city: str, version: str, path: str):
+        self.city, self.version, self.path = city, version, path
+        with open(path, "rb") as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, fmt, self.n_types, self.n_rows, self.n_cols,
+         self.lat0, self.lng0, self.dlat, self.dlng) = _HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            self.buf.close()
+            raise ValueError(f"not a cell model (magic {magic!r}, format {fmt})")
+        offset = _HEADER.size
+        self.type_weights = struct.unpack_from(f"<{self.n_types}d", self.buf, offset)
+        offset += 8 * self.n_types
+        self.score_scale, self.momentum_high, self.momentum_medium, self.volume_scale = \
+            _COEFS_TAIL.unpack_from(self.buf, offset)
+        offset += _COEFS_TAIL.size
+        self.data_offset = offset + (-offset % 16)
+        self.n_features = self.n_types + 5
+        self._row = struct.Struct(f"<{self.n_features}f")
+        expected = self.data_offset + self.n_rows * self.n_cols * self._row.size
+        if len(self.buf) < expected:
+            self.buf.close()
+            raise ValueError(f"truncated cell model ({len(self.buf)} < {expected} bytes)")
+
+    def close(self):
+        self.buf.close()
+
+    def cell_of(self, lat: float, lng: float):
+        """(ligne, colonne) de la maille contenant le point, None hors grille."""
+        i = math.floor((lat - self.lat0) / self.dlat)
+        j = math.floor((lng - self.lng0) / self.dlng)
+        if 0 <= i < self.n_rows and 0 <= j < self.n_cols:
+            return i, j
+        return None
+
+    def cell_center(self, i: int, j: int) -> tuple:
+        return round(self.lat0 + (i + 0.5) * self.dlat, 6), round(self.lng0 + (j + 0.5) * self.dlng, 6)
+
+    def features(self, i: int, j: int):
+        return self._row.unpack_from(self.buf, self.data_offset + (i * self.n_cols + j) * self._row.size)
+
+    def score(self, i: int, j: int):
+        """Sorties de scoring.score_matrix pour une maille ; None si aucun IRIS voisin."""
+        x = self.features(i, j)
+        count = x[self.n_types]
+        if math.isnan(count):
+            return None
+        conf_sum, sign_sum, recent, newest_age = x[self.n_types + 1:]
+        intensity = sum(w * v for w, v in zip(self.type_weights, x[:self.n_types]))
+        momentum = "High" if recent >= self.momentum_high else "Medium" if recent >= self.momentum_medium else "Low"
+        mean_conf = conf_sum / count if count > 0 else 0.0
+        consistency = abs(sign_sum) / count if count > 0 else 0.0
+        volume = 1.0 - math.exp(-count / self.volume_scale)
+        confidence = min(max(mean_conf * volume * (0.5 + 0.5 * consistency), 0.1), 0.99)
+        out = {
+            "future_value_score": round(0.5 + 0.5 * math.tanh(intensity / self.score_scale), 2),
+            "momentum": momentum,
+            "confidence": round(confidence, 2),
+            "signal_count": round(count, 2),
+        }
+        if math.isfinite(newest_age):
+            out["data_freshness_days"] = int(newest_age)
+        return out
+
+
+def _s3():
+    global s3_client
+    if s3_client is None:
+        import boto3
+        s3_client = boto3.client("s3")
+    return s3_client
+
+
+def get_model(city: str, version: str):
+    """
+    Modèle de (city, version), chargé une fois : copie dans CELL_MODEL_DIR puis mmap.
+    Le modèle d'une version précédente de la ville est fermé. None si l'artefact manque
+    (nouvel essai après cities.INDEX_RETRY_SECONDS).
+    """
+    model = _models.get(city)
+    if model is not None and model.version == version:
+        return model
+    if not version or _retry_at.get((city, version), 0.0) > time.monotonic():
+        return None
+    with _lock:
+        model = _models.get(city)
+        if model is not None and model.version == version:
+            return model
+        key = model_key(city, version)
+        path = os.path.join(CELL_MODEL_DIR, f"pren_cell_model_{city}_{version}.bin")
+        t0 = time.perf_counter()
+        try:
+            if not cities.ARTIFACTS_BUCKET:
+                raise RuntimeError("ARTIFACTS_BUCKET not set")
+            body = _s3().get_object(Bucket=cities.ARTIFACTS_BUCKET, Key=key)["Body"].read()
+            with open(path, "wb") as f:
+                f.write(body)
+            new = CellModel(city, version, path)
+        except Exception as e:
+            logger.warning(f"Cell model unavailable for {city} {version} ({key}): {e}")
+            _retry_at[(city, version)] = time.monotonic() + cities.INDEX_RETRY_SECONDS
+            return None
+        metrics.put("CellModelLoadLatency", round((time.perf_counter() - t0) * 1000, 3))
+        old = _models.get(city)
+        _models[city] = new
+        if old is not None:
+            old.close()
+            try:
+                os.remove(old.path)
+            except OSError:
+                pass
+        logger.info(f"Cell model loaded for {city} {version}: {new.n_rows}x{new.n_cols} cells")
+        return new
+
+
+def score_at(city: str, version: str, lat: float, lng: float):
+    """Score de la maille contenant (lat, lng) pour la version donnée, ou None."""
+    model = get_model(city, version)
+    if model is None:
+        return None
+    cell = model.cell_of(lat, lng)
+    if cell is None:
+        return None
+    key = (city, version) + cell
+    hit = _results.get(key)
+    if hit is not None:
+        _results.move_to_end(key)
+        metrics.put("CellCacheHit", 1, "Count")
+        return hit
+    scored = model.score(*cell)
+    if scored is None:
+        return None
+    lat_c, lng_c = model.cell_center(*cell)
+    result = {"cell_id": f"{city}:{cell[0]}:{cell[1]}", "cell_center": {"lat": lat_c, "lng": lng_c},
+              "cell_size_m": round(model.dlat * _M_PER_DEG_LAT), **scored}
+    _results[key] = result
+    if len(_results) > CELL_CACHE_SIZE:
+        _results.popitem(last=False)
+    return result
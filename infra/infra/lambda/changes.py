@@ -0,0 +1,311 @@
+"""
+Changes — diff entre snapshots de scores publiés, flux /changes et événements de seuil.
+
+Le batch de scoring (scoring_handler) dépose pour chaque version un snapshot compact
+geo/<city>/snapshots/<version>.npz (iris_id, score, confiance, momentum). À chaque
+publication ou rollback, publish_handler diffe (numpy, une passe triée) la dernière
+version du flux et la nouvelle version active :
+
+  artefact   geo/<city>/changes/<seq>-<version>.jsonl.gz : une ligne par IRIS modifié
+             (ajouté, retiré, score déplacé d'au moins CHANGE_MIN_DELTA, momentum changé),
+             triées par iris_id
+  flux       item {"iris_id": "#CHANGES#<city>", "version": "<seq>#<version>"} de
+             PrenScoresTable : from_version, to_version, change_count, key ; <seq> est
+             l'instant de publication (même format qu'une version), le flux est donc
+             trié dans l'ordre des publications
+
+Les entrées s'enchaînent (from_version = to_version de l'entrée précédente) : un diff
+manqué est rattrapé par le suivant, un rollback est un diff comme un autre.
+
+/changes?since=<version> rejoue les entrées publiées après `since` (page de `limit`
+lignes, jeton next_token opaque) ; un client synchronisé repart du to_version renvoyé.
+`since` doit être une version du flux : antérieure à sa première entrée, le client
+resynchronise tout le jeu (ResyncRequired) ; inconnue sinon, ValueError.
+
+Événements de seuil (optionnel, CHANGES_QUEUE_URL) : changement de momentum
+("Low->High") ou déplacement de score d'au moins CHANGE_EVENT_DELTA, envoyés à SQS par
+lots de 10.
+"""
+import base64
+import gzip
+import io
+import json
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from boto3.dynamodb.conditions import Key
+
+import cities
+import history
+
+logger = logging.getLogger()
+
+CHANGE_MIN_DELTA = float(os.environ.get("CHANGE_MIN_DELTA", "0.01"))
+CHANGE_EVENT_DELTA = float(os.environ.get("CHANGE_EVENT_DELTA", "0.1"))
+CHANGE_EVENTS_MAX = int(os.environ.get("CHANGE_EVENTS_MAX", "1000"))
+FEED_PK = "#CHANGES"
+MOMENTUM_CODES = {"Low": 0, "Medium": 1, "High": 2}
+MOMENTUM_LABELS = ["Low", "Medium", "High"]
+SQS_BATCH = 10
+ARTIFACT_CACHE_SIZE = 16
+
+_artifacts: OrderedDict = OrderedDict()   # clé S3 -> lignes décodées (artefacts immuables)
+
+
+def snapshot_key(city: str, version: str) -> str:
+    return cities.artifact_key(city, f"snapshots/{version}.npz")
+
+
+def changes_key(city: str, seq: str, version: str) -> str:
+    return cities.artifact_key(city, f"changes/{seq}-{version}.jsonl.gz")
+
+
+def _feed_pk(city: str) -> str:
+    return f"{FEED_PK}#{cities.slug(city)}"
+
+
+# --- Snapshots et diff (batch, numpy) ------------------------------------------------
+
+def snapshot_bytes(items: list[dict]) -> bytes:
+    """Snapshot .npz d'un jeu de scores (colonnes typées, sans pickle)."""
+    import numpy as np
+
+    out = io.BytesIO()
+    np.savez_compressed(
+        out,
+        iris_id=np.array([it["iris_id"] for it in items], dtype=str),
+        score=np.array([float(it["future_value_score"]) for it in items], dtype=np.float64),
+        confidence=np.array([float(it["confidence"]) for it in items], dtype=np.float64),
+        momentum=np.array([MOMENTUM_CODES.get(it.get("momentum"), 0) for it in items], dtype=np.int8),
+    )
+    return out.getvalue()
+
+
+def load_snapshot(s3_client, bucket: str, city: str, version: str):
+    """Colonnes du snapshot de (city, version) triées par iris_id ; None si l'artefact manque."""
+    import numpy as np
+    from botocore.exceptions import ClientError
+
+    try:
+        body = s3_client.get_object(Bucket=bucket, Key=snapshot_key(city, version))["Body"].read()
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return None
+        raise
+    with np.load(io.BytesIO(body), allow_pickle=False) as npz:
+        snap = {name: npz[name] for name in npz.files}
+    order = np.argsort(snap["iris_id"], kind="stable")
+    return {name: column[order] for name, column in snap.items()}
+
+
+def snapshot_items(snap: dict) -> list[dict]:
+    """Lignes {iris_id, future_value_score, confidence, momentum} d'un snapshot."""
+    return [{"iris_id": iris_id, "future_value_score": score, "confidence": conf, "momentum": MOMENTUM_LABELS[m]}
+            for iris_id, score, conf, m in zip(snap["iris_id"].tolist(), snap["score"].tolist(),
+                                               snap["confidence"].tolist(), snap["momentum"].tolist())]
+
+
+def empty_snapshot() -> dict:
+    import numpy as np
+    return {"iris_id": np.array([], dtype=str), "score": np.array([]), "confidence": np.array([]),
+            "momentum": np.array([], dtype=np.int8)}
+
+
+def diff(old: dict, new: dict, min_delta: float = CHANGE_MIN_DELTA) -> list[dict]:
+    """Lignes modifiées entre deux snapshots triés par iris_id (alignement par searchsorted)."""
+    import numpy as np
+
+    old_ids, new_ids = old["iris_id"], new["iris_id"]
+    pos = np.searchsorted(old_ids, new_ids)
+    pos_clipped = np.minimum(pos, max(len(old_ids) - 1, 0))
+    common = (pos < len(old_ids)) & (old_ids[pos_clipped] == new_ids) if len(old_ids) else np.zeros(len(new_ids), bool)
+    matched = pos_clipped[common]
+
+    delta = new["score"][common] - old["score"][matched]
+    moved = np.abs(delta) >= min_delta - 1e-9
+    turned = new["momentum"][common] != old["momentum"][matched]
+    changed = moved | turned
+    removed = np.ones(len(old_ids), bool)
+    removed[matched] = False
+
+    rows = []
+    idx_new = np.nonzero(common)[0][changed]
+    idx_old = matched[changed]
+    for i, j, d in zip(idx_new.tolist(), idx_old.tolist(), delta[changed].tolist()):
+        rows.append({
+            "iris_id": str(new_ids[i]), "change": "updated",
+            "future_value_score": float(new["score"][i]), "previous_score": float(old["score"][j]),
+            "delta": round(d, 4),
+            "momentum": MOMENTUM_LABELS[new["momentum"][i]], "previous_momentum": MOMENTUM_LABELS[old["momentum"][j]],
+            "confidence": float(new["confidence"][i]),
+        })
+    for i in np.nonzero(~common)[0].tolist():
+        rows.append({
+            "iris_id": str(new_ids[i]), "change": "added",
+            "future_value_score": float(new["score"][i]), "momentum": MOMENTUM_LABELS[new["momentum"][i]],
+            "confidence": float(new["confidence"][i]),
+        })
+    for j in np.nonzero(removed)[0].tolist():
+        rows.append({
+            "iris_id": str(old_ids[j]), "change": "removed",
+            "previous_score": float(old["score"][j]), "previous_momentum": MOMENTUM_LABELS[old["momentum"][j]],
+        })
+    rows.sort(key=lambda r: r["iris_id"])
+    return rows
+
+
+def threshold_events(rows: list[dict], city: str, from_version: str, to_version: str,
+                     event_delta: float = CHANGE_EVENT_DELTA) -> list[dict]:
+    """Changements de momentum et déplacements de score >= event_delta parmi les lignes du diff."""
+    events = []
+    for row in rows:
+        if row["change"] != "updated":
+            continue
+        base = {"city": city, "iris_id": row["iris_id"], "from_version": from_version, "to_version": to_version,
+                "future_value_score": row["future_value_score"], "previous_score": row["previous_score"]}
+        if row["momentum"] != row["previous_momentum"]:
+            events.append({**base, "type": "momentum_change",
+                           "transition": f"{row['previous_momentum']}->{row['momentum']}"})
+        if abs(row["delta"]) >= event_delta - 1e-9:
+            events.append({**base, "type": "score_move", "delta": row["delta"]})
+    return events
+
+
+def send_events(sqs_client, queue_url: str, events: list[dict]) -> int:
+    """SendMessageBatch par 10 (échecs partiels renvoyés une fois) ; retourne le nombre envoyé."""
+    if len(events) > CHANGE_EVENTS_MAX:
+        logger.warning(f"{len(events)} change events, sending the first {CHANGE_EVENTS_MAX}")
+        events = events[:CHANGE_EVENTS_MAX]
+    sent = 0
+    for start in range(0, len(events), SQS_BATCH):
+        entries = [{"Id": str(k), "MessageBody": json.dumps(ev)} for k, ev in enumerate(events[start:start + SQS_BATCH])]
+        for _ in range(2):
+            resp = sqs_client.send_message_batch(QueueUrl=queue_url, Entries=entries)
+            sent += len(resp.get("Successful", []))
+            failed = {f["Id"] for f in resp.get("Failed", [])}
+            entries = [e for e in entries if e["Id"] in failed]
+            if not entries:
+                break
+        if entries:
+            logger.warning(f"{len(entries)} change events not delivered to {queue_url}")
+    return sent
+
+
+class ResyncRequired(Exception):
+    """`since` précède le début du flux : les diffs qui y mènent n'existent pas."""
+
+
+# --- Flux (PrenScoresTable) ------------------------------------------------------------
+
+def head(table, city: str, first: bool = False):
+    """Dernière entrée du flux de la ville (la première si `first`), ou None."""
+    resp = table.query(KeyConditionExpression=Key("iris_id").eq(_feed_pk(city)),
+                       ScanIndexForward=first, Limit=1, ConsistentRead=True)
+    items = resp.get("Items", [])
+    return items[0] if items else None
+
+
+def record(table, s3_client, bucket: str, city: str, from_version, to_version: str, rows: list[dict]) -> dict:
+    """Écrit l'artefact du diff puis l'entrée du flux ; retourne l'entrée."""
+    city = cities.slug(city)
+    seq = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    key = changes_key(city, seq, to_version)
+    body = gzip.compress("".join(json.dumps(r) + "\n" for r in rows).encode("utf-8"))
+    s3_client.put_object(Bucket=bucket, Key=key, Body=body, ContentType="application/x-ndjson",
+                         ContentEncoding="gzip")
+    entry = {
+        "iris_id": _feed_pk(city),
+        "version": f"{seq}#{to_version}",
+        "city_key": city,
+        "from_version": from_version,
+        "to_version": to_version,
+        "change_count": len(rows),
+        "key": key,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    table.put_item(Item=entry)
+    return entry
+
+
+# --- Lecture (API) ----------------------------------------------------------------
+
+def encode_token(sk: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sk, offset]).encode("utf-8")).decode("ascii")
+
+
+def decode_token(token: str) -> tuple:
+    try:
+        sk, offset = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return str(sk), int(offset)
+    except (ValueError, TypeError) as e:
+        raise ValueError("invalid next_token") from e
+
+
+def _entries(table, city: str, sk: str, inclusive: bool = False):
+    """Entrées du flux de clé > sk (>= si inclusive), dans l'ordre des publications."""
+    bound = Key("version").gte(sk) if inclusive else Key("version").gt(sk)
+    kwargs = {"KeyConditionExpression": Key("iris_id").eq(_feed_pk(city)) & bound}
+    while True:
+        resp = table.query(**kwargs)
+        yield from resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _rows(s3_client, bucket: str, key: str) -> list:
+    rows = _artifacts.get(key)
+    if rows is None:
+        body = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        rows = [json.loads(line) for line in gzip.decompress(body).splitlines() if line]
+        _artifacts[key] = rows
+        if len(_artifacts) > ARTIFACT_CACHE_SIZE:
+            _artifacts.popitem(last=False)
+    else:
+        _artifacts.move_to_end(key)
+    return rows
+
+
+def read_page(table, s3_client, bucket: str, city: str, since: str, token: str = None, limit: int = 500) -> dict:
+    """
+    Page du flux après `since` (version du client). Sans jeton, la dernière entrée qui a
+    rendu `since` active et celles d'avant sont ignorées. Retourne changes, next_token et
+    to_version (dernière version du flux, renseignée sur la dernière page seulement).
+    ValueError si `since` n'est pas une version du flux, ResyncRequired s'il le précède.
+    """
+    if history.version_ts(since) is None:
+        raise ValueError("since must be a score version (YYYYMMDDTHHMMSSZ)")
+    if token:
+        start_sk, offset = decode_token(token)
+        entries = list(_entries(table, city, start_sk, inclusive=True))
+    else:
+        offset = 0
+        entries = list(_entries(table, city, since))
+        # Après un rollback une version revient dans le flux : l'état y est le même qu'à
+        # sa dernière occurrence, d'où l'on repart
+        seen = [k for k, entry in enumerate(entries) if entry["to_version"] == since]
+        if seen:
+            entries = entries[seen[-1] + 1:]
+        elif not (entries and entries[0].get("from_version") == since):
+            # Ni atteinte ni quittée par une entrée : antérieure à la première version du
+            # flux, ou jamais publiée (les versions sont triables comme des chaînes)
+            first = head(table, city, first=True)
+            if first is None or since < (first.get("from_version") or first["to_version"]):
+                raise ResyncRequired(f"since {since} predates the change feed for {city}")
+            raise ValueError(f"Unknown score version {since} for {city}")
+
+    changes, last = [], None
+    for entry in entries:
+        if len(changes) >= limit:
+            return {"changes": changes, "next_token": encode_token(entry["version"], 0), "to_version": None}
+        rows = _rows(s3_client, bucket, entry["key"])
+        taken = rows[offset:offset + limit - len(changes)]
+        changes.extend({**row, "from_version": entry.get("from_version"), "to_version": entry["to_version"]}
+                       for row in taken)
+        consumed, offset = offset + len(taken), 0
+        if consumed < len(rows):
+            return {"changes": changes, "next_token": encode_token(entry["version"], consumed), "to_version": None}
+        last = entry
+    return {"changes": changes, "next_token": None, "to_version": last["to_version"] if last else since}
@@ -0,0 +1,88 @@
+"""
+Changes handler — GET /changes?since=<version>&city=paris : IRIS modifiés depuis la
+version du client, page par page (voir changes.py). Un client rejoue next_token jusqu'à
+la dernière page, puis repart de son to_version. Un `since` antérieur au flux renvoie 410
+(resync : recharger le jeu complet de la version active, puis repartir de to_version).
+"""
+import json
+import logging
+import os
+
+import boto3
+
+import changes
+import cities
+import compression
+import metrics
+import profiling
+import reqlog
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+SCORES_TABLE = os.environ.get("SCORES_TABLE", "")
+ARTIFACTS_BUCKET = os.environ.get("ARTIFACTS_BUCKET", "")
+CHANGES_PAGE_SIZE = int(os.environ.get("CHANGES_PAGE_SIZE", "500"))
+CHANGES_MAX_PAGE_SIZE = int(os.environ.get("CHANGES_MAX_PAGE_SIZE", "5000"))
+
+dynamodb = boto3.resource("dynamodb")
+table = dynamodb.Table(SCORES_TABLE) if SCORES_TABLE else None
+s3_client = boto3.client("s3", region_name="eu-west-3")
+
+INTENDED_USE = "For planning & risk management; not for discriminatory decisions or speculative targeting."
+
+
+def _error(status: int, message: str, **extra):
+    return {
+        "statusCode": status,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps({"error": message, **extra, "intended_use": INTENDED_USE}),
+    }
+
+
+@metrics.instrument("changes")
+@reqlog.logged("changes")
+@profiling.profiled("changes")
+@compression.negotiated
+def handler(event, context):
+    if not (table and ARTIFACTS_BUCKET):
+        return _error(500, "SCORES_TABLE/ARTIFACTS_BUCKET not configured")
+
+    q = event.get("queryStringParameters") or {}
+    since = q.get("since")
+    city = cities.slug(q.get("city"))
+    if city not in cities.CITIES:
+        return _error(404, "Unsupported city", supported_cities=sorted(cities.CITIES))
+    if not since:
+        return _error(400, "Missing since (score version already synced)",
+                      example="/changes?since=20260301T020000Z&city=paris")
+    try:
+        limit = min(int(q.get("limit") or CHANGES_PAGE_SIZE), CHANGES_MAX_PAGE_SIZE)
+        if limit <= 0:
+            raise ValueError
+    except ValueError:
+        return _error(400, "limit must be a positive integer")
+    reqlog.field("city", city)
+    reqlog.field("since", since)
+
+    try:
+        with metrics.timer("ChangesReadLatency"):
+            page = changes.read_page(table, s3_client, ARTIFACTS_BUCKET, city, since, q.get("next_token"), limit)
+    except changes.ResyncRequired as e:
+        last = changes.head(table, city)
+        return _error(410, str(e), resync=True, to_version=last["to_version"] if last else None)
+    except ValueError as e:
+        return _error(400, str(e))
+    metrics.put("ChangesReturned", len(page["changes"]), "Count")
+
+    out = {
+        "city": cities.name(city),
+        "since": since,
+        **page,
+        "intended_use": INTENDED_USE,
+    }
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(out),
+    }
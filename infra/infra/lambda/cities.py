@@ -0,0 +1,212 @@
+"""
+Cities — registre des villes servies et index spatial IRIS chargé par ville.
+
+Registre (env CITIES en JSON, sinon DEFAULT_CITIES) : slug -> nom, emprise grossière
+(lat_min, lat_max, lng_min, lng_max) et préfixes des codes IRIS de la ville.
+
+  - city_for(lat, lng)    : ville dont l'emprise contient le point (la plus petite si
+                            plusieurs se recouvrent) — quelques comparaisons, sans index ;
+  - city_of_iris(iris_id) : ville d'un code IRIS (préfixe le plus long) ;
+  - get_index(city)       : plus proche centroïde IRIS, chargé au premier appel depuis
+                            s3://ARTIFACTS_BUCKET/geo/<city>/iris_centroids.csv.
+
+Un conteneur ne charge que les index des villes qu'il a effectivement servies : ajouter
+une ville ne change ni la mémoire ni le cold start des autres.
+
+Artefacts par ville (artifact_key) :
+  geo/<city>/iris_centroids.csv     univers IRIS (scoring) + index spatial (/score)
+  geo/<city>/gazetteer.json.gz      gazetteer location_hint -> IRIS (bedrock)
+"""
+import csv
+import io
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+import metrics
+
+logger = logging.getLogger()
+
+DEFAULT_CITIES = {
+    "paris": {"name": "Paris", "bbox": [48.815, 48.902, 2.224, 2.470], "iris_prefixes": ["751", "PARIS_"]},
+    "lyon": {"name": "Lyon", "bbox": [45.707, 45.809, 4.771, 4.899], "iris_prefixes": ["6938"]},
+}
+CITIES = json.loads(os.environ["CITIES"]) if os.environ.get("CITIES") else DEFAULT_CITIES
+DEFAULT_CITY = os.environ.get("DEFAULT_CITY", "paris")
+ARTIFACTS_BUCKET = os.environ.get("ARTIFACTS_BUCKET", "")
+IRIS_INDEX_NAME = "iris_centroids.csv"
+GAZETTEER_NAME = "gazetteer.json.gz"
+INDEX_RETRY_SECONDS = float(os.environ.get("CITY_INDEX_RETRY_SECONDS", "60"))
+GRID_DEG = 0.01
+
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+
+s3_client = None  # créé au premier chargement d'index (les handlers sans /score n'en ont pas besoin)
+_indexes: dict = {}
+_retry_at: dict = {}
+_lock = threading.Lock()
+
+
+def slug(city: str) -> str:
+    """"Saint-Étienne" -> "saint-etienne" ; None -> DEFAULT_CITY."""
+    if not city:
+        return DEFAULT_CITY
+    folded = "".join(c for c in unicodedata.normalize("NFKD", city.lower()) if not unicodedata.combining(c))
+    return _SLUG_RE.sub("-", folded).strip("-") or DEFAULT_CITY
+
+
+def name(city: str) -> str:
+    return CITIES.get(city, {}).get("name", city)
+
+
+def artifact_key(city: str, artifact: str) -> str:
+    return f"geo/{slug(city)}/{artifact}"
+
+
+def city_for(lat: float, lng: float):
+    """Slug de la ville dont l'emprise contient (lat, lng), ou None hors de toute ville servie."""
+    best, best_area = None, math.inf
+    for city, conf in CITIES.items():
+        lat_min, lat_max, lng_min, lng_max = conf["bbox"]
+        if lat_min <= lat <= lat_max and lng_min <= lng <= lng_max:
+            area = (lat_max - lat_min) * (lng_max - lng_min)
+            if area < best_area:
+                best, best_area = city, area
+    return best
+
+
+def city_of_iris(iris_id: str) -> str:
+    """Slug de la ville d'un code IRIS (préfixe le plus long), DEFAULT_CITY sinon."""
+    best, best_len = DEFAULT_CITY, 0
+    for city, conf in CITIES.items():
+        for prefix in conf.get("iris_prefixes", ()):
+            if len(prefix) > best_len and iris_id.startswith(prefix):
+                best, best_len = city, len(prefix)
+    return best
+
+
+class IrisIndex:
+    """
+    Plus proche centroïde IRIS via une grille de cases de GRID_DEG degrés. La clé de
+    chaque ligne (iris_id ici, (iris_id, ville) pour tools/build_gazetteer.py) est rendue
+    telle quelle par find.
+    """
+
+    def __init__(self, rows):
+        self.cells = defaultdict(list)
+        self.size = 0
+        for iris_id, lat, lng in rows:
+            self.cells[(int(lat // GRID_DEG), int(lng // GRID_DEG))].append((iris_id, lat, lng))
+            self.size += 1
+
+    def __len__(self):
+        return self.size
+
+    def rows(self):
+        """(iris_id, lat, lng) de tous les centroïdes (ordre des cases)."""
+        for cell in self.cells.values():
+            yield from cell
+
+    @classmethod
+    def loads(cls, raw: str) -> "IrisIndex":
+        """CSV iris_id,city,lat,lng ; les lignes sans coordonnées (univers de scoring seul) sont ignorées."""
+        rows = []
+        for row in csv.DictReader(io.StringIO(raw)):
+            if row.get("lat") and row.get("lng"):
+                rows.append((row["iris_id"], float(row["lat"]), float(row["lng"])))
+        return cls(rows)
+
+    def find(self, lat: float, lng: float, max_ring: int = 5):
+        ci, cj = int(lat // GRID_DEG), int(lng // GRID_DEG)
+        cos_lat = math.cos(math.radians(lat))
+        best, best_d = None, math.inf
+        for ring in range(max_ring + 1):
+            for di in range(-ring, ring + 1):
+                for dj in range(-ring, ring + 1):
+                    if max(abs(di), abs(dj)) != ring:
+                        continue
+                    for iris_id, plat, plng in self.cells.get((ci + di, cj + dj), ()):
+                        d = (plat - lat) ** 2 + ((plng - lng) * cos_lat) ** 2
+                        if d < best_d:
+                            best, best_d = iris_id, d
+            # Tout centroïde hors des anneaux parcourus est à plus de ring cases en latitude
+            # ou en longitude, soit au moins ring * GRID_DEG * cos(lat) en distance (cases
+            # carrées en degrés, longitude pondérée) : on s'arrête quand le meilleur est plus près
+            if best is not None and best_d < (ring * GRID_DEG * cos_lat) ** 2:
+                break
+        return best
+
+
+def _s3():
+    global s3_client
+    if s3_client is None:
+        import boto3
+        s3_client = boto3.client("s3")
+    return s3_client
+
+
+def get_index(city: str):
+    """
+    Index de `city`, chargé une fois par conteneur (verrou : un seul chargement même
+    sous requêtes concurrentes). None si l'artefact manque ou est vide ; nouvel essai
+    après INDEX_RETRY_SECONDS.
+    """
+    index = _indexes.get(city)
+    if index is not None or _retry_at.get(city, 0.0) > time.monotonic():
+        return index
+    with _lock:
+        if city in _indexes:
+            return _indexes[city]
+        if _retry_at.get(city, 0.0) > time.monotonic():
+            return None
+        key = artifact_key(city, IRIS_INDEX_NAME)
+        t0 = time.perf_counter()
+        try:
+            if not ARTIFACTS_BUCKET:
+                raise RuntimeError("ARTIFACTS_BUCKET not set")
+            raw = _s3().get_object(Bucket=ARTIFACTS_BUCKET, Key=key)["Body"].read()
+            index = IrisIndex.loads(raw.decode("utf-8"))
+            if not len(index):
+                raise RuntimeError("no centroid with coordinates")
+        except Exception as e:
+            logger.warning(f"IRIS index unavailable for {city} ({key}): {e}")
+            _retry_at[city] = time.monotonic() + INDEX_RETRY_SECONDS
+            return None
+        load_ms = (time.perf_counter() - t0) * 1000
+        metrics.put("CityIndexLoadLatency", round(load_ms, 3))
+        logger.info(f"IRIS index loaded for {city}: {len(index)} centroids in {load_ms:.1f} ms")
+        _indexes[city] = index
+        return index
+
+
+def loaded() -> dict:
+    """Index présents dans ce conteneur : {city: nombre de centroïdes}."""
+    return {city: len(index) for city, index in _indexes.items()}
+
+
+def demo_iris(city: str, lat: float, lng: float):
+    """Déploiement de démo sans artefact IRIS : trois zones fixes pour Paris."""
+    if city != "paris":
+        return None
+    if lat >= 48.86:
+        return "PARIS_DEMO_1"
+    if lng >= 2.36:
+        return "PARIS_DEMO_2"
+    return "PARIS_DEMO_3"
+
+
+def resolve(lat: float, lng: float) -> tuple:
+    """(ville, iris_id) d'une coordonnée ; ville None hors emprises, iris_id None si aucun centroïde proche."""
+    city = city_for(lat, lng)
+    if city is None:
+        return None, None
+    index = get_index(city)
+    if index is None:
+        return city, demo_iris(city, lat, lng)
+    return city, index.find(lat, lng)
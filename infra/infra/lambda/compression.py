@@ -0,0 +1,100 @@
+"""
+Compression — négociation Accept-Encoding des réponses HTTP API (payload v2).
+
+`@compression.negotiated` compresse la réponse d'un handler quand le client accepte
+gzip ou deflate et que le corps dépasse COMPRESS_MIN_BYTES : corps base64 +
+isBase64Encoded, Content-Encoding et Vary: Accept-Encoding. En dessous du seuil, le
+coût CPU et les ~20 octets d'en-tête gzip ne valent pas le gain.
+
+Une réponse qui porte déjà Content-Encoding n'est pas retouchée.
+"""
+import base64
+import functools
+import os
+import zlib
+
+import metrics
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", "6"))
+SUPPORTED = ("gzip", "deflate")   # ordre de préférence à q égal
+
+
+def accepted_encoding(event: dict):
+    """Meilleur codage accepté par le client parmi SUPPORTED (q-values, "*"), ou None."""
+    headers = event.get("headers") or {}
+    raw = headers.get("accept-encoding") or headers.get("Accept-Encoding") or ""
+    weights = {}
+    for part in raw.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            weights[coding.strip().lower()] = q
+    best, best_q = None, 0.0
+    for coding in SUPPORTED:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _compress(data: bytes, wrapper_bits: int) -> bytes:
+    """
+    Fenêtre et tables de hachage dimensionnées sur le corps : zlib alloue sinon ~260 Ko
+    (fenêtre 32 Ko, memLevel 8) pour compresser quelques Ko. Sortie identique en ratio
+    tant que la fenêtre couvre le corps.
+    """
+    bits = min(15, max(9, (len(data) - 1).bit_length()))
+    c = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, wrapper_bits + bits, max(1, min(8, bits - 6)))
+    return c.compress(data) + c.flush()
+
+
+def encode(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return _compress(data, 16)   # un seul membre, en-tête mtime=0
+    return _compress(data, 0)        # "deflate" HTTP = flux zlib (RFC 9110)
+
+
+def _with_headers(response: dict, extra: dict) -> dict:
+    return {**response, "headers": {**(response.get("headers") or {}), **extra}}
+
+
+def compress_response(event: dict, response: dict) -> dict:
+    """Compresse `response` selon Accept-Encoding si son corps dépasse COMPRESS_MIN_BYTES."""
+    if not isinstance(response, dict) or response.get("isBase64Encoded"):
+        return response
+    headers = response.get("headers") or {}
+    body = response.get("body")
+    if "Content-Encoding" in headers or not isinstance(body, str):
+        return response
+    raw = body.encode("utf-8")
+    metrics.put("ResponseBytes", len(raw), "Bytes")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        metrics.put("ResponseBytesSent", len(raw), "Bytes")
+        return response
+    encoding = accepted_encoding(event)
+    if encoding is None:
+        metrics.put("ResponseBytesSent", len(raw), "Bytes")
+        return _with_headers(response, {"Vary": "Accept-Encoding"})
+    with metrics.timer("CompressLatency"):
+        data = encode(raw, encoding)
+    metrics.put("ResponseBytesSent", len(data), "Bytes")
+    return {
+        **_with_headers(response, {"Content-Encoding": encoding, "Vary": "Accept-Encoding"}),
+        "body": base64.b64encode(data).decode("ascii"),
+        "isBase64Encoded": True,
+    }
+
+
+def negotiated(fn):
+    """Décorateur de handler HTTP : compress_response sur la réponse."""
+    @functools.wraps(fn)
+    def wrapper(event, context):
+        return compress_response(event, fn(event, context))
+    return wrapper
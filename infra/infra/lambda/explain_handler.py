@@ -1,24 +1,46 @@
+import gzip
 import json
 import logging
 import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 
 import boto3
+from boto3.dynamodb.conditions import Key
+
+import cities
+import compression
+import explain_payload
+import metrics
+import profiling
+import reqlog
+import score_store
+import warmup
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 SCORES_TABLE = os.environ.get("SCORES_TABLE", "")
+SIGNALS_TABLE = os.environ.get("SIGNALS_TABLE", "")
+EVIDENCE_INDEX = os.environ.get("EVIDENCE_INDEX", "ByIris")
+EVIDENCE_LIMIT = int(os.environ.get("EVIDENCE_LIMIT", "10"))
+EVIDENCE_TTL_SECONDS = float(os.environ.get("EVIDENCE_TTL_SECONDS", "300"))
+EVIDENCE_CACHE_SIZE = 1024
+
 dynamodb = boto3.resource("dynamodb")
 table = dynamodb.Table(SCORES_TABLE) if SCORES_TABLE else None
+signals_table = dynamodb.Table(SIGNALS_TABLE) if SIGNALS_TABLE else None
 
-INTENDED_USE = "For planning & risk management; not for discriminatory decisions or speculative targeting."
+# Pointeur de version et index IRIS (requêtes lat/lng) chargés en arrière-plan dès l'import
+warmup.start(warmup.city_tasks(table))
 
+# Score et preuves sont lus en parallèle ; pool et cache vivent avec le conteneur
+_executor = ThreadPoolExecutor(max_workers=2)
+_evidence_cache: OrderedDict = OrderedDict()
 
-def _to_float(x):
-    if isinstance(x, Decimal):
-        return float(x)
-    return x
+INTENDED_USE = "For planning & risk management; not for discriminatory decisions or speculative targeting."
 
 
 def _parse_query_params(event):
@@ -26,18 +48,53 @@ def _parse_query_params(event):
     return q
 
 
-def _demo_iris_from_latlng(lat: float, lng: float) -> str:
-    # same logic as score_handler (keep consistent)
-    if lat >= 48.86:
-        return "PARIS_DEMO_1"
-    if lng >= 2.36:
-        return "PARIS_DEMO_2"
-    return "PARIS_DEMO_3"
-
-
+def _query_evidence(iris_id: str) -> list:
+    """Signaux les plus récents de l'IRIS via l'index ByIris (projection + page limitée)."""
+    if not signals_table:
+        return []
+    resp = signals_table.query(
+        IndexName=EVIDENCE_INDEX,
+        KeyConditionExpression=Key("iris_id").eq(iris_id),
+        ProjectionExpression="pk, description, confidence, evidence_span, signal_type, impact",
+        ScanIndexForward=False,
+        Limit=EVIDENCE_LIMIT,
+    )
+    return [
+        {
+            "doc_id": it.get("pk", "").removeprefix("DOC#"),
+            "description": it.get("description"),
+            "confidence": float(it["confidence"]) if isinstance(it.get("confidence"), (str, Decimal)) else None,
+            "evidence_span": it.get("evidence_span"),
+            "signal_type": it.get("signal_type"),
+            "impact": it.get("impact"),
+        }
+        for it in resp.get("Items", [])
+    ]
+
+
+def _get_evidence(iris_id: str, m=None) -> list:
+    """Cache LRU/TTL par conteneur devant _query_evidence (m : métriques de l'invocation)."""
+    now = time.monotonic()
+    hit = _evidence_cache.get(iris_id)
+    if hit and hit[0] > now:
+        _evidence_cache.move_to_end(iris_id)
+        if m:
+            m.put("EvidenceCacheHit", 1, "Count")
+        return hit[1]
+    with metrics.timer("EvidenceQueryLatency", m):
+        evidence = _query_evidence(iris_id)
+    _evidence_cache[iris_id] = (now + EVIDENCE_TTL_SECONDS, evidence)
+    if len(_evidence_cache) > EVIDENCE_CACHE_SIZE:
+        _evidence_cache.popitem(last=False)
+    return evidence
+
+
+@warmup.pingable("explain")
+@metrics.instrument("explain")
+@reqlog.logged("explain")
+@profiling.profiled("explain")
+@compression.negotiated
 def handler(event, context):
-    logger.info(f"Explain request: {json.dumps(event)}")
-
     if not table:
         return {
             "statusCode": 500,
@@ -47,6 +104,7 @@ def handler(event, context):
 
     q = _parse_query_params(event)
     iris_id = q.get("iris_id")
+    city = cities.city_of_iris(iris_id) if iris_id else None
 
     # Allow explain by lat/lng for convenience (same as /score)
     if not iris_id:
@@ -56,13 +114,20 @@ def handler(event, context):
             try:
                 lat = float(lat_s)
                 lng = float(lng_s)
-                iris_id = _demo_iris_from_latlng(lat, lng)
+                city, iris_id = cities.resolve(lat, lng)
             except ValueError:
                 return {
                     "statusCode": 400,
                     "headers": {"Content-Type": "application/json"},
                     "body": json.dumps({"error": "lat/lng must be numbers", "intended_use": INTENDED_USE}),
                 }
+            if iris_id is None:
+                error = "Location outside supported cities" if city is None else "No IRIS found near location"
+                return {
+                    "statusCode": 404,
+                    "headers": {"Content-Type": "application/json"},
+                    "body": json.dumps({"error": error, "city": city, "intended_use": INTENDED_USE}),
+                }
 
     if not iris_id:
         return {
@@ -80,8 +145,14 @@ def handler(event, context):
             ),
         }
 
-    resp = table.get_item(Key={"iris_id": iris_id})
-    item = resp.get("Item")
+    reqlog.field("city", city)
+    reqlog.field("iris_id", iris_id)
+
+    # Lecture via le pointeur de version active de la ville (snapshot cohérent), preuves en parallèle
+    evidence_future = _executor.submit(_get_evidence, iris_id, metrics.current())
+    warmup.wait("pointer", city)
+    with metrics.timer("DynamoDBReadLatency"):
+        item = score_store.get_score(table, iris_id, city)
 
     if not item:
         return {
@@ -90,58 +161,25 @@ def handler(event, context):
             "body": json.dumps({"error": "No score found", "iris_id": iris_id, "intended_use": INTENDED_USE}),
         }
 
-    score = _to_float(item.get("future_value_score"))
-    momentum = item.get("momentum")
-    confidence = _to_float(item.get("confidence"))
-    freshness = _to_float(item.get("data_freshness_days"))
-    top_signals_raw = item.get("top_signals", "")
-    top_signals = [s.strip() for s in top_signals_raw.split("|") if s.strip()]
-
-    # Short, enterprise-friendly explanation
-    explanation = {
-        "summary": f"{iris_id} shows {momentum} momentum with a 5-year Future Value Score of {score}.",
-        "why": [
-            "Signals were aggregated at IRIS-level (pilot: Paris) and converted into a structured feature set.",
-            f"Confidence ({confidence}) reflects data volume + signal consistency; freshness is ~{freshness} days.",
-        ],
-        "top_signals": top_signals,
-        "limitations": [
-            "This is an MVP demo: limited documents and simplified geo-mapping.",
-            "No individual-level data; sentiment is OFF by design for privacy and bias control.",
-            "Scores are decision-support signals, not a guarantee of future market outcomes.",
-        ],
-        "ethics": [
-            "Use for planning and risk management (banks, brokers, developers).",
-            "Not intended for discriminatory decisions or speculative targeting that could accelerate displacement.",
-        ],
-        "next_steps": [
-            "Replace demo geo-mapping with real IRIS + 500m grid lookup.",
-            "Ingestion pipeline: Textract -> Bedrock batch structuring -> DynamoDB signals.",
-            "Scoring pipeline: SageMaker batch inference + bias audit (Clarify) for gentrification risk.",
-        ],
-        # ✅ NEW: roadmap (short, practical, article-friendly)
-        "roadmap": [
-            "Integrate real IRIS lookup + optional 500m grid for custom geo queries (Paris -> Lyon scalability).",
-            "Ingestion: Textract (PDF) -> Bedrock batch structuring into normalized signals (cost-optimized).",
-            "Scoring: SageMaker batch inference + drift monitoring + bias audit (Clarify) for gentrification risk.",
-            "Optional: privacy-safe aggregated sentiment (opt-in, RGPD-aware) with low weight in the model.",
-        ],
-    }
-
-    out = {
-        "iris_id": iris_id,
-        "city": item.get("city", "Paris"),
-        "future_value_score": score,
-        "momentum": momentum,
-        "confidence": confidence,
-        "data_freshness_days": freshness,
-        "updated_at": item.get("updated_at"),
-        "intended_use": INTENDED_USE,
-        "explanation": explanation,
-    }
-
-    return {
-        "statusCode": 200,
-        "headers": {"Content-Type": "application/json"},
-        "body": json.dumps(out),
-    }
+    reqlog.field("score_version", item.get("version"))
+    try:
+        evidence = evidence_future.result()
+    except Exception as e:
+        logger.error(f"Evidence query failed: {e}")
+        evidence = []
+
+    response = {"statusCode": 200, "headers": {"Content-Type": "application/json"}}
+
+    # Réponse pré-calculée au scoring : octets stockés, ni assemblage ni sérialisation.
+    # Les preuves ferment l'objet JSON stocké ouvert (explain_head_gz) ; le corps complet
+    # est recompressé en un seul membre par @compression.negotiated
+    head = item.get("explain_head_gz")
+    if head is not None:
+        tail = ',"supporting_signals":' + json.dumps(evidence) + "}"
+        body = gzip.decompress(bytes(head)).decode("utf-8") + tail
+    else:
+        out = explain_payload.build_explain(item)
+        out["supporting_signals"] = evidence
+        body = json.dumps(out)
+
+    return {**response, "body": body}
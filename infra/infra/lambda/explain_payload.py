@@ -0,0 +1,99 @@
+"""
+Explain payload — construit la réponse /explain d'un IRIS.
+
+Appelé au moment du scoring (attach) : chaque item de score embarque sa réponse
+déjà sérialisée et compressée (`explain_head_gz`), cohérente avec la version qui l'a
+produite. Le JSON est stocké sans son "}" final : explain_handler le décompresse et y
+ajoute les preuves de la requête, sans le re-sérialiser.
+build_explain ne sert à la requête que pour les items qui n'en ont pas (démo).
+"""
+import gzip
+import json
+from decimal import Decimal
+
+INTENDED_USE = "For planning & risk management; not for discriminatory decisions or speculative targeting."
+
+LIMITATIONS = [
+    "This is an MVP demo: limited documents and simplified geo-mapping.",
+    "No individual-level data; sentiment is OFF by design for privacy and bias control.",
+    "Scores are decision-support signals, not a guarantee of future market outcomes.",
+]
+
+ETHICS = [
+    "Use for planning and risk management (banks, brokers, developers).",
+    "Not intended for discriminatory decisions or speculative targeting that could accelerate displacement.",
+]
+
+NEXT_STEPS = [
+    "Replace demo geo-mapping with real IRIS + 500m grid lookup.",
+    "Ingestion pipeline: Textract -> Bedrock batch structuring -> DynamoDB signals.",
+    "Scoring pipeline: SageMaker batch inference + bias audit (Clarify) for gentrification risk.",
+]
+
+ROADMAP = [
+    "Integrate real IRIS lookup + optional 500m grid for custom geo queries (Paris -> Lyon scalability).",
+    "Ingestion: Textract (PDF) -> Bedrock batch structuring into normalized signals (cost-optimized).",
+    "Scoring: SageMaker batch inference + drift monitoring + bias audit (Clarify) for gentrification risk.",
+    "Optional: privacy-safe aggregated sentiment (opt-in, RGPD-aware) with low weight in the model.",
+]
+
+
+def _to_float(x):
+    if isinstance(x, Decimal):
+        return float(x)
+    return x
+
+
+def build_explain(item: dict, evidence: list = None) -> dict:
+    """Réponse /explain complète à partir d'un item de score (valeurs float ou Decimal)."""
+    iris_id = item.get("iris_id")
+    score = _to_float(item.get("future_value_score"))
+    momentum = item.get("momentum")
+    confidence = _to_float(item.get("confidence"))
+    freshness = _to_float(item.get("data_freshness_days"))
+    top_signals = [s.strip() for s in (item.get("top_signals") or "").split("|") if s.strip()]
+
+    # Short, enterprise-friendly explanation
+    explanation = {
+        "summary": f"{iris_id} shows {momentum} momentum with a 5-year Future Value Score of {score}.",
+        "why": [
+            "Signals were aggregated at IRIS-level (pilot: Paris) and converted into a structured feature set.",
+            f"Confidence ({confidence}) reflects data volume + signal consistency; freshness is ~{freshness} days.",
+        ],
+        "top_signals": top_signals,
+        "limitations": LIMITATIONS,
+        "ethics": ETHICS,
+        "next_steps": NEXT_STEPS,
+        "roadmap": ROADMAP,
+    }
+    if evidence is not None:
+        explanation["evidence"] = evidence
+
+    return {
+        "iris_id": iris_id,
+        "city": item.get("city", "Paris"),
+        "future_value_score": score,
+        "momentum": momentum,
+        "confidence": confidence,
+        "data_freshness_days": freshness,
+        "updated_at": item.get("updated_at"),
+        "score_version": item.get("version"),
+        "intended_use": INTENDED_USE,
+        "explanation": explanation,
+    }
+
+
+def encode_head(payload: dict) -> bytes:
+    """
+    JSON compact + gzip (niveau 9 : compressé une fois au batch, lu à chaque requête),
+    sans l'accolade fermante : objet JSON encore ouvert, complété à la requête.
+    """
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return gzip.compress(raw[:-1], compresslevel=9, mtime=0)
+
+
+def attach(items: list[dict], version: str) -> None:
+    """Remplace l'`evidence` de chaque item par sa réponse /explain pré-sérialisée (`explain_head_gz`)."""
+    for item in items:
+        evidence = item.pop("evidence", [])
+        item["explain_head_gz"] = encode_head(build_explain({**item, "version": version}, evidence))
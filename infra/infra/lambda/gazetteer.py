@@ -0,0 +1,256 @@
+"""
+Gazetteer local — résout les `location_hint` libres de Nova ("quartier Batignolles",
+"rue de Rivoli") vers un IRIS, sans appel de géocodage externe.
+
+Un artefact par ville (construit par tools/build_gazetteer.py à partir d'un extrait BAN
+et des quartiers), geo/<city>/gazetteer.json.gz, JSON gzip :
+{
+  "version": 1,
+  "entries": [[name, kind, iris_id, city, weight], ...]
+}
+
+Index en mémoire :
+  - index inversé token normalisé -> entrées
+  - tableau trié des tokens (bisect) pour les préfixes et le flou (Levenshtein borné)
+
+Chaque conteneur ne charge que les gazetteers des villes dont il a traité des documents.
+"""
+import gzip
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from functools import lru_cache
+
+import cities
+
+logger = logging.getLogger()
+
+ARTIFACTS_BUCKET = os.environ.get("ARTIFACTS_BUCKET", "")
+GAZETTEER_PATH = os.environ.get("GAZETTEER_PATH", "")
+MIN_MATCH_SCORE = float(os.environ.get("GAZETTEER_MIN_SCORE", "0.6"))
+RETRY_SECONDS = float(os.environ.get("GAZETTEER_RETRY_SECONDS", "60"))
+
+_STOPWORDS = {
+    "a", "au", "aux", "d", "de", "des", "du", "en", "et", "l", "la", "le", "les", "sur",
+    "quartier", "secteur", "zone", "proche", "pres", "autour", "environs", "paris", "lyon",
+}
+
+# Types de voie : conservés (ils distinguent "rue" de "place") mais peu pondérés
+_VOIE_TYPES = {
+    "rue", "avenue", "boulevard", "place", "quai", "impasse", "passage", "allee",
+    "cours", "square", "villa", "cite", "chemin", "route", "porte", "pont", "port",
+    "sentier", "galerie", "parvis", "esplanade", "rond", "point", "jardin", "hameau",
+}
+
+_ABBREVIATIONS = {
+    "av": "avenue", "ave": "avenue", "bd": "boulevard", "bld": "boulevard", "blvd": "boulevard",
+    "pl": "place", "r": "rue", "imp": "impasse", "pass": "passage", "sq": "square",
+    "st": "saint", "ste": "sainte", "fg": "faubourg", "fbg": "faubourg", "all": "allee",
+    "arr": "arrondissement", "gal": "general", "mal": "marechal", "pdt": "president",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_VOIE_TYPE_WEIGHT = 0.25
+_SEED_POSTINGS = 256
+
+
+def normalize(text: str) -> list[str]:
+    """Minuscules, sans accents, abréviations développées, mots vides retirés."""
+    if not text:
+        return []
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    tokens = []
+    for tok in _TOKEN_RE.findall(folded):
+        tok = _ABBREVIATIONS.get(tok, tok)
+        if tok not in _STOPWORDS:
+            tokens.append(tok)
+    return tokens
+
+
+def _bounded_levenshtein(a: str, b: str, max_dist: int) -> int:
+    """Distance d'édition, abandonnée dès qu'elle dépasse max_dist (retourne max_dist + 1)."""
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            current.append(cost)
+            row_min = min(row_min, cost)
+        if row_min > max_dist:
+            return max_dist + 1
+        previous = current
+    return previous[-1]
+
+
+class Gazetteer:
+    """Index token/préfixe immuable construit une fois par conteneur."""
+
+    def __init__(self, entries: list):
+        self.entries = [tuple(e) for e in entries]
+        postings: dict[str, list[int]] = {}
+        self._entry_tokens: list[frozenset] = []
+        for idx, entry in enumerate(self.entries):
+            tokens = frozenset(normalize(entry[0]))
+            self._entry_tokens.append(tokens)
+            for tok in tokens:
+                postings.setdefault(tok, []).append(idx)
+        self._postings = postings
+        self._sorted_tokens = sorted(postings)
+        n = max(len(self.entries), 1)
+        self._idf = {
+            tok: (_VOIE_TYPE_WEIGHT if tok in _VOIE_TYPES else 1.0) * math.log(1 + n / len(ids))
+            for tok, ids in postings.items()
+        }
+        self._entry_weight = [sum(self._idf[t] for t in toks) for toks in self._entry_tokens]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _candidates(self, token: str) -> list[tuple[str, float]]:
+        """Tokens de l'index proches de `token` avec leur similarité (exact > préfixe > flou)."""
+        if token in self._postings:
+            return [(token, 1.0)]
+        found = []
+        # Préfixe : "batign" -> "batignolles" (plage contiguë du tableau trié)
+        if len(token) >= 3:
+            i = bisect_left(self._sorted_tokens, token)
+            while i < len(self._sorted_tokens) and self._sorted_tokens[i].startswith(token):
+                found.append((self._sorted_tokens[i], 0.9))
+                i += 1
+                if len(found) >= 20:
+                    break
+        if found or len(token) < 4:
+            return found
+        # Flou : mêmes deux premières lettres, distance <= 1 (<= 2 au-delà de 7 caractères)
+        max_dist = 1 if len(token) <= 7 else 2
+        head = token[:2]
+        i = bisect_left(self._sorted_tokens, head)
+        while i < len(self._sorted_tokens) and self._sorted_tokens[i].startswith(head):
+            cand = self._sorted_tokens[i]
+            dist = _bounded_levenshtein(token, cand, max_dist)
+            if dist <= max_dist:
+                found.append((cand, 1.0 - dist / max(len(token), len(cand))))
+            i += 1
+        return found
+
+    def lookup(self, hint: str, min_score: float = MIN_MATCH_SCORE):
+        """
+        Retourne {"iris_id", "score", "name", "kind", "city"} pour la meilleure entrée,
+        ou None si aucune ne dépasse min_score. Score = Dice pondéré IDF entre tokens.
+        """
+        tokens = set(normalize(hint))
+        if not tokens:
+            return None
+
+        # Tokens traités du plus rare au plus fréquent : seuls les tokens rares (ou le premier)
+        # ouvrent de nouveaux candidats, les tokens fréquents ("rue", "saint") ne font que
+        # renforcer ceux déjà trouvés — évite de parcourir des milliers d'entrées par hint.
+        per_token = []
+        for tok in tokens:
+            candidates = self._candidates(tok)
+            per_token.append((sum(len(self._postings[c]) for c, _ in candidates), tok, candidates))
+        per_token.sort()
+
+        hint_weight = 0.0
+        acc: dict[int, float] = {}
+        for postings_size, tok, candidates in per_token:
+            best_idf = max((self._idf[c] for c, _ in candidates), default=None)
+            hint_weight += best_idf if best_idf is not None else (_VOIE_TYPE_WEIGHT if tok in _VOIE_TYPES else 1.0)
+            if not candidates:
+                continue
+            if not acc or postings_size <= _SEED_POSTINGS:
+                seen: dict[int, float] = {}
+                for cand, sim in candidates:
+                    gain = sim * self._idf[cand]
+                    for idx in self._postings[cand]:
+                        if gain > seen.get(idx, 0.0):
+                            seen[idx] = gain
+            else:
+                seen = {}
+                for idx in acc:
+                    gain = max((sim * self._idf[c] for c, sim in candidates if c in self._entry_tokens[idx]), default=0.0)
+                    if gain:
+                        seen[idx] = gain
+            for idx, gain in seen.items():
+                acc[idx] = acc.get(idx, 0.0) + gain
+
+        best_idx, best_score = None, 0.0
+        for idx, matched in acc.items():
+            score = 2 * matched / (hint_weight + self._entry_weight[idx])
+            # À score égal, on privilégie l'entrée la plus "lourde" (plus d'adresses)
+            if score > best_score or (score == best_score and best_idx is not None
+                                      and self.entries[idx][4] > self.entries[best_idx][4]):
+                best_idx, best_score = idx, score
+        if best_idx is None or best_score < min_score:
+            return None
+        name, kind, iris_id, city, _ = self.entries[best_idx]
+        return {"iris_id": iris_id, "score": round(min(best_score, 1.0), 3), "name": name, "kind": kind, "city": city}
+
+    def resolve_many(self, hints) -> list:
+        """Résout une liste de hints ; les doublons (fréquents dans un même run) passent par le cache."""
+        return [_cached_lookup(self, h) for h in hints]
+
+
+@lru_cache(maxsize=8192)
+def _cached_lookup(gaz: Gazetteer, hint: str):
+    return gaz.lookup(hint)
+
+
+def loads(raw: bytes) -> Gazetteer:
+    """Construit un Gazetteer depuis l'artefact (gzip ou JSON brut)."""
+    if raw[:2] == b"\x1f\x8b":
+        raw = gzip.decompress(raw)
+    doc = json.loads(raw)
+    return Gazetteer(doc["entries"])
+
+
+_gazetteers: dict = {}
+_retry_at: dict = {}
+_lock = threading.Lock()
+
+
+def get_gazetteer(city: str = None):
+    """
+    Charge l'index d'une ville une fois par conteneur (verrou : un seul chargement même
+    sous appels concurrents) : GAZETTEER_PATH (fichier local, toutes villes) sinon
+    s3://ARTIFACTS_BUCKET/geo/<city>/gazetteer.json.gz. None si aucun artefact n'est
+    disponible ; après un échec, nouvel essai après RETRY_SECONDS seulement.
+    """
+    city = cities.slug(city)
+    gaz = _gazetteers.get(city)
+    if gaz is not None or _retry_at.get(city, 0.0) > time.monotonic():
+        return gaz
+    with _lock:
+        if city in _gazetteers:
+            return _gazetteers[city]
+        if _retry_at.get(city, 0.0) > time.monotonic():
+            return None
+        try:
+            if GAZETTEER_PATH:
+                with open(GAZETTEER_PATH, "rb") as f:
+                    raw = f.read()
+            elif ARTIFACTS_BUCKET:
+                import boto3
+                obj = boto3.client("s3").get_object(Bucket=ARTIFACTS_BUCKET,
+                                                    Key=cities.artifact_key(city, cities.GAZETTEER_NAME))
+                raw = obj["Body"].read()
+            else:
+                return None
+            gaz = loads(raw)
+            logger.info(f"Gazetteer chargé ({city}) : {len(gaz)} entrées")
+        except Exception as e:
+            logger.warning(f"Gazetteer indisponible ({city}) : {e}")
+            _retry_at[city] = time.monotonic() + RETRY_SECONDS
+            return None
+        _gazetteers[city] = gaz
+        return gaz
@@ -1,19 +1,64 @@
+"""
+Health handler — deux modes :
+  /health            shallow : répond depuis la mémoire du conteneur (dernier résultat
+                     deep s'il date de moins de HEALTH_CACHE_SECONDS, sinon simple
+                     liveness). Aucun appel AWS.
+  /health?deep=1     deep : sonde toutes les dépendances en parallèle (timeout par
+                     sonde) ; le résultat composite est mis en cache
+                     HEALTH_CACHE_SECONDS par conteneur, donc un monitor fréquent ne
+                     coûte qu'une série de sondes par intervalle.
+
+Statut composite : FAIL (500) si une sonde critique échoue (pointeur, manifeste et un
+item de la version active), DEGRADED (200) si seule une sonde secondaire échoue
+(signaux, artefacts), sinon PASS. Pour chaque ville de HEALTH_CITIES : version active,
+index IRIS, gazetteer, snapshot et modèle de mailles de la version active.
+"""
 import json
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
 from decimal import Decimal
 
 import boto3
+from botocore.config import Config
+
+import cell_model
+import changes
+import cities
+import compression
+import metrics
+import profiling
+import reqlog
+import score_store
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 SCORES_TABLE = os.environ.get("SCORES_TABLE", "")
-dynamodb = boto3.resource("dynamodb")
+SIGNALS_TABLE = os.environ.get("SIGNALS_TABLE", "")
+ARTIFACTS_BUCKET = os.environ.get("ARTIFACTS_BUCKET", "")
+HEALTH_CITIES = [c for c in os.environ.get("HEALTH_CITIES", cities.DEFAULT_CITY).split(",") if c]
+HEALTH_CACHE_SECONDS = float(os.environ.get("HEALTH_CACHE_SECONDS", "60"))
+PROBE_TIMEOUT_SECONDS = float(os.environ.get("HEALTH_PROBE_TIMEOUT", "1.0"))
+
+# Timeouts courts et une seule tentative : une dépendance lente doit apparaître comme telle
+_probe_config = Config(connect_timeout=PROBE_TIMEOUT_SECONDS, read_timeout=PROBE_TIMEOUT_SECONDS,
+                       retries={"max_attempts": 1})
+dynamodb = boto3.resource("dynamodb", config=_probe_config)
 table = dynamodb.Table(SCORES_TABLE) if SCORES_TABLE else None
+signals_table = dynamodb.Table(SIGNALS_TABLE) if SIGNALS_TABLE else None
+s3_client = boto3.client("s3", config=_probe_config)
+
+# Une sonde qui dépasse son timeout garde son thread : le pool est dimensionné en conséquence
+_executor = ThreadPoolExecutor(max_workers=8)
+_cache = {"result": None, "expires": 0.0, "checked_at": None}
 
 INTENDED_USE = "For planning & risk management; not for discriminatory decisions or speculative targeting."
 
+REQUIRED_FIELDS = ["future_value_score", "confidence", "momentum", "updated_at"]
+
 
 def _to_float(x):
     if isinstance(x, Decimal):
@@ -21,46 +66,170 @@ def _to_float(x):
     return x
 
 
-def handler(event, context):
-    logger.info("Health check request received")
-
+def _active_version(city: str) -> str:
     if not table:
-        return {
-            "statusCode": 500,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"status": "FAIL", "reason": "SCORES_TABLE not set", "intended_use": INTENDED_USE}),
-        }
+        raise RuntimeError("SCORES_TABLE not set")
+    version = score_store.get_pointer(table, city, consistent=False).get("active_version")
+    if not version:
+        raise RuntimeError(f"No published score version for {city}")
+    return version
 
-    iris_id = "PARIS_DEMO_3"
-    resp = table.get_item(Key={"iris_id": iris_id})
-    item = resp.get("Item")
 
-    if not item:
-        return {
-            "statusCode": 500,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"status": "FAIL", "reason": f"Missing item {iris_id}", "intended_use": INTENDED_USE}),
-        }
+def _control_iris(city: str, manifest: dict):
+    """IRIS de contrôle : celui du manifeste, sinon le premier centroïde de l'index de la ville."""
+    if manifest.get("sample_iris_id"):
+        return manifest["sample_iris_id"]
+    index = cities.get_index(city)
+    return next((iris_id for iris_id, _, _ in index.rows()), None) if index else None
+
 
-    required = ["future_value_score", "confidence", "momentum", "updated_at"]
-    missing = [k for k in required if k not in item]
-    if missing:
+def _probe_scores(city: str):
+    """Pointeur (lecture non cachée), manifeste non vide de la version active, puis un item de contrôle."""
+    def probe() -> dict:
+        version = _active_version(city)
+        manifest = score_store.get_manifest(table, version, city, consistent=False)
+        if not manifest:
+            raise RuntimeError(f"Missing manifest for {city} version {version}")
+        if not int(manifest.get("item_count") or 0) > 0:
+            raise RuntimeError(f"Empty score version {version} for {city}")
+        iris_id = _control_iris(city, manifest)
+        if not iris_id:
+            raise RuntimeError(f"No control IRIS for {city} (manifest nor IRIS index)")
+        item = table.get_item(Key={"iris_id": iris_id, "version": version}).get("Item")
+        if not item:
+            raise RuntimeError(f"Missing item {iris_id} in version {version}")
+        missing = [k for k in REQUIRED_FIELDS if k not in item]
+        if missing:
+            raise RuntimeError(f"Missing fields: {', '.join(missing)}")
         return {
-            "statusCode": 500,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"status": "FAIL", "reason": "Missing fields", "missing": missing, "intended_use": INTENDED_USE}),
+            "score_version": version,
+            "city": city,
+            "item_count": int(manifest["item_count"]),
+            "checked_iris_id": iris_id,
+            "future_value_score": _to_float(item.get("future_value_score")),
+            "confidence": _to_float(item.get("confidence")),
         }
+    return probe
+
+
+def _probe_signals() -> dict:
+    if not signals_table:
+        raise RuntimeError("SIGNALS_TABLE not set")
+    signals_table.get_item(Key={"pk": "#HEALTH", "sk": "#HEALTH"})
+    return {}
+
+
+def _head(key: str) -> dict:
+    if not ARTIFACTS_BUCKET:
+        raise RuntimeError("ARTIFACTS_BUCKET not set")
+    head = s3_client.head_object(Bucket=ARTIFACTS_BUCKET, Key=key)
+    return {"key": key, "bytes": head.get("ContentLength"), "last_modified": str(head.get("LastModified", ""))}
+
+
+def _probe_artifact(key: str):
+    return lambda: _head(key)
 
+
+def _probe_version_artifact(city: str, key_of):
+    """HEAD d'un artefact de la version active de `city` (key_of(city, version) -> clé S3)."""
+    return lambda: _head(key_of(city, _active_version(city)))
+
+
+# (nom, sonde, critique)
+PROBES = [
+    ("signals_table", _probe_signals, False),
+] + [
+    probe
+    for city in HEALTH_CITIES
+    for probe in (
+        (f"scores_{city}", _probe_scores(city), True),
+        (f"gazetteer_artifact_{city}", _probe_artifact(cities.artifact_key(city, cities.GAZETTEER_NAME)), False),
+        (f"iris_artifact_{city}", _probe_artifact(cities.artifact_key(city, cities.IRIS_INDEX_NAME)), False),
+        (f"snapshot_artifact_{city}", _probe_version_artifact(city, changes.snapshot_key), False),
+        (f"cell_model_artifact_{city}", _probe_version_artifact(city, cell_model.model_key), False),
+    )
+]
+# Détail de la première ville remonté au premier niveau de la réponse (score_version, city...)
+SUMMARY_PROBE = f"scores_{HEALTH_CITIES[0]}" if HEALTH_CITIES else None
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    detail = fn()
+    return detail, (time.perf_counter() - t0) * 1000
+
+
+def run_probes() -> dict:
+    """Lance toutes les sondes en parallèle ; chacune a PROBE_TIMEOUT_SECONDS pour répondre."""
+    futures = [(name, critical, _executor.submit(_timed, fn)) for name, fn, critical in PROBES]
+    deadline = time.monotonic() + PROBE_TIMEOUT_SECONDS
+    checks, extra = {}, {}
+    for name, critical, future in futures:
+        try:
+            detail, ms = future.result(timeout=max(deadline - time.monotonic(), 0.0))
+            checks[name] = {"status": "PASS", "latency_ms": round(ms, 1), "critical": critical}
+            if name == SUMMARY_PROBE:
+                extra = detail
+            elif detail:
+                checks[name]["detail"] = detail
+        except FutureTimeout:
+            checks[name] = {"status": "TIMEOUT", "latency_ms": round(PROBE_TIMEOUT_SECONDS * 1000, 1),
+                            "critical": critical}
+        except Exception as e:
+            checks[name] = {"status": "FAIL", "reason": str(e), "critical": critical}
+
+    failed = [n for n, c in checks.items() if c["status"] != "PASS"]
+    if any(checks[n]["critical"] for n in failed):
+        status = "FAIL"
+    elif failed:
+        status = "DEGRADED"
+    else:
+        status = "PASS"
+    return {"status": status, **extra, "checks": checks}
+
+
+def _response(result: dict, mode: str, cached: bool, age_s: float = None) -> dict:
+    body = {**result, "mode": mode, "cached": cached}
+    if age_s is not None:
+        body["age_s"] = round(age_s, 1)
+    body["intended_use"] = INTENDED_USE
     return {
-        "statusCode": 200,
-        "headers": {"Content-Type": "application/json"},
-        "body": json.dumps(
-            {
-                "status": "PASS",
-                "checked_iris_id": iris_id,
-                "future_value_score": _to_float(item.get("future_value_score")),
-                "confidence": _to_float(item.get("confidence")),
-                "intended_use": INTENDED_USE,
-            }
-        ),
+        "statusCode": 500 if result["status"] == "FAIL" else 200,
+        "headers": {"Content-Type": "application/json", "Cache-Control": "no-store"},
+        "body": json.dumps(body),
     }
+
+
+@metrics.instrument("health")
+@reqlog.logged("health")
+@profiling.profiled("health")
+@compression.negotiated
+def handler(event, context):
+    q = event.get("queryStringParameters") or {}
+    deep = (q.get("deep") or "").lower() in ("1", "true", "yes") or q.get("mode") == "deep"
+    now = time.monotonic()
+    cached = _cache["result"]
+
+    if not deep:
+        # Shallow : mémoire seulement (le conteneur répond = il est vivant) ; un résultat
+        # deep périmé n'est pas resservi, un FAIL ancien ne doit pas tuer la liveness
+        if cached and now - _cache["checked_at"] < HEALTH_CACHE_SECONDS:
+            return _response(cached, "shallow", True, now - _cache["checked_at"])
+        checks = "deep check stale" if cached else "deep check not run yet"
+        return _response({"status": "PASS", "checks": checks}, "shallow", False)
+
+    if cached and now < _cache["expires"]:
+        metrics.put("HealthCacheHit", 1, "Count")
+        return _response(cached, "deep", True, now - _cache["checked_at"])
+
+    with metrics.timer("HealthProbeLatency"):
+        result = run_probes()
+    for name, check in result["checks"].items():
+        if "latency_ms" in check:
+            metrics.put(f"Probe_{name}", check["latency_ms"])
+    metrics.set_property("HealthStatus", result["status"])
+    if result["status"] != "PASS":
+        logger.warning(f"Health {result['status']}: {json.dumps(result['checks'])}")
+
+    _cache.update(result=result, expires=now + HEALTH_CACHE_SECONDS, checked_at=now)
+    return _response(result, "deep", False, 0.0)
@@ -0,0 +1,239 @@
+"""
+History — série temporelle des scores de chaque IRIS, encodée en deltas.
+
+Un item par IRIS dans PrenScoresTable : {"iris_id": <iris>, "version": "#HISTORY"}
+(hors de toute version : ni publié, ni supprimé par delete_version).
+
+  series   binaire : octet de format puis, par run de scoring, deux varints
+             - delta de temps (secondes depuis le run précédent ; absolu pour le 1er) ;
+             - zigzag(delta score x100) puis zigzag(delta confiance x100) * 3 + momentum
+               dans un second varint.
+           Un run sans changement de score coûte ~4 octets (delta de temps d'un jour :
+           3 octets) ; 10 ans de runs quotidiens tiennent en ~15 Ko.
+  last     dernier point décodé [ts, score x100, confiance x100, momentum] : l'ajout
+           d'un run concatène un point sans décoder la série.
+  points   nombre de points.
+  restored {ts: version} des points de republication (voir plus bas), absent sinon.
+
+publish_handler ajoute la version publiée à la série de chaque IRIS (BatchGetItem de
+l'existant, puis batch_writer) depuis son snapshot : une version seulement stagée, un
+publish refusé (409) ou une version supprimée n'entrent jamais dans la série. Le rejeu
+de la dernière version n'ajoute rien. Une version plus ancienne republiée (rollback)
+ajoute un point horodaté à la republication, sa version notée dans `restored` : après
+un rollback, /history et as_of rendent les valeurs restaurées.
+
+Lecture : /history décode la série (une lecture, quelques µs par point) ; /score?as_of=
+retrouve la valeur à une date par bisection sur les timestamps décodés, sans parcourir
+les versions stockées.
+"""
+import bisect
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import cities
+
+HISTORY_SK = "#HISTORY"
+FORMAT_VERSION = 1
+MOMENTUM_CODES = {"Low": 0, "Medium": 1, "High": 2}
+MOMENTUM_LABELS = {v: k for k, v in MOMENTUM_CODES.items()}
+VERSION_FORMAT = "%Y%m%dT%H%M%SZ"
+BATCH_GET_KEYS = 100
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _unzigzag(n: int) -> int:
+    return (n >> 1) ^ -(n & 1)
+
+
+def _varint(n: int, out: bytearray) -> None:
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def encode_point(prev, point) -> bytes:
+    """Octets d'un point (ts, score, conf, momentum) relativement au précédent (None : absolu)."""
+    ts, score, conf, momentum = point
+    p_ts, p_score, p_conf = prev[:3] if prev else (0, 0, 0)
+    out = bytearray()
+    _varint(ts - p_ts, out)
+    _varint(_zigzag(score - p_score), out)
+    _varint(_zigzag(conf - p_conf) * 3 + momentum, out)
+    return bytes(out)
+
+
+def encode(points: list) -> bytes:
+    out = bytearray([FORMAT_VERSION])
+    prev = None
+    for point in points:
+        out += encode_point(prev, point)
+        prev = point
+    return bytes(out)
+
+
+def decode(blob: bytes) -> list:
+    """[(ts, score x100, conf x100, momentum)] dans l'ordre des runs."""
+    blob = bytes(blob)
+    if not blob:
+        return []
+    if blob[0] != FORMAT_VERSION:
+        raise ValueError(f"unknown history format {blob[0]}")
+    values, n, shift = [], 0, 0
+    for byte in blob[1:]:
+        n |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append(n)
+        n, shift = 0, 0
+    points = []
+    ts = score = conf = 0
+    for k in range(0, len(values) - len(values) % 3, 3):
+        ts += values[k]
+        score += _unzigzag(values[k + 1])
+        conf_code, momentum = divmod(values[k + 2], 3)
+        conf += _unzigzag(conf_code)
+        points.append((ts, score, conf, momentum))
+    return points
+
+
+def version_ts(version: str):
+    """Timestamp (s) d'un identifiant de version score_store.new_version, None sinon."""
+    try:
+        return int(datetime.strptime(version, VERSION_FORMAT).replace(tzinfo=timezone.utc).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def ts_version(ts: int) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime(VERSION_FORMAT)
+
+
+def parse_as_of(value: str, end_of_day: bool = True) -> int:
+    """Date ISO 8601 (ou identifiant de version) -> timestamp ; une date seule vaut sa fin (ou son début)."""
+    ts = version_ts(value)
+    if ts is not None:
+        return ts
+    try:
+        day = date.fromisoformat(value)   # 2026-01-05 comme 20260105
+    except ValueError:
+        day = None
+    if day is not None:
+        start = int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())
+        return start + (86399 if end_of_day else 0)
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def point_of(item: dict, ts: int) -> tuple:
+    return (ts, round(float(item["future_value_score"]) * 100), round(float(item["confidence"]) * 100),
+            MOMENTUM_CODES.get(item.get("momentum"), 0))
+
+
+def version_of(point, restored: dict = None) -> str:
+    """Version d'un point : celle notée pour une republication, sinon celle de son horodatage."""
+    return (restored or {}).get(str(point[0])) or ts_version(point[0])
+
+
+def to_json(point, restored: dict = None) -> dict:
+    ts, score, conf, momentum = point
+    return {
+        "score_version": version_of(point, restored),
+        "scored_at": datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+        "future_value_score": score / 100,
+        "confidence": conf / 100,
+        "momentum": MOMENTUM_LABELS.get(momentum, "Low"),
+    }
+
+
+# --- Écriture (publish_handler) ------------------------------------------------------
+
+def _load_existing(dynamodb, table, iris_ids: list) -> dict:
+    """iris_id -> item d'historique existant (BatchGetItem, lots de 100)."""
+    found = {}
+    for start in range(0, len(iris_ids), BATCH_GET_KEYS):
+        request = {table.name: {
+            "Keys": [{"iris_id": i, "version": HISTORY_SK} for i in iris_ids[start:start + BATCH_GET_KEYS]],
+            "ProjectionExpression": "iris_id, series, #l, points, restored",
+            "ExpressionAttributeNames": {"#l": "last"},
+        }}
+        attempt = 0
+        while request:
+            resp = dynamodb.batch_get_item(RequestItems=request)
+            for item in resp.get("Responses", {}).get(table.name, []):
+                found[item["iris_id"]] = item
+            request = resp.get("UnprocessedKeys") or None
+            if request:
+                attempt += 1
+                time.sleep(min(0.05 * 2 ** attempt, 2.0))
+    return found
+
+
+def append_run(dynamodb, table, version: str, items: list[dict], city: str = None, published_at: int = None) -> int:
+    """
+    Ajoute le run `version` à la série de chaque IRIS de `items` ; retourne le nombre de
+    séries écrites. `published_at` (timestamp de la publication) horodate le point d'une
+    version plus ancienne que le dernier point (rollback) ; sans lui, elle n'ajoute rien.
+    """
+    ts = version_ts(version)
+    if ts is None:
+        raise ValueError(f"version {version!r} is not a timestamp version")
+    existing = _load_existing(dynamodb, table, [it["iris_id"] for it in items])
+    written = 0
+    with table.batch_writer() as batch:
+        for item in items:
+            current = existing.get(item["iris_id"])
+            point_ts, restored = ts, {}
+            if current is None:
+                series, prev, count = bytes([FORMAT_VERSION]), None, 0
+            else:
+                series, count = bytes(current["series"]), int(current.get("points", 0))
+                prev = tuple(int(x) for x in current["last"])
+                restored = dict(current.get("restored") or {})
+                if prev[0] >= ts:
+                    if version_of(prev, restored) == version or published_at is None or published_at <= prev[0]:
+                        continue   # run déjà enregistré (rejeu)
+                    point_ts = published_at
+                    restored[str(point_ts)] = version
+            point = point_of(item, point_ts)
+            record = {
+                "iris_id": item["iris_id"],
+                "version": HISTORY_SK,
+                "city_key": cities.slug(city),
+                "series": series + encode_point(prev, point),
+                "last": [Decimal(x) for x in point],
+                "points": count + 1,
+            }
+            if restored:
+                record["restored"] = restored
+            batch.put_item(Item=record)
+            written += 1
+    return written
+
+
+# --- Lecture (API) ----------------------------------------------------------------
+
+def get_series(table, iris_id: str) -> list:
+    return read(table, iris_id)[0]
+
+
+def read(table, iris_id: str) -> tuple:
+    """(points, restored) de l'IRIS ; ([], {}) sans historique."""
+    item = table.get_item(Key={"iris_id": iris_id, "version": HISTORY_SK},
+                          ProjectionExpression="series, restored").get("Item")
+    if not item:
+        return [], {}
+    return decode(item["series"]), dict(item.get("restored") or {})
+
+
+def at(points: list, ts: int):
+    """Dernier point au plus tard à `ts` (bisection), None si la série commence après."""
+    k = bisect.bisect_right([p[0] for p in points], ts)
+    return points[k - 1] if k else None
@@ -0,0 +1,94 @@
+"""
+History handler — GET /history : série des scores d'un IRIS, un point par run de scoring.
+Une seule lecture (item "#HISTORY" de l'IRIS, voir history.py) décodée en mémoire ;
+`from` / `to` filtrent par date, `limit` garde les derniers points.
+"""
+import json
+import logging
+import os
+
+import boto3
+
+import cities
+import compression
+import history
+import metrics
+import profiling
+import reqlog
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+SCORES_TABLE = os.environ.get("SCORES_TABLE", "")
+HISTORY_MAX_POINTS = int(os.environ.get("HISTORY_MAX_POINTS", "1000"))
+
+dynamodb = boto3.resource("dynamodb")
+table = dynamodb.Table(SCORES_TABLE) if SCORES_TABLE else None
+
+INTENDED_USE = "For planning & risk management; not for discriminatory decisions or speculative targeting."
+
+
+def _error(status: int, message: str, **extra):
+    return {
+        "statusCode": status,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps({"error": message, **extra, "intended_use": INTENDED_USE}),
+    }
+
+
+@metrics.instrument("history")
+@reqlog.logged("history")
+@profiling.profiled("history")
+@compression.negotiated
+def handler(event, context):
+    if not table:
+        return _error(500, "SCORES_TABLE not configured")
+
+    q = event.get("queryStringParameters") or {}
+    iris_id = q.get("iris_id")
+    city = cities.city_of_iris(iris_id) if iris_id else None
+    if not iris_id and q.get("lat") and q.get("lng"):
+        try:
+            city, iris_id = cities.resolve(float(q["lat"]), float(q["lng"]))
+        except ValueError:
+            return _error(400, "lat/lng must be numbers")
+        if iris_id is None:
+            error = "Location outside supported cities" if city is None else "No IRIS found near location"
+            return _error(404, error, city=city)
+    if not iris_id:
+        return _error(400, "Provide iris_id or lat/lng",
+                      examples=["/history?iris_id=751010101", "/history?iris_id=751010101&from=2026-01-01&limit=30"])
+
+    try:
+        start = history.parse_as_of(q["from"], end_of_day=False) if q.get("from") else None
+        end = history.parse_as_of(q["to"]) if q.get("to") else None
+        limit = min(int(q.get("limit") or HISTORY_MAX_POINTS), HISTORY_MAX_POINTS)
+        if limit <= 0:
+            raise ValueError
+    except ValueError:
+        return _error(400, "from/to must be ISO 8601 dates or score versions, limit a positive integer")
+    reqlog.field("city", city)
+    reqlog.field("iris_id", iris_id)
+
+    with metrics.timer("HistoryReadLatency"):
+        points, restored = history.read(table, iris_id)
+    if not points:
+        return _error(404, "No history for iris_id", iris_id=iris_id)
+
+    total = len(points)
+    points = [p for p in points if (start is None or p[0] >= start) and (end is None or p[0] <= end)]
+    points = points[-limit:]
+    metrics.put("HistoryPoints", len(points), "Count")
+
+    out = {
+        "iris_id": iris_id,
+        "city": cities.name(city),
+        "total_points": total,
+        "points": [history.to_json(p, restored) for p in points],
+        "intended_use": INTENDED_USE,
+    }
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(out),
+    }
@@ -1,16 +1,21 @@
 import json
 import logging
 
+import metrics
+import profiling
+import reqlog
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+@metrics.instrument("ingest")
+@reqlog.logged("ingest")
+@profiling.profiled("ingest")
 def handler(event, context):
     """
     Ingest handler - validates input and logs request.
     Returns {"ok": true} as placeholder.
     """
-    logger.info(f"Received event: {json.dumps(event)}")
-    
     return {
         "statusCode": 200,
         "body": json.dumps({"ok": True})
@@ -0,0 +1,173 @@
+"""
+Jobs handler — API des jobs de scoring de portefeuille (voir portfolio.py).
+
+  POST /jobs/uploads     URL pré-signée PUT vers portfolios/<uuid>.csv du RawBucket
+  POST /jobs             {"s3_key": "portfolios/..."} ou {"source_url": "https://..."},
+                         "format": "csv" | "ndjson" -> 202 {job_id, status_url}
+  GET  /jobs/{job_id}    statut, progression, débit ; URL pré-signée du résultat une fois terminé
+"""
+import base64
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import boto3
+
+import compression
+import metrics
+import portfolio
+import profiling
+import reqlog
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+JOBS_TABLE = os.environ.get("JOBS_TABLE", "")
+RAW_BUCKET = os.environ.get("RAW_BUCKET", "")
+ARTIFACTS_BUCKET = os.environ.get("ARTIFACTS_BUCKET", "")
+STATE_MACHINE_ARN = os.environ.get("PORTFOLIO_STATE_MACHINE_ARN", "")
+MAX_PORTFOLIO_BYTES = int(os.environ.get("MAX_PORTFOLIO_BYTES", str(512 << 20)))
+PRESIGN_SECONDS = int(os.environ.get("PRESIGN_SECONDS", "3600"))
+
+s3_client = boto3.client("s3", region_name="eu-west-3")
+sfn_client = boto3.client("stepfunctions")
+dynamodb = boto3.resource("dynamodb")
+jobs_table = dynamodb.Table(JOBS_TABLE) if JOBS_TABLE else None
+
+
+def _json(status: int, payload: dict) -> dict:
+    return {
+        "statusCode": status,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(payload, default=lambda x: float(x) if isinstance(x, Decimal) else str(x)),
+    }
+
+
+def _body(event) -> dict:
+    raw = event.get("body") or "{}"
+    if event.get("isBase64Encoded"):
+        raw = base64.b64decode(raw).decode("utf-8")
+    payload = json.loads(raw)
+    if not isinstance(payload, dict):
+        raise ValueError("JSON object expected")
+    return payload
+
+
+def _create_upload(event) -> dict:
+    key = f"{portfolio.PORTFOLIO_PREFIX}{uuid.uuid4().hex}.csv"
+    url = s3_client.generate_presigned_url(
+        "put_object", Params={"Bucket": RAW_BUCKET, "Key": key, "ContentType": "text/csv"},
+        ExpiresIn=PRESIGN_SECONDS,
+    )
+    return _json(200, {"s3_key": key, "upload_url": url, "method": "PUT",
+                       "headers": {"Content-Type": "text/csv"}, "expires_in": PRESIGN_SECONDS})
+
+
+def _submit(event) -> dict:
+    try:
+        payload = _body(event)
+    except ValueError as e:
+        return _json(400, {"error": f"Invalid JSON body: {e}"})
+    fmt = payload.get("format", "csv")
+    if fmt not in portfolio.FORMATS:
+        return _json(400, {"error": f"format must be one of {', '.join(portfolio.FORMATS)}"})
+
+    key, url = payload.get("s3_key"), payload.get("source_url")
+    if bool(key) == bool(url):
+        return _json(400, {"error": "Provide exactly one of s3_key or source_url",
+                           "examples": [{"s3_key": "portfolios/book.csv"},
+                                        {"source_url": "https://bucket.s3.eu-west-3.amazonaws.com/book.csv?X-Amz-..."}]})
+    if key:
+        if not key.startswith(portfolio.PORTFOLIO_PREFIX) or ".." in key:
+            return _json(400, {"error": f"s3_key must be under {portfolio.PORTFOLIO_PREFIX}"})
+        try:
+            size = s3_client.head_object(Bucket=RAW_BUCKET, Key=key)["ContentLength"]
+        except Exception:
+            return _json(404, {"error": "Portfolio file not found", "s3_key": key})
+        if size > MAX_PORTFOLIO_BYTES:
+            return _json(413, {"error": f"Portfolio exceeds {MAX_PORTFOLIO_BYTES} bytes", "bytes": size})
+        source = {"bucket": RAW_BUCKET, "key": key}
+    else:
+        try:
+            source = {"url": portfolio.validate_source_url(url)}
+        except ValueError as e:
+            return _json(400, {"error": str(e)})
+
+    job_id = uuid.uuid4().hex
+    reqlog.field("job_id", job_id)
+    # L'URL pré-signée (accès au fichier le temps de sa validité) n'est pas écrite dans
+    # PrenJobsTable, lue par GET /jobs/{job_id} ; elle reste en revanche dans l'entrée de
+    # l'exécution, donc dans l'historique Step Functions jusqu'à sa purge
+    portfolio.create_job(jobs_table, job_id, {"s3_key": key} if key else {"source_url": "presigned"}, fmt)
+    try:
+        sfn_client.start_execution(stateMachineArn=STATE_MACHINE_ARN, name=job_id,
+                                   input=json.dumps({"job": {"job_id": job_id, "source": source, "format": fmt}}))
+    except Exception as e:
+        logger.error(f"Cannot start portfolio job {job_id}: {e}")
+        portfolio.finish_job(jobs_table, job_id, "failed", error="start failed")
+        return _json(502, {"error": "Cannot start job", "job_id": job_id})
+    metrics.put("PortfolioJobsSubmitted", 1, "Count")
+    logger.info(f"Portfolio job {job_id} submitted ({fmt})")
+    return _json(202, {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"})
+
+
+def _elapsed_seconds(item: dict):
+    started = item.get("started_at")
+    if not started:
+        return None
+    end = item.get("finished_at") or item.get("updated_at") or started
+    return max((datetime.fromisoformat(end) - datetime.fromisoformat(started)).total_seconds(), 0.0)
+
+
+def _status(job_id: str) -> dict:
+    item = jobs_table.get_item(Key={"job_id": job_id}, ConsistentRead=True).get("Item") if job_id else None
+    if not item:
+        return _json(404, {"error": "Job not found", "job_id": job_id})
+    rows = int(item.get("rows_done", 0))
+    elapsed = _elapsed_seconds(item)
+    out = {
+        "job_id": job_id,
+        "status": item["status"],
+        "format": item.get("format"),
+        "created_at": item.get("created_at"),
+        "started_at": item.get("started_at"),
+        "finished_at": item.get("finished_at"),
+        "rows_done": rows,
+        "rows_ok": int(item.get("rows_ok", 0)),
+        "bytes_done": int(item.get("bytes_done", 0)),
+        "elapsed_s": round(elapsed, 1) if elapsed is not None else None,
+        "throughput_rows_per_s": round(rows / elapsed, 1) if elapsed else None,
+    }
+    if item.get("bytes_total"):
+        out["bytes_total"] = int(item["bytes_total"])
+        out["progress"] = round(min(1.0, out["bytes_done"] / out["bytes_total"]), 4)
+    if item["status"] == "succeeded":
+        out["progress"] = 1.0
+        out["score_versions"] = item.get("score_versions")
+        out["result_key"] = item.get("result_key")
+        out["result_url"] = s3_client.generate_presigned_url(
+            "get_object", Params={"Bucket": ARTIFACTS_BUCKET, "Key": item["result_key"]}, ExpiresIn=PRESIGN_SECONDS)
+    if item.get("error"):
+        out["error"] = item["error"]
+    return _json(200, out)
+
+
+@metrics.instrument("jobs")
+@reqlog.logged("jobs")
+@profiling.profiled("jobs")
+@compression.negotiated
+def handler(event, context):
+    if not (jobs_table and RAW_BUCKET and ARTIFACTS_BUCKET and STATE_MACHINE_ARN):
+        return _json(500, {"error": "JOBS_TABLE/RAW_BUCKET/ARTIFACTS_BUCKET/PORTFOLIO_STATE_MACHINE_ARN not configured"})
+
+    route = event.get("routeKey", "")
+    if route == "POST /jobs/uploads":
+        return _create_upload(event)
+    if route == "POST /jobs":
+        return _submit(event)
+    if route == "GET /jobs/{job_id}":
+        return _status((event.get("pathParameters") or {}).get("job_id"))
+    return _json(404, {"error": f"Unknown route {route}"})
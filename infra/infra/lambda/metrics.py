@@ -0,0 +1,119 @@
+"""
+Metrics — instrumentation commune des handlers au format CloudWatch Embedded Metric
+Format (EMF). Une ligne JSON par invocation sur stdout : CloudWatch Logs en extrait
+les métriques côté AWS, et la même ligne reste lisible hors ligne.
+
+Usage :
+    @metrics.instrument("score")
+    def handler(event, context):
+        with metrics.timer("DynamoDBReadLatency"):
+            ...
+        metrics.put("SignalsStored", stored, "Count")
+
+Métriques communes : Latency (ms) et ColdStart (0/1), dimension Service.
+"""
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+NAMESPACE = os.environ.get("METRICS_NAMESPACE", "PREN")
+
+_cold_start = True
+_current = None
+
+
+class MetricsLogger:
+    """Accumule les valeurs d'une invocation puis les émet en une ligne EMF."""
+
+    def __init__(self, service: str):
+        self.service = service
+        self.values: dict[str, list] = {}
+        self.units: dict[str, str] = {}
+        self.properties: dict = {}
+
+    def put(self, name: str, value: float, unit: str = "Milliseconds"):
+        self.values.setdefault(name, []).append(value)
+        self.units[name] = unit
+
+    def set_property(self, key: str, value):
+        self.properties[key] = value
+
+    def to_emf(self) -> dict:
+        doc = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": NAMESPACE,
+                    "Dimensions": [["Service"]],
+                    "Metrics": [{"Name": n, "Unit": self.units[n]} for n in self.values],
+                }],
+            },
+            "Service": self.service,
+            **self.properties,
+        }
+        for name, vals in self.values.items():
+            doc[name] = vals[0] if len(vals) == 1 else vals[:100]
+        return doc
+
+    def flush(self):
+        if self.values:
+            sys.stdout.write(json.dumps(self.to_emf(), default=str) + "\n")
+            sys.stdout.flush()
+        self.values, self.units = {}, {}
+
+
+def current():
+    """MetricsLogger de l'invocation en cours (None hors handler instrumenté)."""
+    return _current
+
+
+def put(name: str, value: float, unit: str = "Milliseconds"):
+    if _current is not None:
+        _current.put(name, value, unit)
+
+
+def set_property(key: str, value):
+    if _current is not None:
+        _current.set_property(key, value)
+
+
+@contextmanager
+def timer(name: str, logger: MetricsLogger = None):
+    """Mesure la durée du bloc en ms. `logger` explicite pour les threads de travail."""
+    target = logger or _current
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if target is not None:
+            target.put(name, round((time.perf_counter() - t0) * 1000, 3))
+
+
+def instrument(service: str):
+    """Décorateur de handler : Latency + ColdStart + émission EMF, même en cas d'exception."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(event, context):
+            global _cold_start, _current
+            m = MetricsLogger(service)
+            m.put("ColdStart", 1 if _cold_start else 0, "Count")
+            _cold_start = False
+            request_id = getattr(context, "aws_request_id", None)
+            if request_id:
+                m.set_property("RequestId", request_id)
+            _current = m
+            t0 = time.perf_counter()
+            try:
+                response = fn(event, context)
+                if isinstance(response, dict) and "statusCode" in response:
+                    m.set_property("StatusCode", response["statusCode"])
+                return response
+            finally:
+                m.put("Latency", round((time.perf_counter() - t0) * 1000, 3))
+                _current = None
+                m.flush()
+        return wrapper
+    return decorator
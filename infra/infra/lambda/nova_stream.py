@@ -0,0 +1,197 @@
+"""
+Nova stream — parse incrémental de la sortie JSON de Nova pendant ConverseStream.
+
+Le prompt de structuration demande {"signals": [...], "summary": ..., "signal_count": ...}.
+SignalStream reçoit le texte par fragments (contentBlockDelta) et :
+  - émet chaque signal dès la fermeture de son objet dans le tableau "signals"
+    (validé et normalisé par validate_signal), sans attendre la fin de la réponse ;
+  - lève StreamInvalid dès que le flux ne peut plus aboutir à ce format : texte avant
+    l'objet racine, crochet fermant inattendu, élément de "signals" qui n'est pas un
+    objet JSON, texte après l'objet racine. L'appelant coupe alors le stream et
+    réessaie sans payer la latence d'une réponse complète déjà perdue.
+
+Un bloc markdown (```json ... ```) autour de l'objet est toléré, comme avant.
+"""
+import json
+import re
+
+SIGNAL_IMPACTS = {"positive", "negative", "neutral"}
+_FENCE = "```"
+_WHITESPACE = " \t\r\n"
+_STRUCTURAL = re.compile(r'["{}\[\]]')
+_STRING_STOP = re.compile(r'["\\]')
+
+
+class StreamInvalid(ValueError):
+    """La sortie du modèle ne peut plus être un JSON valide au format attendu."""
+
+
+def validate_signal(raw) -> dict:
+    """Signal normalisé, ou None s'il est inexploitable (pas un objet, sans description ni citation)."""
+    if not isinstance(raw, dict):
+        return None
+    description = str(raw.get("description") or "").strip()
+    evidence = str(raw.get("evidence_span") or "").strip()
+    if not description and not evidence:
+        return None
+    try:
+        confidence = min(max(float(raw.get("confidence", 0.5)), 0.0), 1.0)
+    except (TypeError, ValueError):
+        confidence = 0.5
+    impact = raw.get("impact")
+    return {
+        "type": str(raw.get("type") or "unknown"),
+        "description": description,
+        "impact": impact if impact in SIGNAL_IMPACTS else "neutral",
+        "confidence": confidence,
+        "location_hint": str(raw.get("location_hint") or ""),
+        "evidence_span": evidence,
+    }
+
+
+def parse_output(raw: str) -> dict:
+    """Parse la sortie complète (retire les backticks si présents) ; lève json.JSONDecodeError."""
+    clean = raw.strip()
+    if clean.startswith(_FENCE):
+        lines = clean.split("\n")
+        clean = "\n".join(lines[1:]) if len(lines) > 1 else clean[3:]
+    if clean.endswith(_FENCE):
+        clean = clean[:-3]
+    return json.loads(clean.strip())
+
+
+class SignalStream:
+    """Scanner incrémental (chaînes, échappements, pile d'imbrication) : saute d'un caractère structurant au suivant."""
+
+    def __init__(self):
+        self.text = ""
+        self.signals: list = []   # signaux validés, dans l'ordre d'arrivée
+        self.rejected = 0         # éléments JSON valides mais inexploitables
+        self._pos = 0
+        self._started = False     # objet racine ouvert
+        self._done = False        # objet racine fermé
+        self._stack: list = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key = None     # dernière chaîne vue directement dans l'objet racine
+        self._signals_depth = None
+        self._element_start = None
+
+    def feed(self, chunk: str) -> list:
+        """Ajoute un fragment ; retourne les signaux complétés par ce fragment."""
+        self.text += chunk
+        if not self._started and not self._skip_preamble():
+            return []
+        emitted = []
+        text, i, n = self.text, self._pos, len(self.text)
+        while i < n:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    i += 1
+                    continue
+                m = _STRING_STOP.search(text, i)
+                if not m:
+                    i = n
+                    break
+                i = m.start()
+                if text[i] == "\\":
+                    self._escape = True
+                else:
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_key = text[self._string_start + 1:i]
+                i += 1
+                continue
+            # Hors chaîne : saut direct au prochain caractère structurant
+            m = _STRUCTURAL.search(text, i)
+            j = m.start() if m else n
+            gap = text[i:j]
+            if gap.strip(_WHITESPACE):
+                if self._done and gap.strip(_WHITESPACE + "`"):
+                    raise StreamInvalid(f"Text after the JSON object: {gap.strip()[:40]!r}")
+                if len(self._stack) == self._signals_depth and gap.strip(_WHITESPACE + ","):
+                    raise StreamInvalid(f"Non-object element in signals: {gap.strip()[:40]!r}")
+            if not m:
+                i = n
+                break
+            i, c = j, text[j]
+            if self._done:
+                raise StreamInvalid(f"Text after the JSON object: {text[i:i + 40]!r}")
+            if c == '"':
+                if len(self._stack) == self._signals_depth:
+                    raise StreamInvalid(f"Non-object element in signals: {text[i:i + 40]!r}")
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                if len(self._stack) == self._signals_depth:
+                    if c != "{":
+                        raise StreamInvalid(f"Non-object element in signals: {text[i:i + 40]!r}")
+                    self._element_start = i
+                self._stack.append(c)
+                if c == "[" and len(self._stack) == 2 and self._last_key == "signals":
+                    self._signals_depth = 2
+            else:
+                if not self._stack or self._stack.pop() != ("{" if c == "}" else "["):
+                    raise StreamInvalid(f"Unexpected {c!r} at offset {i}")
+                if len(self._stack) == self._signals_depth and c == "}":
+                    emitted.extend(self._element(text[self._element_start:i + 1]))
+                elif self._signals_depth and len(self._stack) < self._signals_depth:
+                    self._signals_depth = None
+                if not self._stack:
+                    self._done = True
+            i += 1
+        self._pos = i
+        return emitted
+
+    def _skip_preamble(self) -> bool:
+        """Avant l'objet racine : blancs et éventuel ```json\\n. Vrai une fois '{' atteint."""
+        i, text = self._pos, self.text
+        while i < len(text) and text[i] in _WHITESPACE:
+            i += 1
+        rest = text[i:]
+        if rest.startswith(_FENCE):
+            newline = rest.find("\n")
+            if newline < 0:
+                self._pos = i
+                return False
+            i += newline + 1
+            while i < len(text) and text[i] in _WHITESPACE:
+                i += 1
+            rest = text[i:]
+        elif _FENCE.startswith(rest):
+            self._pos = i
+            return False
+        if not rest:
+            self._pos = i
+            return False
+        if rest[0] != "{":
+            raise StreamInvalid(f"Output does not start with a JSON object: {rest[:40]!r}")
+        self._pos = i
+        self._started = True
+        return True
+
+    def _element(self, raw: str) -> list:
+        try:
+            signal = validate_signal(json.loads(raw))
+        except json.JSONDecodeError as e:
+            raise StreamInvalid(f"Invalid signal object: {e}")
+        if signal is None:
+            self.rejected += 1
+            return []
+        self.signals.append(signal)
+        return [signal]
+
+    def result(self) -> dict:
+        """Document final (fin du stream) ; lève StreamInvalid si tronqué ou invalide."""
+        if not self._done:
+            raise StreamInvalid("Stream ended before the JSON object was closed")
+        try:
+            doc = parse_output(self.text)
+        except json.JSONDecodeError as e:
+            raise StreamInvalid(f"Invalid JSON: {e}")
+        if not isinstance(doc, dict):
+            raise StreamInvalid("Top-level JSON value is not an object")
+        doc["signals"] = self.signals
+        return doc
@@ -0,0 +1,369 @@
+"""
+Portfolio — scoring asynchrone d'un portefeuille de positions (CSV id,lat,lng).
+
+Un job (/jobs, jobs_handler) pointe vers un CSV déposé sous portfolios/ du RawBucket
+ou vers une URL S3 pré-signée. PrenPortfolioStateMachine appelle portfolio_handler en
+boucle ; chaque appel :
+  1. lit la source en flux à partir de l'offset courant (GET Range), par blocs de
+     PORTFOLIO_CHUNK_BYTES coupés sur une fin de ligne ;
+  2. résout les IRIS du bloc en vectoriel : emprise de ville (masques numpy), puis plus
+     proche centroïde par blocs de distances (index IRIS de la ville, cities.get_index) ;
+  3. joint le bloc au snapshot de scores en mémoire : version active de chaque ville
+     figée au premier passage (un publish en cours de job ne mélange pas deux
+     versions), items chargés par BatchGetItem pour les seuls IRIS rencontrés ;
+  4. écrit le résultat (CSV ou NDJSON) en multipart upload vers
+     s3://ARTIFACTS_BUCKET/jobs/<job_id>/result.<format>, et la progression dans
+     PrenJobsTable.
+
+Avant la fin de son timeout, l'appel rend la main juste après l'envoi d'une part
+(>= PART_BYTES, minimum S3 de 5 Mo) avec son curseur ; la machine à états relance.
+
+Statut par ligne : ok, invalid (lat/lng illisibles), out_of_area (hors des villes
+servies), no_iris (aucun centroïde proche), no_score (IRIS absent du snapshot).
+"""
+import csv
+import io
+import json
+import logging
+import os
+import time
+import urllib.request
+from datetime import datetime, timezone
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+import numpy as np
+
+import cities
+import score_store
+
+logger = logging.getLogger()
+
+JOBS_TABLE = os.environ.get("JOBS_TABLE", "")
+SCORES_TABLE = os.environ.get("SCORES_TABLE", "")
+RAW_BUCKET = os.environ.get("RAW_BUCKET", "")
+ARTIFACTS_BUCKET = os.environ.get("ARTIFACTS_BUCKET", "")
+PORTFOLIO_PREFIX = "portfolios/"
+CHUNK_BYTES = int(os.environ.get("PORTFOLIO_CHUNK_BYTES", str(1 << 20)))
+PART_BYTES = int(os.environ.get("PORTFOLIO_PART_BYTES", str(8 << 20)))
+JOB_TTL_DAYS = int(os.environ.get("JOB_TTL_DAYS", "7"))
+MAX_DIST_DEG = 5 * cities.GRID_DEG          # même portée que IrisIndex.find (5 anneaux)
+DISTANCE_BLOCK_CELLS = 4_000_000            # ~32 Mo de float64 par bloc de distances
+BATCH_GET_KEYS = 100
+
+FORMATS = ("csv", "ndjson")
+RESULT_FIELDS = ["id", "lat", "lng", "city", "iris_id", "future_value_score", "momentum", "confidence",
+                 "score_version", "status"]
+_COLUMN_ALIASES = {
+    "id": ("id", "loan_id", "position_id", "ref"),
+    "lat": ("lat", "latitude"),
+    "lng": ("lng", "lon", "long", "longitude"),
+}
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# --- Source -------------------------------------------------------------------------
+
+def validate_source_url(url: str) -> str:
+    """URL pré-signée S3 en HTTPS uniquement (pas de requête vers un hôte arbitraire)."""
+    parts = urlsplit(url or "")
+    host = (parts.hostname or "").lower()
+    labels = host.split(".")
+    s3_host = any(label == "s3" or label.startswith("s3-") for label in labels)
+    if parts.scheme != "https" or not host.endswith(".amazonaws.com") or not s3_host:
+        raise ValueError("source_url must be an https presigned Amazon S3 URL")
+    return url
+
+
+def open_source(source: dict, offset: int, s3_client):
+    """Flux binaire de la source à partir de `offset` (Range) ; retourne (flux, taille totale ou None)."""
+    if "url" in source:
+        request = urllib.request.Request(validate_source_url(source["url"]),
+                                         headers={"Range": f"bytes={offset}-"} if offset else {})
+        resp = urllib.request.urlopen(request, timeout=30)
+        total = None
+        if resp.status == 206:
+            total = int(resp.headers.get("Content-Range", "*/0").rsplit("/", 1)[1] or 0) or None
+        else:
+            total = int(resp.headers.get("Content-Length") or 0) or None
+            if offset:
+                # Range ignoré par le serveur : on saute les octets déjà traités
+                remaining = offset
+                while remaining:
+                    skipped = resp.read(min(remaining, CHUNK_BYTES))
+                    if not skipped:
+                        break
+                    remaining -= len(skipped)
+        return resp, total
+    kwargs = {"Range": f"bytes={offset}-"} if offset else {}
+    obj = s3_client.get_object(Bucket=source["bucket"], Key=source["key"], **kwargs)
+    if obj.get("ContentRange"):
+        return obj["Body"], int(obj["ContentRange"].rsplit("/", 1)[1])
+    return obj["Body"], obj.get("ContentLength")
+
+
+def iter_blocks(stream, offset: int):
+    """
+    Blocs de lignes complètes : (texte, offset après le bloc). La dernière ligne sans
+    fin de ligne est rendue en fin de flux.
+    """
+    pending = b""
+    while True:
+        data = stream.read(CHUNK_BYTES)
+        if not data:
+            if pending:
+                offset += len(pending)
+                yield pending.decode("utf-8-sig", errors="replace"), offset
+            return
+        buf = pending + data
+        cut = buf.rfind(b"\n")
+        if cut < 0:
+            pending = buf
+            continue
+        block, pending = buf[:cut + 1], buf[cut + 1:]
+        offset += len(block)
+        yield block.decode("utf-8-sig", errors="replace"), offset
+
+
+def parse_header(line: str) -> dict:
+    """Index des colonnes id / lat / lng (noms usuels, casse ignorée) ; ValueError si absentes."""
+    names = [c.strip().lower() for c in next(csv.reader([line]))]
+    columns = {}
+    for field, aliases in _COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in names:
+                columns[field] = names.index(alias)
+                break
+    missing = [f for f in ("lat", "lng") if f not in columns]
+    if missing:
+        raise ValueError(f"CSV header must contain {', '.join(missing)} (got {', '.join(names)})")
+    return columns
+
+
+def parse_rows(text: str, columns: dict) -> tuple[list, np.ndarray, np.ndarray]:
+    """(ids, lats, lngs) ; coordonnées illisibles -> NaN."""
+    ids, lats, lngs = [], [], []
+    width = max(columns.values()) + 1
+    for row in csv.reader(io.StringIO(text)):
+        if not row or (len(row) == 1 and not row[0].strip()):
+            continue
+        row = row + [""] * (width - len(row))
+        ids.append(row[columns["id"]].strip() if "id" in columns else "")
+        try:
+            lats.append(float(row[columns["lat"]]))
+            lngs.append(float(row[columns["lng"]]))
+        except ValueError:
+            lats.append(float("nan"))
+            lngs.append(float("nan"))
+    return ids, np.array(lats, dtype=np.float64), np.array(lngs, dtype=np.float64)
+
+
+# --- Résolution IRIS vectorisée -------------------------------------------------------
+
+_centroids: dict = {}   # city -> (index, (ids, lats, lngs) en numpy) ; refait si l'index de la ville change
+
+
+def _city_centroids(city: str):
+    index = cities.get_index(city)
+    if index is None:
+        return None
+    cached = _centroids.get(city)
+    if cached is None or cached[0] is not index:
+        rows = list(index.rows())
+        cached = _centroids[city] = (index, (np.array([r[0] for r in rows], dtype=object),
+                                             np.array([r[1] for r in rows]), np.array([r[2] for r in rows])))
+    return cached[1]
+
+
+def assign_cities(lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Slug de ville par point (None hors emprises) ; la plus petite emprise l'emporte, comme city_for."""
+    out = np.full(len(lats), None, dtype=object)
+    by_area = sorted(cities.CITIES.items(),
+                     key=lambda kv: (kv[1]["bbox"][1] - kv[1]["bbox"][0]) * (kv[1]["bbox"][3] - kv[1]["bbox"][2]))
+    for city, conf in by_area:
+        lat_min, lat_max, lng_min, lng_max = conf["bbox"]
+        mask = (out == None) & (lats >= lat_min) & (lats <= lat_max) & (lngs >= lng_min) & (lngs <= lng_max)  # noqa: E711
+        out[mask] = city
+    return out
+
+
+def nearest_iris(lats: np.ndarray, lngs: np.ndarray, centroids) -> np.ndarray:
+    """Plus proche centroïde par blocs de la matrice de distances (None au-delà de MAX_DIST_DEG)."""
+    ids, c_lat, c_lng = centroids
+    out = np.full(len(lats), None, dtype=object)
+    if not len(lats):
+        return out
+    scale = np.cos(np.radians(lats))[:, None]   # même métrique que IrisIndex.find
+    step = max(1, DISTANCE_BLOCK_CELLS // len(c_lat))
+    for start in range(0, len(lats), step):
+        lat, lng = lats[start:start + step, None], lngs[start:start + step, None]
+        d = (lat - c_lat[None, :]) ** 2 + ((lng - c_lng[None, :]) * scale[start:start + step]) ** 2
+        best = d.argmin(axis=1)
+        near = d[np.arange(len(best)), best] <= MAX_DIST_DEG ** 2
+        out[start:start + len(best)] = np.where(near, ids[best], None)
+    return out
+
+
+def resolve_batch(lats: np.ndarray, lngs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(villes, iris_ids) d'un bloc de coordonnées."""
+    city_of = assign_cities(lats, lngs)
+    iris = np.full(len(lats), None, dtype=object)
+    for city in {c for c in city_of if c is not None}:
+        mask = city_of == city
+        centroids = _city_centroids(city)
+        if centroids is None:
+            # Déploiement de démo sans index : mêmes zones que /score
+            iris[mask] = [cities.demo_iris(city, a, b) for a, b in zip(lats[mask], lngs[mask])]
+        else:
+            iris[mask] = nearest_iris(lats[mask], lngs[mask], centroids)
+    return city_of, iris
+
+
+# --- Snapshot de scores -------------------------------------------------------------
+
+_snapshot: dict = {}   # version -> {iris_id: item projeté ou None (absent)}
+
+
+def _to_float(x):
+    return float(x) if isinstance(x, Decimal) else x
+
+
+def retain_versions(versions) -> None:
+    """Oublie les items des versions hors de `versions` (jobs précédents du conteneur)."""
+    for version in [v for v in _snapshot if v not in versions]:
+        del _snapshot[version]
+
+
+def load_scores(dynamodb, table, keys: set) -> None:
+    """Complète _snapshot pour les (iris_id, version) manquants (BatchGetItem, lots de 100)."""
+    missing = [k for k in keys if k[0] not in _snapshot.get(k[1], ())]
+    for start in range(0, len(missing), BATCH_GET_KEYS):
+        batch = missing[start:start + BATCH_GET_KEYS]
+        request = {table.name: {
+            "Keys": [{"iris_id": iris_id, "version": version} for iris_id, version in batch],
+            "ProjectionExpression": "iris_id, #v, future_value_score, momentum, confidence",
+            "ExpressionAttributeNames": {"#v": "version"},
+        }}
+        for iris_id, version in batch:
+            _snapshot.setdefault(version, {})[iris_id] = None
+        attempt = 0
+        while request:
+            resp = dynamodb.batch_get_item(RequestItems=request)
+            for item in resp.get("Responses", {}).get(table.name, []):
+                _snapshot[item["version"]][item["iris_id"]] = {
+                    "future_value_score": _to_float(item.get("future_value_score")),
+                    "momentum": item.get("momentum"),
+                    "confidence": _to_float(item.get("confidence")),
+                }
+            request = resp.get("UnprocessedKeys") or None
+            if request:
+                attempt += 1
+                time.sleep(min(0.05 * 2 ** attempt, 2.0))
+
+
+def score_block(ids, lats, lngs, versions: dict, dynamodb, table) -> list[dict]:
+    """
+    Lignes de résultat d'un bloc. `versions` (city -> version active) est complété au
+    premier point de chaque ville puis réutilisé pour tout le job.
+    """
+    valid = ~(np.isnan(lats) | np.isnan(lngs))
+    city_of, iris = resolve_batch(np.where(valid, lats, 0.0), np.where(valid, lngs, 0.0))
+    for city in {c for c in city_of[valid] if c is not None}:
+        if city not in versions:
+            versions[city] = score_store.active_version(table, city)
+    retain_versions(set(versions.values()))
+    keys = {(i, versions[c]) for i, c, ok in zip(iris, city_of, valid) if ok and i is not None and versions.get(c)}
+    load_scores(dynamodb, table, keys)
+
+    rows = []
+    for n, row_id in enumerate(ids):
+        row = {"id": row_id, "lat": None, "lng": None, "city": None, "iris_id": None, "future_value_score": None,
+               "momentum": None, "confidence": None, "score_version": None}
+        if not valid[n]:
+            row["status"] = "invalid"
+        else:
+            row.update(lat=float(lats[n]), lng=float(lngs[n]), city=city_of[n], iris_id=iris[n])
+            version = versions.get(city_of[n])
+            item = _snapshot.get(version, {}).get(iris[n]) if iris[n] is not None and version else None
+            if city_of[n] is None:
+                row["status"] = "out_of_area"
+            elif iris[n] is None:
+                row["status"] = "no_iris"
+            elif item is None:
+                row["status"] = "no_score"
+            else:
+                row.update(item, score_version=version, status="ok")
+        rows.append(row)
+    return rows
+
+
+def format_rows(rows: list[dict], fmt: str, header: bool = False) -> bytes:
+    if fmt == "ndjson":
+        return "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in rows).encode("utf-8")
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=RESULT_FIELDS, lineterminator="\n")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue().encode("utf-8")
+
+
+def result_key(job_id: str, fmt: str) -> str:
+    return f"jobs/{job_id}/result.{fmt}"
+
+
+# --- Enregistrements de job (PrenJobsTable) ----------------------------------------
+
+def create_job(jobs_table, job_id: str, source: dict, fmt: str) -> dict:
+    item = {
+        "job_id": job_id,
+        "status": "queued",
+        "source": json.dumps(source),
+        "format": fmt,
+        "created_at": now_iso(),
+        "rows_done": 0,
+        "rows_ok": 0,
+        "bytes_done": 0,
+        "expires_at": int(time.time()) + JOB_TTL_DAYS * 86400,
+    }
+    jobs_table.put_item(Item=item, ConditionExpression="attribute_not_exists(job_id)")
+    return item
+
+
+def record_progress(jobs_table, job_id: str, state: dict):
+    """
+    Progression absolue tirée du curseur (SET, pas ADD) : une étape rejouée par le
+    Retry de la machine à états réécrit les mêmes valeurs.
+    """
+    values = {":r": "running", ":n": state["rows_done"], ":k": state["rows_ok"], ":b": state["offset"],
+              ":t": now_iso()}
+    expression = ("SET #s = :r, rows_done = :n, rows_ok = :k, bytes_done = :b, updated_at = :t, "
+                  "started_at = if_not_exists(started_at, :t)")
+    if state.get("bytes_total"):
+        expression += ", bytes_total = :bt"
+        values[":bt"] = state["bytes_total"]
+    if state.get("upload_id"):
+        # Retrouvé par l'étape d'échec si l'appel qui l'a créé meurt (timeout, OOM)
+        expression += ", upload_id = :u"
+        values[":u"] = state["upload_id"]
+    jobs_table.update_item(
+        Key={"job_id": job_id},
+        UpdateExpression=expression,
+        ExpressionAttributeNames={"#s": "status"},
+        ExpressionAttributeValues=values,
+    )
+
+
+def finish_job(jobs_table, job_id: str, status: str, **fields):
+    names = {"#s": "status"}
+    values = {":s": status, ":t": now_iso()}
+    sets = ["#s = :s", "finished_at = :t", "updated_at = :t"]
+    for i, (k, v) in enumerate(fields.items()):
+        names[f"#f{i}"] = k
+        values[f":f{i}"] = v
+        sets.append(f"#f{i} = :f{i}")
+    jobs_table.update_item(Key={"job_id": job_id}, UpdateExpression="SET " + ", ".join(sets),
+                           ExpressionAttributeNames=names, ExpressionAttributeValues=values)
@@ -0,0 +1,160 @@
+"""
+Portfolio handler — étape de PrenPortfolioStateMachine (voir portfolio.py).
+Score le CSV d'un job par blocs depuis son curseur et écrit le résultat en multipart
+upload ; rend la main avant son timeout avec le curseur ("running"), la machine à
+états le relance jusqu'à "succeeded" ou "failed". Un appel mort hors du handler
+(timeout, OOM, erreur du runtime) est rattrapé par le Catch de l'étape, qui rappelle ce
+handler avec "error" : job marqué failed, multipart upload abandonné.
+"""
+import logging
+import os
+import time
+
+import boto3
+
+import metrics
+import portfolio
+import profiling
+import rate_limiter
+import reqlog
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+JOBS_TABLE = os.environ.get("JOBS_TABLE", "")
+SCORES_TABLE = os.environ.get("SCORES_TABLE", "")
+ARTIFACTS_BUCKET = os.environ.get("ARTIFACTS_BUCKET", "")
+YIELD_MARGIN_SECONDS = float(os.environ.get("PORTFOLIO_YIELD_MARGIN_SECONDS", "60"))
+
+s3_client = boto3.client("s3", region_name="eu-west-3")
+dynamodb = boto3.resource("dynamodb")
+jobs_table = dynamodb.Table(JOBS_TABLE) if JOBS_TABLE else None
+scores_table = dynamodb.Table(SCORES_TABLE) if SCORES_TABLE else None
+
+
+def _upload_part(state: dict, data: bytes) -> None:
+    number = len(state["parts"]) + 1
+    resp = s3_client.upload_part(Bucket=ARTIFACTS_BUCKET, Key=state["result_key"], UploadId=state["upload_id"],
+                                 PartNumber=number, Body=data)
+    state["parts"].append({"PartNumber": number, "ETag": resp["ETag"]})
+
+
+def _fail(state: dict, error: str) -> dict:
+    logger.error(f"Portfolio job {state.get('job_id')} failed: {error}")
+    if state.get("upload_id"):
+        try:
+            s3_client.abort_multipart_upload(Bucket=ARTIFACTS_BUCKET, Key=state["result_key"],
+                                             UploadId=state["upload_id"])
+        except Exception as e:
+            logger.warning(f"Abort multipart upload failed: {e}")
+    if jobs_table and state.get("job_id"):
+        portfolio.finish_job(jobs_table, state["job_id"], "failed", error=error[:1000])
+    return {"statusCode": 500, "status": "failed", "job": {**state, "error": error}}
+
+
+def _abort(state: dict, caught: dict) -> dict:
+    """Catch de la machine à états : l'entrée de l'appel échoué + {"Error", "Cause"}."""
+    if not state.get("upload_id") and jobs_table and state.get("job_id"):
+        # Upload créé par l'appel mort : seul l'item du job en garde la trace
+        item = jobs_table.get_item(Key={"job_id": state["job_id"]}, ConsistentRead=True,
+                                   ProjectionExpression="upload_id").get("Item") or {}
+        if item.get("upload_id"):
+            state["upload_id"] = item["upload_id"]
+            state["result_key"] = portfolio.result_key(state["job_id"], state.get("format") or "csv")
+    return _fail(state, f"{caught.get('Error', 'States.TaskFailed')}: {caught.get('Cause', '')}")
+
+
+@metrics.instrument("portfolio")
+@reqlog.logged("portfolio")
+@profiling.profiled("portfolio")
+def handler(event, context):
+    """
+    Input event (jobs_handler au démarrage, puis sortie de l'appel précédent) :
+    {
+      "error": {"Error": ..., "Cause": ...}        (Catch : appel précédent mort, voir _abort)
+      "job": {
+        "job_id": "...", "format": "csv" | "ndjson",
+        "source": {"bucket": ..., "key": ...} | {"url": "https://...s3...amazonaws.com/..."},
+        "offset": 0, "rows_done": 0, "rows_ok": 0, "columns": {...}, "versions": {"paris": "..."},
+        "upload_id": "...", "parts": [...]          (curseur, renseigné par ce handler)
+      }
+    }
+    """
+    state = dict(event.get("job") or event)
+    job_id = state.get("job_id")
+    reqlog.field("job_id", job_id)
+    if isinstance(event.get("error"), dict):
+        return _abort(state, event["error"])
+    if not (jobs_table and scores_table and ARTIFACTS_BUCKET):
+        return _fail(state, "JOBS_TABLE/SCORES_TABLE/ARTIFACTS_BUCKET not configured")
+    if not job_id or not state.get("source"):
+        return _fail(state, "job_id and source required")
+
+    fmt = state.get("format") if state.get("format") in portfolio.FORMATS else "csv"
+    state.setdefault("offset", 0)
+    state.setdefault("versions", {})
+    state.setdefault("parts", [])
+    state.setdefault("rows_done", 0)
+    state.setdefault("rows_ok", 0)
+    state["result_key"] = portfolio.result_key(job_id, fmt)
+    deadline = rate_limiter.deadline_for(context, YIELD_MARGIN_SECONDS)
+    t_start = time.perf_counter()
+    rows_this_call = 0
+
+    try:
+        if not state.get("upload_id"):
+            content_type = "application/x-ndjson" if fmt == "ndjson" else "text/csv"
+            state["upload_id"] = s3_client.create_multipart_upload(
+                Bucket=ARTIFACTS_BUCKET, Key=state["result_key"], ContentType=content_type)["UploadId"]
+            state["started_at"] = portfolio.now_iso()
+
+        stream, total = portfolio.open_source(state["source"], state["offset"], s3_client)
+        if total:
+            state["bytes_total"] = total
+        buffer = bytearray()
+        for text, end in portfolio.iter_blocks(stream, state["offset"]):
+            t0 = time.perf_counter()
+            header = False
+            if not state.get("columns"):
+                line, _, text = text.partition("\n")
+                state["columns"] = portfolio.parse_header(line)
+                header = True
+            ids, lats, lngs = portfolio.parse_rows(text, state["columns"])
+            rows = portfolio.score_block(ids, lats, lngs, state["versions"], dynamodb, scores_table)
+            buffer += portfolio.format_rows(rows, fmt, header=header and fmt == "csv")
+            state["offset"] = end
+            state["rows_done"] += len(rows)
+            state["rows_ok"] += sum(1 for r in rows if r["status"] == "ok")
+            rows_this_call += len(rows)
+            metrics.put("PortfolioRows", len(rows), "Count")
+            metrics.put("PortfolioChunkLatency", round((time.perf_counter() - t0) * 1000, 3))
+            portfolio.record_progress(jobs_table, job_id, state)
+
+            if len(buffer) >= portfolio.PART_BYTES:
+                _upload_part(state, bytes(buffer))
+                buffer.clear()
+                # Curseur cohérent uniquement juste après une part : seul point de reprise
+                at_end = end >= state.get("bytes_total", end + 1)
+                if deadline is not None and time.monotonic() >= deadline and not at_end:
+                    stream.close()
+                    logger.info(f"Portfolio job {job_id}: yielding at byte {end} after {rows_this_call} rows")
+                    return {"statusCode": 200, "status": "running", "job": state}
+
+        if buffer or not state["parts"]:
+            _upload_part(state, bytes(buffer))
+        s3_client.complete_multipart_upload(Bucket=ARTIFACTS_BUCKET, Key=state["result_key"],
+                                            UploadId=state["upload_id"],
+                                            MultipartUpload={"Parts": state["parts"]})
+    except Exception as e:
+        return _fail(state, str(e))
+    finally:
+        elapsed = time.perf_counter() - t_start
+        if rows_this_call and elapsed > 0:
+            metrics.put("PortfolioRowsPerSecond", round(rows_this_call / elapsed, 1), "Count/Second")
+
+    portfolio.finish_job(jobs_table, job_id, "succeeded", result_key=state["result_key"],
+                         score_versions=state["versions"])
+    logger.info(f"Portfolio job {job_id} succeeded: s3://{ARTIFACTS_BUCKET}/{state['result_key']}")
+    state.pop("upload_id", None)
+    state.pop("parts", None)
+    return {"statusCode": 200, "status": "succeeded", "job": state}
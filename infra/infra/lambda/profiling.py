@@ -0,0 +1,101 @@
+"""
+Profiling — hook cProfile + tracemalloc opt-in pour les handlers.
+
+Activation (variables d'environnement, lues au chargement du module) :
+  PROFILE_ENABLED=1          profile chaque invocation
+  PROFILE_SAMPLE_RATE=0.01   profile ~1 % des invocations
+
+Désactivé (défaut), `profiled` retourne le handler tel quel : aucun wrapper,
+aucun coût. Activé, chaque invocation échantillonnée dépose dans l'ArtifactsBucket :
+  profiles/<service>/<date>/<request_id>.pstats   (python -m pstats <fichier>)
+  profiles/<service>/<date>/<request_id>.txt      top fonctions (cumulative) + mémoire
+"""
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+logger = logging.getLogger()
+
+ARTIFACTS_BUCKET = os.environ.get("ARTIFACTS_BUCKET", "")
+PROFILE_ENABLED = os.environ.get("PROFILE_ENABLED", "") in ("1", "true", "True")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0") or 0)
+PROFILE_PREFIX = os.environ.get("PROFILE_PREFIX", "profiles")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "")  # hors ligne : écrit en local au lieu de S3
+
+_s3 = None
+
+
+def _store(key: str, body: bytes):
+    global _s3
+    if PROFILE_DIR:
+        path = os.path.join(PROFILE_DIR, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(body)
+        return
+    if not ARTIFACTS_BUCKET:
+        logger.warning(f"Profile {key} dropped: ARTIFACTS_BUCKET not set")
+        return
+    if _s3 is None:
+        import boto3
+        _s3 = boto3.client("s3")
+    _s3.put_object(Bucket=ARTIFACTS_BUCKET, Key=key, Body=body)
+
+
+def _report(profiler: cProfile.Profile, peak_bytes: int, snapshot, elapsed_ms: float) -> str:
+    out = io.StringIO()
+    out.write(f"wall_ms={elapsed_ms:.1f} peak_alloc_kib={peak_bytes / 1024:.1f}\n\n")
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+    out.write("\nTop allocations (tracemalloc, by line):\n")
+    for stat in snapshot.statistics("lineno")[:25]:
+        out.write(f"{stat}\n")
+    return out.getvalue()
+
+
+def _run_profiled(service: str, fn, event, context):
+    request_id = getattr(context, "aws_request_id", None) or f"local-{int(time.time() * 1000)}"
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    profiler.enable()
+    try:
+        return fn(event, context)
+    finally:
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        try:
+            base = f"{PROFILE_PREFIX}/{service}/{datetime.now(timezone.utc):%Y-%m-%d}/{request_id}"
+            with tempfile.NamedTemporaryFile(suffix=".pstats") as tmp:
+                profiler.dump_stats(tmp.name)
+                tmp.seek(0)
+                _store(f"{base}.pstats", tmp.read())
+            _store(f"{base}.txt", _report(profiler, peak, snapshot, elapsed_ms).encode("utf-8"))
+            logger.info(f"Profile stored: {base} ({elapsed_ms:.1f} ms, peak {peak / 1024:.1f} KiB)")
+        except Exception as e:
+            logger.warning(f"Profile upload failed: {e}")
+
+
+def profiled(service: str):
+    """Décorateur de handler ; identité stricte quand le profilage est désactivé."""
+    def decorator(fn):
+        if not PROFILE_ENABLED and PROFILE_SAMPLE_RATE <= 0:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(event, context):
+            if PROFILE_ENABLED or random.random() < PROFILE_SAMPLE_RATE:
+                return _run_profiled(service, fn, event, context)
+            return fn(event, context)
+        return wrapper
+    return decorator
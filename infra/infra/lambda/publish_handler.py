@@ -0,0 +1,144 @@
+"""
+Publish handler — bascule atomiquement la version de scores active (voir score_store.py).
+Une seule écriture conditionnelle sur l'item pointeur de la ville : publication ou rollback.
+Puis, depuis le snapshot de la version active : ajout à l'historique par IRIS
+(history.py), diff contre la dernière version du flux /changes et événements de seuil
+vers CHANGES_QUEUE_URL si configurée (voir changes.py).
+"""
+import json
+import logging
+import os
+
+import boto3
+
+import changes
+import cities
+import history
+import metrics
+import profiling
+import reqlog
+import score_store
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+SCORES_TABLE = os.environ.get("SCORES_TABLE", "")
+ARTIFACTS_BUCKET = os.environ.get("ARTIFACTS_BUCKET", "")
+CHANGES_QUEUE_URL = os.environ.get("CHANGES_QUEUE_URL", "")
+dynamodb = boto3.resource("dynamodb")
+table = dynamodb.Table(SCORES_TABLE) if SCORES_TABLE else None
+s3_client = boto3.client("s3", region_name="eu-west-3")
+sqs_client = boto3.client("sqs") if CHANGES_QUEUE_URL else None
+
+
+def _append_history(city: str, pointer: dict, new: dict) -> int:
+    """
+    Un point par IRIS pour la version publiée (rien pour un rejeu) ; une version plus
+    ancienne (rollback) prend l'horodatage de sa republication.
+    """
+    version = pointer.get("active_version")
+    published_at = history.parse_as_of(pointer["published_at"]) if pointer.get("published_at") else None
+    with metrics.timer("HistoryWriteLatency"):
+        written = history.append_run(dynamodb, table, version, changes.snapshot_items(new), city, published_at)
+    metrics.put("HistoryWritten", written, "Count")
+    return written
+
+
+def _record_changes(city: str, pointer: dict, new: dict) -> dict:
+    """
+    Diff dernière version du flux -> version active, artefact + entrée du flux, événements.
+    Un échec ne défait pas la publication : le diff suivant repartira de la même version.
+    """
+    to_version = pointer.get("active_version")
+    last = changes.head(table, city)
+    from_version = last["to_version"] if last else pointer.get("previous_version")
+    if from_version == to_version:
+        return {"change_count": 0, "from_version": from_version}
+    with metrics.timer("ChangesDiffLatency"):
+        old = changes.load_snapshot(s3_client, ARTIFACTS_BUCKET, city, from_version) if from_version else None
+        if old is None:
+            # Premier diff de la ville (ou snapshot absent) : tout le jeu est "added"
+            old = changes.empty_snapshot()
+        rows = changes.diff(old, new)
+    entry = changes.record(table, s3_client, ARTIFACTS_BUCKET, city, from_version, to_version, rows)
+    metrics.put("ScoreChanges", len(rows), "Count")
+    sent = 0
+    if sqs_client:
+        events = changes.threshold_events(rows, city, from_version, to_version)
+        sent = changes.send_events(sqs_client, CHANGES_QUEUE_URL, events)
+        metrics.put("ChangeEventsSent", sent, "Count")
+    logger.info(f"Changes {from_version} -> {to_version} for {city}: {len(rows)} rows, {sent} events")
+    return {"change_count": len(rows), "from_version": from_version, "changes_key": entry["key"], "events_sent": sent}
+
+
+@metrics.instrument("publish")
+@reqlog.logged("publish")
+@profiling.profiled("publish")
+def handler(event, context):
+    """
+    Input event (depuis scoring_handler output, ou manuel) :
+    {
+      "city": "paris",                     (défaut : DEFAULT_CITY)
+      "action": "publish" | "rollback",    (défaut : publish)
+      "version": "20260301T020000Z",       (rollback : optionnel, défaut previous_version)
+      "expected_version": "..."            (optionnel : version active attendue)
+    }
+    """
+    logger.info("Publish request")
+
+    # Accepte l'event directement ou encapsulé dans body (Step Functions)
+    if "body" in event and isinstance(event["body"], str):
+        payload = json.loads(event["body"])
+    else:
+        payload = event
+
+    if not table:
+        return {"statusCode": 500, "body": json.dumps({"error": "SCORES_TABLE not configured"})}
+
+    action = payload.get("action", "publish")
+    version = payload.get("version")
+    city = payload.get("city")
+    try:
+        if action == "rollback":
+            pointer = score_store.rollback(table, version, city)
+        elif version:
+            pointer = score_store.publish(table, version, payload.get("expected_version"), city)
+        else:
+            return {"statusCode": 400, "body": json.dumps({"error": "version required"})}
+    except score_store.PublishConflict as e:
+        logger.warning(f"Publish conflict: {e}")
+        return {"statusCode": 409, "body": json.dumps({"error": str(e)})}
+    except ValueError as e:
+        return {"statusCode": 400, "body": json.dumps({"error": str(e)})}
+
+    # Ni l'historique ni le diff ne défont la publication : échecs journalisés et renvoyés
+    changes_result = history_written = None
+    if ARTIFACTS_BUCKET:
+        slug, active = cities.slug(city), pointer.get("active_version")
+        new = changes.load_snapshot(s3_client, ARTIFACTS_BUCKET, slug, active)
+        if new is None:
+            logger.error(f"No snapshot for {slug} {active}: history and changes skipped")
+            changes_result = {"error": f"No snapshot for {slug} {active}"}
+        else:
+            try:
+                history_written = _append_history(slug, pointer, new)
+            except Exception as e:
+                logger.error(f"History append failed for {slug} {active}: {e}")
+            try:
+                changes_result = _record_changes(slug, pointer, new)
+            except Exception as e:
+                logger.error(f"Change diff failed for {slug}: {e}")
+                changes_result = {"error": str(e)}
+
+    result = {
+        "city": cities.slug(city),
+        "action": action,
+        "active_version": pointer.get("active_version"),
+        "previous_version": pointer.get("previous_version"),
+        "published_at": pointer.get("published_at"),
+        "changes": changes_result,
+        "history_written": history_written,
+        "status": "published"
+    }
+    logger.info(f"Active score version for {result['city']}: {result['active_version']} (previous {result['previous_version']})")
+    return {"statusCode": 200, "body": json.dumps(result)}
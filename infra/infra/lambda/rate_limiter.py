@@ -0,0 +1,170 @@
+"""
+Rate limiter — débit partagé (Bedrock, Textract) entre toutes les Lambdas concurrentes.
+
+Un seau à jetons par service dans PrenCacheTable (pk=LIMIT#<service>) :
+  tokens       jetons disponibles (capacité = 1 s de débit courant)
+  rate         débit courant autorisé (appels/s), ajusté en AIMD :
+                 + RATE_INCREASE_PER_S par seconde écoulée sans throttling (additif)
+                 x 0.5 sur ThrottlingException (multiplicatif, au plus une fois par
+                 RATE_DECREASE_COOLDOWN_S pour qu'une rafale ne divise pas N fois)
+  max_rate     quota du compte (<SERVICE>_MAX_RPS), plafond du débit
+  refilled_at  horodatage du dernier remplissage, sert aussi de version (écriture
+               conditionnelle : pas de verrou, on relit et on recommence si conflit)
+
+call(service, fn) : prend un jeton (attend si besoin), appelle fn, et sur throttling
+réduit le débit partagé puis réessaie avec backoff exponentiel à gigue complète.
+Sans RATE_LIMIT_TABLE, seul le retry local s'applique.
+"""
+import logging
+import os
+import random
+import time
+from decimal import Decimal
+
+import metrics
+
+logger = logging.getLogger()
+
+RATE_LIMIT_TABLE = os.environ.get("RATE_LIMIT_TABLE", "")
+MAX_RPS = {
+    "bedrock": float(os.environ.get("BEDROCK_MAX_RPS", "5")),
+    "textract": float(os.environ.get("TEXTRACT_MAX_RPS", "2")),
+}
+MIN_RPS = float(os.environ.get("RATE_MIN_RPS", "0.2"))
+RATE_INCREASE_PER_S = float(os.environ.get("RATE_INCREASE_PER_S", "0.05"))
+RATE_DECREASE_COOLDOWN_S = float(os.environ.get("RATE_DECREASE_COOLDOWN_S", "2"))
+MAX_ATTEMPTS = int(os.environ.get("RATE_MAX_ATTEMPTS", "6"))
+BACKOFF_BASE_S = 0.25
+BACKOFF_CAP_S = 8.0
+MAX_WAIT_S = 30.0
+
+THROTTLE_CODES = {
+    "ThrottlingException",
+    "throttlingException",  # exception d'événement ConverseStream (en cours de stream)
+    "ProvisionedThroughputExceededException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+    "LimitExceededException",
+}
+
+_table = None
+_NAMES = {"#t": "tokens", "#r": "rate", "#at": "refilled_at", "#m": "max_rate"}
+
+
+def _get_table():
+    global _table
+    if _table is None and RATE_LIMIT_TABLE:
+        import boto3
+        _table = boto3.resource("dynamodb").Table(RATE_LIMIT_TABLE)
+    return _table
+
+
+def _dec(x: float) -> Decimal:
+    return Decimal(str(round(x, 6)))
+
+
+def is_throttle(exc: Exception) -> bool:
+    code = getattr(exc, "response", {}).get("Error", {}).get("Code") if hasattr(exc, "response") else None
+    return code in THROTTLE_CODES
+
+
+def _conditional_failed(exc: Exception) -> bool:
+    return getattr(exc, "response", {}).get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+
+def acquire(service: str, deadline: float = None) -> float:
+    """Prend un jeton du seau partagé ; retourne le temps attendu (s)."""
+    table = _get_table()
+    if table is None:
+        return 0.0
+    key = {"pk": f"LIMIT#{service}"}
+    max_rate = MAX_RPS.get(service, 1.0)
+    deadline = deadline or time.monotonic() + MAX_WAIT_S
+    waited = 0.0
+    while True:
+        item = table.get_item(Key=key, ConsistentRead=True).get("Item")
+        now = time.time()
+        if item:
+            prev = item["refilled_at"]
+            elapsed = max(now - float(prev), 0.0)
+            rate = min(float(item.get("rate", max_rate)) + RATE_INCREASE_PER_S * elapsed, max_rate)
+            tokens = min(float(item.get("tokens", 0)) + elapsed * rate, max(rate, 1.0))
+            condition, values = "#at = :prev", {":prev": prev}
+        else:
+            rate, tokens = max_rate, max(max_rate, 1.0)
+            condition, values = "attribute_not_exists(pk)", {}
+
+        if tokens >= 1.0:
+            try:
+                table.update_item(
+                    Key=key,
+                    UpdateExpression="SET #t = :t, #r = :r, #at = :now, #m = :m",
+                    ConditionExpression=condition,
+                    ExpressionAttributeNames=_NAMES,
+                    ExpressionAttributeValues={**values, ":t": _dec(tokens - 1.0), ":r": _dec(rate),
+                                               ":now": _dec(now), ":m": _dec(max_rate)},
+                )
+                return waited
+            except Exception as e:
+                if not _conditional_failed(e):
+                    logger.warning(f"Rate limiter unavailable ({service}): {e}")
+                    return waited
+                # Un autre worker a pris un jeton entre-temps : relire
+                pause = random.uniform(0, 0.02)
+        else:
+            pause = (1.0 - tokens) / rate * random.uniform(1.0, 1.5)
+
+        if time.monotonic() + pause > deadline:
+            logger.warning(f"Rate limiter wait exceeded for {service}, proceeding")
+            return waited
+        time.sleep(pause)
+        waited += pause
+
+
+def on_throttle(service: str):
+    """Décroissance multiplicative du débit partagé (au plus une fois par cooldown)."""
+    table = _get_table()
+    if table is None:
+        return
+    now = time.time()
+    try:
+        item = table.get_item(Key={"pk": f"LIMIT#{service}"}, ConsistentRead=True).get("Item") or {}
+        if now - float(item.get("decreased_at", 0)) < RATE_DECREASE_COOLDOWN_S:
+            return
+        new_rate = max(float(item.get("rate", MAX_RPS.get(service, 1.0))) * 0.5, MIN_RPS)
+        table.update_item(
+            Key={"pk": f"LIMIT#{service}"},
+            # refilled_at change aussi : les acquire() en vol sur l'ancien état échouent et relisent
+            UpdateExpression="SET #r = :r, #t = :zero, #at = :now, #m = :m, decreased_at = :now",
+            ExpressionAttributeNames=_NAMES,
+            ExpressionAttributeValues={":r": _dec(new_rate), ":zero": _dec(0.0), ":now": _dec(now),
+                                       ":m": _dec(MAX_RPS.get(service, 1.0))},
+        )
+        logger.warning(f"Throttled on {service}: shared rate -> {new_rate:.2f}/s")
+    except Exception as e:
+        logger.warning(f"Rate limiter decrease failed ({service}): {e}")
+
+
+def deadline_for(context, margin_s: float = 10.0):
+    """Échéance (time.monotonic) des attentes : timeout Lambda restant moins une marge."""
+    remaining = getattr(context, "get_remaining_time_in_millis", None)
+    return time.monotonic() + remaining() / 1000 - margin_s if remaining else None
+
+
+def call(service: str, fn, *args, deadline: float = None, **kwargs):
+    """Appel limité + retry jittered sur throttling ; relève l'exception après MAX_ATTEMPTS."""
+    for attempt in range(MAX_ATTEMPTS):
+        waited = acquire(service, deadline)
+        if waited:
+            metrics.put("RateLimitWait", round(waited * 1000, 3))
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if not is_throttle(e) or attempt == MAX_ATTEMPTS - 1:
+                raise
+            metrics.put("ThrottleRetry", 1, "Count")
+            on_throttle(service)
+            backoff = random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))
+            if deadline and time.monotonic() + backoff > deadline:
+                raise
+            time.sleep(backoff)
@@ -0,0 +1,235 @@
+"""
+Relevance — compacte le texte extrait avant Nova : seuls les passages utiles partent au modèle.
+
+Un PLU ou un arrêté de permis est surtout du texte réglementaire (visas, considérants,
+articles de procédure). Envoyer les 5 000 premiers caractères gaspille des tokens sur ce
+boilerplate et coupe les signaux situés plus loin dans le document.
+
+Étapes (locales, sans appel AWS) :
+  1. en-têtes / pieds de page répétés retirés : ligne (chiffres neutralisés) présente en
+     haut ou en bas d'au moins la moitié des pages ; lignes strictement dupliquées réduites
+     à leur première occurrence ;
+  2. score par ligne : lexique urbanisme compilé en une seule regex (poids positifs pour
+     permis, zonage, transports, rénovation, commerce ; négatifs pour les formules
+     juridiques) + banque de regex (n° de permis, surfaces, codes de zone, voies,
+     nombres de logements, parcelles) ;
+  3. découpage en passages : lignes consécutives de même pertinence, coupées sur les
+     titres (« Article », « Titre »...), à PASSAGE_CHARS et à chaque page ;
+  4. sélection gloutonne par densité (score / tokens) sous RELEVANCE_TOKEN_BUDGET, puis
+     passages restitués dans l'ordre du document, séparés par « [...] ».
+
+Si aucun passage n'a de score positif, on garde le début du document (comportement
+d'origine) dans la limite du budget.
+"""
+import os
+import re
+import unicodedata
+
+TOKEN_BUDGET = int(os.environ.get("RELEVANCE_TOKEN_BUDGET", "1200"))
+PASSAGE_CHARS = 600
+CHARS_PER_TOKEN = 4          # approximation du tokenizer Nova pour du français
+HEADER_EDGE_LINES = 2        # lignes examinées en haut et en bas de chaque page
+MAX_HITS_PER_TERM = 3        # un terme répété 20 fois ne fait pas un passage pertinent
+GAP_MARKER = "[...]"
+
+# Termes sans accents, en minuscules (comparés au texte replié par _fold)
+LEXICON = {
+    # Permis et autorisations
+    "permis de construire": 3.0, "permis d'amenager": 3.0, "permis de demolir": 2.5,
+    "declaration prealable": 2.0, "autorisation d'urbanisme": 2.0, "logements": 2.0, "logement social": 2.5,
+    "surface de plancher": 2.5, "emprise au sol": 1.5, "gabarit": 1.0, "hauteur": 1.0, "accorde": 1.0,
+    # Zonage
+    "plu": 2.0, "plan local d'urbanisme": 2.0, "plui": 2.0, "zonage": 2.5, "zone urbaine": 1.5,
+    "modification": 1.0, "revision": 1.0, "oap": 2.0, "orientation d'amenagement": 2.0, "constructibilite": 2.0,
+    "densification": 2.0, "emplacement reserve": 2.0, "secteur": 0.5, "changement de destination": 2.0,
+    # Infrastructures
+    "tramway": 3.0, "metro": 3.0, "gare": 2.5, "station": 2.0, "prolongement": 2.0, "grand paris express": 3.0,
+    "zac": 3.0, "zone d'amenagement concerte": 3.0, "pole d'echanges": 2.5, "piste cyclable": 1.5,
+    "voirie": 1.0, "parc": 1.0, "equipement public": 2.0, "groupe scolaire": 1.5, "creche": 1.0,
+    # Rénovation
+    "renovation": 2.5, "rehabilitation": 2.5, "requalification": 2.5, "renouvellement urbain": 3.0,
+    "anru": 3.0, "ravalement": 1.0, "renovation energetique": 3.0,
+    # Commerce / activités
+    "commerce": 2.0, "commercial": 2.0, "commerces": 2.0, "bureaux": 1.5, "activites": 1.0, "hotel": 1.0,
+    # Boilerplate juridique / procédure
+    "vu le code": -2.0, "considerant": -1.0, "alinea": -1.0, "en application": -1.0, "conformement": -1.0,
+    "compte rendu": -2.0, "seance": -1.5, "proces-verbal": -2.0, "sommaire": -2.0, "annexe": -1.0,
+    "delibere": -1.0, "le present arrete": -1.5, "recours": -1.5, "tribunal administratif": -2.0,
+    "ampliation": -2.0, "publie au recueil": -2.0, "normes applicables": -1.0,
+}
+
+_LEXICON_RE = re.compile(
+    r"(?<![\w'])(?:" + "|".join(re.escape(t) for t in sorted(LEXICON, key=len, reverse=True)) + r")(?![\w'])"
+)
+
+# (nom, regex sur le texte d'origine, poids par occurrence)
+PATTERNS = [
+    ("permit_number", re.compile(r"\b(?:PC|PA|PD|DP|CU)\s?0?\d{2,3}\s?\d{3}\s?\d{2}\s?[A-Z]?\s?\d{4,5}\b"), 4.0),
+    ("surface", re.compile(r"\b\d[\d\s.,]*\s?(?:m²|m2|mètres? carrés|hectares?|ha)(?!\w)", re.I), 2.0),
+    ("zoning_code", re.compile(r"\b(?:zones?\s+)?(?:UG|UGSU|UV|UN|UE|UA|UB|UC|UD|UX|UZ|[12]?AU[a-z]?)\b"), 2.5),
+    ("street", re.compile(r"\b(?:rue|avenue|av\.|boulevard|bd|place|quai|impasse|allée|chemin|cours|passage|"
+                          r"square|porte|route)\s+(?:de\s+la\s+|de\s+l['’]|du\s+|des\s+|de\s+|d['’])?[A-ZÉÈÀ][\w'’-]+"),
+     1.5),
+    ("housing_count", re.compile(r"\b\d+\s+(?:logements?|lots?|places de stationnement)\b", re.I), 2.0),
+    ("parcel", re.compile(r"\b(?:parcelles?|section)\s+(?:cadastrale\s+)?[A-Z]{1,2}\s?(?:n°\s?)?\d+\b", re.I), 1.5),
+]
+
+_HEADING_RE = re.compile(r"^(?:article|titre|chapitre|section|annexe|zone|\d+(?:\.\d+)*[\s.)-])", re.I)
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.;:!?])\s+")
+_DIGITS_RE = re.compile(r"\d+")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def _fold_table() -> dict:
+    table = {ord("’"): "'"}
+    for code in range(0xC0, 0x250):
+        decomposed = unicodedata.normalize("NFKD", chr(code))
+        if len(decomposed) > 1 and all(unicodedata.combining(c) for c in decomposed[1:]):
+            table[code] = decomposed[0]
+    return table
+
+
+_FOLD = _fold_table()
+
+
+def _fold(text: str) -> str:
+    """Minuscules, sans accents (table précalculée, pas de NFKD par appel), apostrophes unifiées."""
+    return text.lower().translate(_FOLD)
+
+
+def _line_key(line: str) -> str:
+    return _SPACES_RE.sub(" ", _DIGITS_RE.sub("#", _fold(line))).strip()
+
+
+def _split_long(line: str) -> list:
+    """Coupe une ligne plus longue qu'un passage (pypdf colle souvent un paragraphe entier)."""
+    if len(line) <= PASSAGE_CHARS:
+        return [line]
+    parts, current = [], ""
+    for sentence in _SENTENCE_SPLIT_RE.split(line):
+        while len(sentence) > PASSAGE_CHARS:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(sentence[:PASSAGE_CHARS])
+            sentence = sentence[PASSAGE_CHARS:]
+        if current and len(current) + len(sentence) + 1 > PASSAGE_CHARS:
+            parts.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        parts.append(current)
+    return parts
+
+
+def collapse_repeated(pages: list) -> tuple[list, int]:
+    """Retire en-têtes / pieds de page répétés et lignes dupliquées ; retourne (pages, lignes retirées)."""
+    edge_pages: dict[str, set] = {}
+    for page_no, lines in enumerate(pages):
+        for line in lines[:HEADER_EDGE_LINES] + lines[-HEADER_EDGE_LINES:]:
+            edge_pages.setdefault(_line_key(line), set()).add(page_no)
+    min_pages = max(2, (len(pages) + 1) // 2)
+    repeated = {key for key, seen in edge_pages.items() if len(pages) >= 2 and len(seen) >= min_pages}
+
+    seen_lines, removed, out = set(), 0, []
+    for lines in pages:
+        kept = []
+        for i, line in enumerate(lines):
+            # Un en-tête n'est retiré qu'en bord de page : la même phrase dans le corps reste
+            edge = i < HEADER_EDGE_LINES or i >= len(lines) - HEADER_EDGE_LINES
+            exact = _SPACES_RE.sub(" ", line.strip())
+            if not exact or (edge and _line_key(line) in repeated) or exact in seen_lines:
+                removed += 1
+                continue
+            seen_lines.add(exact)
+            kept.append(line.strip())
+        out.append(kept)
+    return out, removed
+
+
+def score(text: str) -> float:
+    counts: dict[str, int] = {}
+    for m in _LEXICON_RE.finditer(_fold(text)):
+        counts[m.group(0)] = counts.get(m.group(0), 0) + 1
+    total = sum(LEXICON[term] * min(n, MAX_HITS_PER_TERM) for term, n in counts.items())
+    for _, pattern, weight in PATTERNS:
+        total += weight * min(len(pattern.findall(text)), MAX_HITS_PER_TERM)
+    return total
+
+
+def segment(pages: list) -> list:
+    """
+    Passages [(score, texte)] : lignes consécutives de même pertinence (score > 0 ou non),
+    coupées sur titre, sur PASSAGE_CHARS et à chaque page. Une ligne utile noyée dans du
+    boilerplate forme ainsi son propre passage au lieu d'être diluée.
+    """
+    passages = []
+    for lines in pages:
+        current, total, size, relevant = [], 0.0, 0, None
+        for raw in lines:
+            for line in _split_long(raw):
+                line_score = score(line)
+                if current and (size + len(line) + 1 > PASSAGE_CHARS or (line_score > 0) != relevant
+                                or _HEADING_RE.match(line)):
+                    passages.append((total, "\n".join(current)))
+                    current, total, size = [], 0.0, 0
+                current.append(line)
+                total += line_score
+                size += len(line) + 1
+                relevant = line_score > 0
+        if current:
+            passages.append((total, "\n".join(current)))
+    return passages
+
+
+def _tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def compact(pages: list, token_budget: int = None) -> tuple[str, dict]:
+    """
+    pages : liste de pages, chacune une liste de lignes. Retourne (texte compact, stats)
+    avec stats = {passages, kept, lines_collapsed, chars_in, chars_out, fallback}.
+    """
+    budget = token_budget or TOKEN_BUDGET
+    chars_in = sum(len(line) + 1 for lines in pages for line in lines)
+    pages, collapsed = collapse_repeated(pages)
+    passages = segment(pages)
+    scored = [(passage_score, i, text) for i, (passage_score, text) in enumerate(passages)]
+
+    chosen, used = [], 0
+    relevant = sorted((s for s in scored if s[0] > 0), key=lambda s: (-s[0] / _tokens(s[2]), s[1]))
+    for s, i, text in relevant:
+        cost = _tokens(text)
+        if used + cost <= budget:
+            chosen.append(i)
+            used += cost
+    fallback = not chosen
+    if fallback:
+        for _, i, text in scored:
+            if used + _tokens(text) > budget:
+                break
+            chosen.append(i)
+            used += _tokens(text)
+
+    parts, previous = [], None
+    for i in sorted(chosen):
+        if previous is not None and i != previous + 1:
+            parts.append(GAP_MARKER)
+        parts.append(passages[i][1])
+        previous = i
+    text = "\n".join(parts)
+    return text, {
+        "passages": len(passages),
+        "kept": len(chosen),
+        "lines_collapsed": collapsed,
+        "chars_in": chars_in,
+        "chars_out": len(text),
+        "fallback": fallback,
+    }
+
+
+def compact_text(text: str, token_budget: int = None) -> tuple[str, dict]:
+    """Variante texte brut : pages séparées par saut de page (\\f) s'il y en a."""
+    return compact([page.splitlines() for page in text.split("\f")], token_budget)
@@ -0,0 +1,139 @@
+"""
+Request log — journalisation structurée et échantillonnée des invocations.
+
+Remplace les `logger.info(json.dumps(event))` du chemin chaud : sérialiser tout
+l'event API Gateway (en-têtes compris) à chaque requête coûte du CPU et de
+l'ingestion CloudWatch.
+
+Par invocation :
+  - les champs clés (route, iris_id, version...) posés via `field()` partent comme
+    propriétés de la ligne EMF déjà émise par metrics.instrument : aucune ligne en plus ;
+  - les notes (`note()`) sont bufferisées en mémoire ;
+  - une ligne détaillée (résumé de l'event + notes) n'est écrite, en une seule fois
+    en fin d'invocation, que si la requête est échantillonnée (LOG_SAMPLE_RATE), en
+    erreur (exception ou statusCode >= 500) ou lente (>= LOG_SLOW_MS).
+
+    @metrics.instrument("score")
+    @reqlog.logged("score")
+    @profiling.profiled("score")
+    def handler(event, context): ...
+"""
+import functools
+import json
+import os
+import random
+import sys
+import time
+import traceback
+
+import metrics
+
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "0.01") or 0)
+LOG_SLOW_MS = float(os.environ.get("LOG_SLOW_MS", "500"))
+MAX_NOTES = 50
+
+_current = None
+
+
+class RequestLog:
+    def __init__(self, service: str, sampled: bool):
+        self.service = service
+        self.sampled = sampled
+        self.fields: dict = {}
+        self.notes: list = []
+
+    def field(self, key: str, value):
+        self.fields[key] = value
+
+    def note(self, msg: str):
+        if len(self.notes) < MAX_NOTES:
+            self.notes.append(msg)
+
+
+def summarize_event(event) -> dict:
+    """Résumé compact : route et paramètres pour HTTP API v2, clés utiles pour Step Functions."""
+    if not isinstance(event, dict):
+        return {}
+    http = (event.get("requestContext") or {}).get("http")
+    if http:
+        return {
+            "route": event.get("routeKey") or http.get("path"),
+            "query": event.get("queryStringParameters") or {},
+            "source_ip": http.get("sourceIp"),
+            "user_agent": (http.get("userAgent") or "")[:120],
+            "api_request_id": (event.get("requestContext") or {}).get("requestId"),
+        }
+    summary = {k: event[k] for k in ("s3_bucket", "s3_key", "doc_type", "city", "iris_key", "action", "version")
+               if k in event}
+    if isinstance(event.get("body"), str):
+        summary["body_bytes"] = len(event["body"])
+    return summary
+
+
+def current():
+    return _current
+
+
+def sampled() -> bool:
+    """Vrai si l'invocation en cours écrira sa ligne détaillée (utile pour éviter un calcul coûteux)."""
+    return _current is not None and _current.sampled
+
+
+def field(key: str, value):
+    if _current is not None:
+        _current.field(key, value)
+
+
+def note(msg: str):
+    if _current is not None:
+        _current.note(msg)
+
+
+def _emit(log: RequestLog, event, level: str, reason: str, status, latency_ms: float, error: str = None):
+    doc = {
+        "level": level,
+        "msg": "request",
+        "service": log.service,
+        "reason": reason,
+        "status": status,
+        "latency_ms": round(latency_ms, 3),
+        **log.fields,
+        "event": summarize_event(event),
+    }
+    if log.notes:
+        doc["notes"] = log.notes
+    if error:
+        doc["error"] = error
+    sys.stdout.write(json.dumps(doc, default=str) + "\n")
+
+
+def logged(service: str):
+    """Décorateur de handler (sous metrics.instrument) : champs clés + ligne détaillée si nécessaire."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(event, context):
+            global _current
+            log = RequestLog(service, LOG_SAMPLE_RATE > 0 and random.random() < LOG_SAMPLE_RATE)
+            _current = log
+            t0 = time.perf_counter()
+            try:
+                response = fn(event, context)
+            except Exception:
+                _emit(log, event, "ERROR", "exception", None, (time.perf_counter() - t0) * 1000,
+                      traceback.format_exc(limit=20))
+                raise
+            finally:
+                _current = None
+                for key, value in log.fields.items():
+                    metrics.set_property(key, value)
+            latency_ms = (time.perf_counter() - t0) * 1000
+            status = response.get("statusCode") if isinstance(response, dict) else None
+            if isinstance(status, int) and status >= 500:
+                _emit(log, event, "ERROR", "error", status, latency_ms, str(response.get("body"))[:500])
+            elif latency_ms >= LOG_SLOW_MS:
+                _emit(log, event, "WARN", "slow", status, latency_ms)
+            elif log.sampled:
+                _emit(log, event, "INFO", "sampled", status, latency_ms)
+            return response
+        return wrapper
+    return decorator
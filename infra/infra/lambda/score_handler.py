@@ -5,6 +5,16 @@ from decimal import Decimal
 
 import boto3
 
+import cell_model
+import cities
+import compression
+import history
+import metrics
+import profiling
+import reqlog
+import score_store
+import warmup
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
@@ -12,6 +22,9 @@ SCORES_TABLE = os.environ.get("SCORES_TABLE", "")
 dynamodb = boto3.resource("dynamodb")
 table = dynamodb.Table(SCORES_TABLE) if SCORES_TABLE else None
 
+# Index IRIS et pointeur de version chargés en arrière-plan dès l'import (voir warmup.py)
+warmup.start(warmup.city_tasks(table))
+
 INTENDED_USE = "For planning & risk management; not for discriminatory decisions or speculative targeting."
 
 
@@ -29,23 +42,71 @@ def _parse_query_params(event):
     return lat, lng
 
 
-def _demo_iris_from_latlng(lat: float, lng: float) -> str:
-    """
-    Simple demo mapping for Paris:
-    - Higher lat: PARIS_DEMO_1
-    - Else higher lng: PARIS_DEMO_2
-    - Else: PARIS_DEMO_3
-    """
-    if lat >= 48.86:
-        return "PARIS_DEMO_1"
-    if lng >= 2.36:
-        return "PARIS_DEMO_2"
-    return "PARIS_DEMO_3"
+def _cell_response(city: str, lat: float, lng: float):
+    """Score de la maille de ~500 m (cell_model.py) dans la version active de la ville, ou None."""
+    version = score_store.active_version(table, city)
+    with metrics.timer("CellModelScoreLatency"):
+        cell = cell_model.score_at(city, version, lat, lng) if version else None
+    if cell is None:
+        return None
+    reqlog.field("cell_id", cell["cell_id"])
+    reqlog.field("score_version", version)
+    out = {
+        **cell,
+        "city": cities.name(city),
+        "score_version": version,
+        "source": "model",
+        "intended_use": INTENDED_USE,
+    }
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(out),
+    }
 
 
-def handler(event, context):
-    logger.info(f"Score request: {json.dumps(event)}")
+def _history_response(city: str, iris_id: str, as_of: str):
+    """Valeur de l'IRIS à la date `as_of`, reconstruite depuis sa série (history.py)."""
+    try:
+        ts = history.parse_as_of(as_of)
+    except ValueError:
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"error": "as_of must be an ISO 8601 date or a score version", "intended_use": INTENDED_USE}),
+        }
+    with metrics.timer("HistoryReadLatency"):
+        points, restored = history.read(table, iris_id)
+        point = history.at(points, ts)
+    if point is None:
+        return {
+            "statusCode": 404,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"error": "No score recorded at as_of", "iris_id": iris_id, "as_of": as_of,
+                                "intended_use": INTENDED_USE}),
+        }
+    reqlog.field("score_version", history.version_of(point, restored))
+    out = {
+        "iris_id": iris_id,
+        "city": cities.name(city),
+        **history.to_json(point, restored),
+        "as_of": as_of,
+        "source": "history",
+        "intended_use": INTENDED_USE,
+    }
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(out),
+    }
+
 
+@warmup.pingable("score")
+@metrics.instrument("score")
+@reqlog.logged("score")
+@profiling.profiled("score")
+@compression.negotiated
+def handler(event, context):
     if not table:
         return {
             "statusCode": 500,
@@ -79,12 +140,71 @@ def handler(event, context):
             ),
         }
 
-    iris_id = _demo_iris_from_latlng(lat, lng)
+    # Emprise de ville puis index IRIS de cette seule ville (chargé au premier appel)
+    city, iris_id = cities.resolve(lat, lng)
+    if city is None:
+        return {
+            "statusCode": 404,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps(
+                {
+                    "error": "Location outside supported cities",
+                    "supported_cities": sorted(cities.CITIES),
+                    "intended_use": INTENDED_USE,
+                }
+            ),
+        }
+    reqlog.field("city", city)
+    q = event.get("queryStringParameters") or {}
+    as_of = q.get("as_of")
+    # as_of se lit dans la série d'un IRIS : pas d'historique des mailles
+    if as_of and q.get("resolution") == "cell":
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"error": "as_of is not supported with resolution=cell", "intended_use": INTENDED_USE}),
+        }
+    if as_of and iris_id is None:
+        return {
+            "statusCode": 404,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"error": "No IRIS found near location (as_of needs an IRIS history)", "city": city,
+                                "intended_use": INTENDED_USE}),
+        }
+    warmup.wait("pointer", city)
+    # resolution=cell : score de la maille, même quand l'IRIS a une ligne pré-calculée
+    if q.get("resolution") == "cell":
+        response = _cell_response(city, lat, lng)
+        if response is None:
+            return {
+                "statusCode": 404,
+                "headers": {"Content-Type": "application/json"},
+                "body": json.dumps({"error": "No cell score for location", "city": city, "intended_use": INTENDED_USE}),
+            }
+        return response
+    if iris_id is None:
+        response = _cell_response(city, lat, lng)
+        if response is not None:
+            return response
+        return {
+            "statusCode": 404,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"error": "No IRIS found near location", "city": city, "intended_use": INTENDED_USE}),
+        }
+    reqlog.field("iris_id", iris_id)
+
+    if as_of:
+        return _history_response(city, iris_id, as_of)
 
-    resp = table.get_item(Key={"iris_id": iris_id})
-    item = resp.get("Item")
+    # Lecture via le pointeur de version active de la ville (snapshot cohérent)
+    with metrics.timer("DynamoDBReadLatency"):
+        item = score_store.get_score(table, iris_id, city)
 
     if not item:
+        # IRIS sans ligne dans la version active : modèle de mailles de la même version
+        response = _cell_response(city, lat, lng)
+        if response is not None:
+            return response
         return {
             "statusCode": 404,
             "headers": {"Content-Type": "application/json"},
@@ -97,16 +217,20 @@ def handler(event, context):
             ),
         }
 
+    reqlog.field("score_version", item.get("version"))
+
     # Convert Decimals and present nicer output
     out = {
         "iris_id": item.get("iris_id"),
-        "city": item.get("city", "Paris"),
+        "city": item.get("city") or cities.name(city),
         "future_value_score": _to_float(item.get("future_value_score")),
         "momentum": item.get("momentum"),
         "confidence": _to_float(item.get("confidence")),
         "data_freshness_days": _to_float(item.get("data_freshness_days")),
-        "top_signals": [s.strip() for s in (item.get("top_signals", "")).split(";") if s.strip()],
+        "top_signals": [s.strip() for s in (item.get("top_signals", "")).split("|") if s.strip()],
         "updated_at": item.get("updated_at"),
+        "score_version": item.get("version"),
+        "source": "precomputed",
         "intended_use": INTENDED_USE,
     }
 
@@ -0,0 +1,229 @@
+"""
+Score store — jeux de scores versionnés dans PrenScoresTable (iris_id + version).
+
+Items (partitionnés par ville : chaque ville publie et revient en arrière seule) :
+  - score       : {"iris_id": "751...", "version": "20260301T020000Z", "city_key": "paris", ...}
+  - manifeste   : {"iris_id": "#VERSION#paris", "version": <v>, "item_count": n,
+                   "sample_iris_id": "751...", "created_at": ...}
+  - pointeur    : {"iris_id": "#POINTER#paris", "version": "ACTIVE", "active_version": <v>,
+                   "previous_version": <v-1>, "published_at": ...}
+
+Les codes IRIS étant uniques au niveau national, les items de score gardent leur clé ;
+seuls pointeur et manifeste portent la ville.
+
+Un batch écrit d'abord tous ses items sous une nouvelle version (jamais lue tant
+qu'elle n'est pas publiée), puis publie par UNE écriture conditionnelle du pointeur.
+Le rollback est la même écriture vers previous_version. Les lecteurs résolvent la
+version active une fois par conteneur (TTL POINTER_TTL_SECONDS) : chaque requête
+voit un snapshot cohérent, jamais un mélange ancien/nouveau.
+
+Usage local :
+  python score_store.py status   <PrenScoresTable> [--city lyon]
+  python score_store.py delete   <PrenScoresTable> <version> [--city lyon]
+
+Publication et rollback passent par PublishHandler (historique, flux /changes), jamais
+par une écriture directe du pointeur depuis la CLI.
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import cities
+
+logger = logging.getLogger()
+
+POINTER_PK = "#POINTER"
+MANIFEST_PK = "#VERSION"
+POINTER_TTL_SECONDS = float(os.environ.get("POINTER_TTL_SECONDS", "30"))
+
+
+class PublishConflict(Exception):
+    """Le pointeur a changé entre la lecture et l'écriture (publication concurrente)."""
+
+
+def new_version(now: datetime = None) -> str:
+    """Identifiant de version triable : 20260301T020000Z."""
+    return (now or datetime.now(timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _to_dynamo(item: dict) -> dict:
+    return {k: Decimal(str(v)) if isinstance(v, float) else v for k, v in item.items()}
+
+
+def _pointer_key(city: str) -> dict:
+    return {"iris_id": f"{POINTER_PK}#{city}", "version": "ACTIVE"}
+
+
+def _manifest_pk(city: str) -> str:
+    return f"{MANIFEST_PK}#{city}"
+
+
+def stage_version(table, version: str, items: list[dict], city: str = None) -> int:
+    """
+    Écrit le jeu complet d'une ville sous `version` (batch_writer, lots de 25) puis son
+    manifeste ; sample_iris_id (premier item) sert de contrôle à /health?deep=1.
+    """
+    city = cities.slug(city)
+    with table.batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=_to_dynamo({**item, "version": version, "city_key": city}))
+    table.put_item(Item={
+        "iris_id": _manifest_pk(city),
+        "version": version,
+        "city_key": city,
+        "item_count": len(items),
+        "sample_iris_id": items[0]["iris_id"] if items else None,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    })
+    return len(items)
+
+
+def get_manifest(table, version: str, city: str = None, consistent: bool = True) -> dict:
+    city = cities.slug(city)
+    item = table.get_item(Key={"iris_id": _manifest_pk(city), "version": version}, ConsistentRead=consistent).get("Item")
+    return item or {}
+
+
+def get_pointer(table, city: str = None, consistent: bool = True) -> dict:
+    city = cities.slug(city)
+    item = table.get_item(Key=_pointer_key(city), ConsistentRead=consistent).get("Item")
+    return item or {}
+
+
+def publish(table, version: str, expected_active: str = None, city: str = None) -> dict:
+    """
+    Bascule le pointeur de `city` sur `version` si sa version active est toujours
+    `expected_active` (None = lue juste avant). Lève PublishConflict si un autre publish
+    est passé entre-temps.
+    """
+    city = cities.slug(city)
+    if not get_manifest(table, version, city):
+        raise ValueError(f"Unknown score version {version} for {city} (not staged)")
+
+    if expected_active is None:
+        expected_active = get_pointer(table, city).get("active_version")
+
+    if expected_active is None:
+        condition = "attribute_not_exists(active_version)"
+        values = {}
+    else:
+        condition = "active_version = :expected"
+        values = {":expected": expected_active}
+
+    from botocore.exceptions import ClientError
+    try:
+        resp = table.update_item(
+            Key=_pointer_key(city),
+            UpdateExpression="SET active_version = :v, previous_version = :prev, published_at = :ts",
+            ConditionExpression=condition,
+            ExpressionAttributeValues={
+                **values,
+                ":v": version,
+                ":prev": expected_active,
+                ":ts": datetime.now(timezone.utc).isoformat(),
+            },
+            ReturnValues="ALL_NEW",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            raise PublishConflict(f"Active version changed (expected {expected_active})") from e
+        raise
+    _cache[city] = {"version": version, "expires": time.monotonic() + POINTER_TTL_SECONDS}
+    logger.info(f"Published score version {version} for {city} (previous {expected_active})")
+    return resp["Attributes"]
+
+
+def rollback(table, to_version: str = None, city: str = None) -> dict:
+    """Republie previous_version (ou `to_version`) de `city` en une écriture conditionnelle."""
+    pointer = get_pointer(table, city)
+    target = to_version or pointer.get("previous_version")
+    if not target:
+        raise ValueError("No previous version to roll back to")
+    return publish(table, target, expected_active=pointer.get("active_version"), city=city)
+
+
+def delete_version(table, version: str, city: str = None) -> int:
+    """
+    Supprime le jeu non actif d'une ville (scan projeté filtré sur la version, suppression
+    par lots).
+    """
+    city = cities.slug(city)
+    if get_pointer(table, city).get("active_version") == version:
+        raise ValueError(f"Refusing to delete active version {version} of {city}")
+    kwargs = {
+        "FilterExpression": "#v = :v",
+        "ProjectionExpression": "iris_id, #v, city_key",
+        "ExpressionAttributeNames": {"#v": "version"},
+        "ExpressionAttributeValues": {":v": version},
+    }
+    deleted = 0
+    with table.batch_writer() as batch:
+        while True:
+            resp = table.scan(**kwargs)
+            for key in resp.get("Items", []):
+                if key.pop("city_key", None) != city:
+                    continue
+                batch.delete_item(Key=key)
+                deleted += 1
+            if "LastEvaluatedKey" not in resp:
+                break
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    return deleted
+
+
+# Cache des pointeurs par conteneur : city -> {"version", "expires"}
+_cache: dict = {}
+
+
+def active_version(table, city: str = None):
+    """Version active de `city`, relue au plus une fois par POINTER_TTL_SECONDS par conteneur."""
+    city = cities.slug(city)
+    now = time.monotonic()
+    entry = _cache.get(city)
+    if entry is None or now >= entry["expires"]:
+        entry = {"version": get_pointer(table, city, consistent=False).get("active_version"),
+                 "expires": now + POINTER_TTL_SECONDS}
+        _cache[city] = entry
+    return entry["version"]
+
+
+def get_score(table, iris_id: str, city: str = None):
+    """
+    Item de score de `iris_id` dans la version active de sa ville (déduite du code IRIS
+    si absente) ; None si absent ou rien de publié.
+    """
+    version = active_version(table, city or cities.city_of_iris(iris_id))
+    if not version:
+        return None
+    return table.get_item(Key={"iris_id": iris_id, "version": version}).get("Item")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage versioned score sets")
+    parser.add_argument("action", choices=["status", "delete"])
+    parser.add_argument("table")
+    parser.add_argument("version", nargs="?")
+    parser.add_argument("--city", default=cities.DEFAULT_CITY, help=f"City slug (default {cities.DEFAULT_CITY})")
+    args = parser.parse_args()
+
+    import boto3
+    table = boto3.resource("dynamodb").Table(args.table)
+    if args.action == "status":
+        print(get_pointer(table, args.city))
+        resp = table.query(
+            KeyConditionExpression="iris_id = :pk",
+            ExpressionAttributeValues={":pk": _manifest_pk(cities.slug(args.city))},
+            ScanIndexForward=False,
+            Limit=10,
+        )
+        for m in resp.get("Items", []):
+            print(f"  {m['version']}  items={m.get('item_count')}  created_at={m.get('created_at')}")
+    elif args.action == "delete":
+        print(f"Deleted {delete_version(table, args.version, args.city)} items")
+
+
+if __name__ == "__main__":
+    main()
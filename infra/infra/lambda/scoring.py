@@ -0,0 +1,285 @@
+"""
+Scoring batch — calcule future_value_score, momentum et confidence pour tous les IRIS.
+
+Entrées :
+  - univers IRIS d'une ville : geo/<city>/iris_centroids.csv (iris_id, city, lat, lng)
+  - signaux structurés par bedrock_handler (PrenSignalsTable, items avec iris_id)
+
+Les signaux sont agrégés en une matrice de features (IRIS x features) par numpy,
+puis toutes les sorties sont calculées en une seule passe vectorisée.
+
+Usage local :
+  python scoring.py --iris iris_centroids.csv --signals signals.ndjson --out scores.ndjson
+  python scoring.py --iris iris_centroids.csv --signals-table <PrenSignalsTable> \
+      --scores-table <PrenScoresTable> [--city lyon]
+
+Une version stagée en local n'a ni snapshot ni modèle de mailles, et la CLI ne la
+publie pas : une version publiable passe par PrenScoringStateMachine (ScoringHandler
+puis PublishScores, qui alimente aussi l'historique et le flux /changes).
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import math
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+import cities
+
+logger = logging.getLogger()
+
+SIGNAL_TYPES = ["permit", "zoning", "infrastructure", "renovation", "commercial"]
+TYPE_WEIGHTS = np.array([1.0, 0.8, 1.2, 0.7, 0.6])
+IMPACT_SIGN = {"positive": 1.0, "negative": -1.0, "neutral": 0.0}
+
+DECAY_DAYS = 365.0          # demi-vie approximative de l'influence d'un signal
+RECENT_DAYS = 180.0         # fenêtre "récente" pour le momentum
+SCORE_SCALE = 3.0           # intensité à laquelle le score atteint ~0.5 + 0.5*tanh(1)
+MOMENTUM_BUCKETS = [(2.0, "High"), (0.75, "Medium")]
+VOLUME_SCALE = 5.0          # nombre de signaux auquel la confiance atteint ~63 % de son plafond
+TOP_SIGNALS = 3
+
+# Colonnes de la matrice de features
+F_TYPES = slice(0, len(SIGNAL_TYPES))
+F_COUNT = len(SIGNAL_TYPES)
+F_CONF_SUM = F_COUNT + 1
+F_SIGN_SUM = F_COUNT + 2
+F_RECENT = F_COUNT + 3
+F_NEWEST_AGE = F_COUNT + 4
+N_FEATURES = F_COUNT + 5
+
+
+def load_iris_rows(raw: str) -> list[tuple[str, str]]:
+    """Lit le CSV des centroïdes IRIS -> [(iris_id, city)]."""
+    rows = []
+    for row in csv.DictReader(io.StringIO(raw)):
+        rows.append((row["iris_id"], row.get("city") or "Paris"))
+    return rows
+
+
+def build_feature_matrix(iris_ids: list[str], signals: list[dict], now: datetime):
+    """
+    Agrège les signaux en matrice (n_iris x N_FEATURES). Retourne aussi, par signal,
+    la ligne IRIS et la force signée (pour sélectionner les top_signals).
+    """
+    index = {iris_id: i for i, iris_id in enumerate(iris_ids)}
+    keep = [s for s in signals if s.get("iris_id") in index]
+    n = len(keep)
+
+    rows = np.fromiter((index[s["iris_id"]] for s in keep), dtype=np.int64, count=n)
+    type_idx = np.fromiter(
+        (SIGNAL_TYPES.index(s.get("signal_type")) if s.get("signal_type") in SIGNAL_TYPES else -1 for s in keep),
+        dtype=np.int64, count=n,
+    )
+    sign = np.fromiter((IMPACT_SIGN.get(s.get("impact"), 0.0) for s in keep), dtype=np.float64, count=n)
+    conf = np.fromiter((signal_confidence(s) for s in keep), dtype=np.float64, count=n)
+    created = np.array([(s.get("created_at") or now.isoformat())[:19] for s in keep], dtype="datetime64[s]")
+    age_days = (np.datetime64(now.replace(tzinfo=None).isoformat()[:19], "s") - created) / np.timedelta64(1, "D")
+    age_days = np.maximum(age_days.astype(np.float64), 0.0)
+
+    decay = np.exp(-age_days / DECAY_DAYS)
+    strength = sign * conf * decay
+    typed = type_idx >= 0
+
+    X = np.zeros((len(iris_ids), N_FEATURES))
+    np.add.at(X, (rows[typed], type_idx[typed]), strength[typed])
+    X[:, F_COUNT] = np.bincount(rows, minlength=len(iris_ids))
+    X[:, F_CONF_SUM] = np.bincount(rows, weights=conf, minlength=len(iris_ids))
+    X[:, F_SIGN_SUM] = np.bincount(rows, weights=sign, minlength=len(iris_ids))
+    recent = (age_days <= RECENT_DAYS) & (sign > 0)
+    X[:, F_RECENT] = np.bincount(rows[recent], weights=(conf * _type_weights(type_idx))[recent],
+                                 minlength=len(iris_ids))
+    newest = np.full(len(iris_ids), np.inf)
+    np.minimum.at(newest, rows, age_days)
+    X[:, F_NEWEST_AGE] = newest
+    return X, rows, strength, keep
+
+
+def signal_confidence(signal: dict) -> float:
+    """
+    Confiance stockée d'un signal ; 0.5 si absente ou illisible. L'ancien bedrock_handler
+    écrivait str(confidence), soit "None" quand Nova renvoyait null.
+    """
+    try:
+        value = float(signal.get("confidence") or 0.5)
+    except (TypeError, ValueError):
+        return 0.5
+    return value if math.isfinite(value) else 0.5
+
+
+def _type_weights(type_idx: np.ndarray) -> np.ndarray:
+    """Poids de type par signal (0.5 pour un type inconnu)."""
+    return np.where(type_idx >= 0, TYPE_WEIGHTS[np.clip(type_idx, 0, None)], 0.5)
+
+
+def score_matrix(X: np.ndarray) -> dict:
+    """Passe vectorisée : toutes les sorties pour tous les IRIS."""
+    count = X[:, F_COUNT]
+    intensity = X[:, F_TYPES] @ TYPE_WEIGHTS
+    future_value_score = 0.5 + 0.5 * np.tanh(intensity / SCORE_SCALE)
+
+    momentum_raw = X[:, F_RECENT]
+    momentum = np.full(len(X), "Low", dtype=object)
+    for threshold, label in reversed(MOMENTUM_BUCKETS):
+        momentum[momentum_raw >= threshold] = label
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_conf = np.where(count > 0, X[:, F_CONF_SUM] / count, 0.0)
+        consistency = np.where(count > 0, np.abs(X[:, F_SIGN_SUM]) / count, 0.0)
+    volume = 1.0 - np.exp(-count / VOLUME_SCALE)
+    confidence = np.clip(mean_conf * volume * (0.5 + 0.5 * consistency), 0.1, 0.99)
+
+    return {
+        "future_value_score": np.round(future_value_score, 2),
+        "momentum": momentum,
+        "momentum_raw": np.round(momentum_raw, 3),
+        "confidence": np.round(confidence, 2),
+        "data_freshness_days": X[:, F_NEWEST_AGE],
+    }
+
+
+def model_coefficients() -> dict:
+    """Coefficients de score_matrix, sérialisés avec le modèle de mailles (cell_model.py)."""
+    return {
+        "type_weights": TYPE_WEIGHTS.tolist(),
+        "score_scale": SCORE_SCALE,
+        "momentum_high": MOMENTUM_BUCKETS[0][0],
+        "momentum_medium": MOMENTUM_BUCKETS[1][0],
+        "volume_scale": VOLUME_SCALE,
+    }
+
+
+def top_signals(n_iris: int, rows: np.ndarray, strength: np.ndarray, signals: list[dict], k: int = TOP_SIGNALS):
+    """Les k signaux de plus forte |force| par IRIS (tri lexicographique, sans boucle par IRIS)."""
+    out = [[] for _ in range(n_iris)]
+    if len(rows) == 0:
+        return out
+    order = np.lexsort((-np.abs(strength), rows))
+    sorted_rows = rows[order]
+    group_start = np.searchsorted(sorted_rows, sorted_rows, side="left")
+    rank = np.arange(len(order)) - group_start
+    for pos in np.nonzero(rank < k)[0]:
+        signal = signals[order[pos]]
+        if signal.get("description"):
+            out[sorted_rows[pos]].append(signal)
+    return out
+
+
+def _evidence(signal: dict) -> dict:
+    """Preuve documentaire d'un signal, embarquée dans la réponse /explain pré-calculée."""
+    return {
+        "doc_id": (signal.get("pk") or "").removeprefix("DOC#"),
+        "description": signal.get("description"),
+        "signal_type": signal.get("signal_type"),
+        "impact": signal.get("impact"),
+        "confidence": signal_confidence(signal),
+    }
+
+
+def compute_scores(iris_rows: list[tuple[str, str]], signals: list[dict], now: datetime = None,
+                   return_features: bool = False):
+    """
+    Features -> scores -> items pour PrenScoresTable. `evidence` (top signaux détaillés)
+    est remplacé par la réponse /explain compressée via explain_payload.attach.
+    return_features : retourne (items, X) — X sert au modèle de mailles.
+    """
+    now = now or datetime.now(timezone.utc)
+    iris_ids = [r[0] for r in iris_rows]
+    X, rows, strength, kept = build_feature_matrix(iris_ids, signals, now)
+    out = score_matrix(X)
+    tops = top_signals(len(iris_ids), rows, strength, kept)
+    updated_at = now.date().isoformat()
+
+    items = []
+    for i, (iris_id, city) in enumerate(iris_rows):
+        item = {
+            "iris_id": iris_id,
+            "city": city,
+            "future_value_score": float(out["future_value_score"][i]),
+            "momentum": out["momentum"][i],
+            "momentum_raw": float(out["momentum_raw"][i]),
+            "confidence": float(out["confidence"][i]),
+            "signal_count": int(X[i, F_COUNT]),
+            "top_signals": " | ".join(sig["description"] for sig in tops[i]),
+            "evidence": [_evidence(sig) for sig in tops[i]],
+            "updated_at": updated_at,
+        }
+        if np.isfinite(out["data_freshness_days"][i]):
+            item["data_freshness_days"] = int(out["data_freshness_days"][i])
+        items.append(item)
+    return (items, X) if return_features else items
+
+
+def scan_signals(table, city: str = None) -> list[dict]:
+    """
+    Scan projeté des signaux rattachés à un IRIS. Pour une ville autre que DEFAULT_CITY,
+    filtré sur city_key (les signaux d'avant le partitionnement n'en ont pas et sont
+    ceux de DEFAULT_CITY ; build_feature_matrix écarte de toute façon les IRIS hors univers).
+    """
+    kwargs = {
+        "FilterExpression": "attribute_exists(iris_id)",
+        "ProjectionExpression": "pk, iris_id, signal_type, impact, confidence, description, created_at",
+    }
+    if city and city != cities.DEFAULT_CITY:
+        kwargs["FilterExpression"] = "attribute_exists(iris_id) AND city_key = :c"
+        kwargs["ExpressionAttributeValues"] = {":c": city}
+    signals = []
+    while True:
+        resp = table.scan(**kwargs)
+        signals.extend(resp.get("Items", []))
+        if "LastEvaluatedKey" not in resp:
+            return signals
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _read_local(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch scoring for all IRIS")
+    parser.add_argument("--iris", required=True, help="IRIS centroids CSV")
+    parser.add_argument("--signals", help="Signals NDJSON (local run)")
+    parser.add_argument("--signals-table", help="PrenSignalsTable name (scan)")
+    parser.add_argument("--scores-table", help="PrenScoresTable name (stage a new score version)")
+    parser.add_argument("--city", default=cities.DEFAULT_CITY, help=f"City slug (default {cities.DEFAULT_CITY})")
+    parser.add_argument("--out", help="Write scores as NDJSON")
+    args = parser.parse_args()
+
+    iris_rows = load_iris_rows(_read_local(args.iris))
+    if args.signals:
+        signals = [json.loads(line) for line in _read_local(args.signals).splitlines() if line.strip()]
+    elif args.signals_table:
+        import boto3
+        signals = scan_signals(boto3.resource("dynamodb").Table(args.signals_table), args.city)
+    else:
+        signals = []
+
+    t0 = time.perf_counter()
+    items = compute_scores(iris_rows, signals)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    print(f"Scored {len(items)} IRIS from {len(signals)} signals in {elapsed_ms:.1f} ms")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            for item in items:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    if args.scores_table:
+        import boto3
+        import explain_payload
+        import score_store
+        table = boto3.resource("dynamodb").Table(args.scores_table)
+        version = score_store.new_version()
+        explain_payload.attach(items, version)
+        written = score_store.stage_version(table, version, items, args.city)
+        print(f"Staged {written} items as version {version} for {args.city} in {args.scores_table} (not published)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
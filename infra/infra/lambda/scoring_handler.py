@@ -0,0 +1,104 @@
+"""
+Scoring handler — étape Lambda du batch de scoring (voir scoring.py).
+Score une ville à la fois : lit son univers IRIS (geo/<city>/iris_centroids.csv) depuis
+l'ArtifactsBucket, scanne ses signaux, calcule tous les
+scores en une passe numpy, pré-calcule les réponses /explain (JSON gzip) puis les
+écrit par lots sous une nouvelle version de PrenScoresTable. La version n'est visible qu'après l'étape PublishScores.
+"""
+import json
+import logging
+import os
+import time
+
+import boto3
+
+import cell_model
+import changes
+import cities
+import explain_payload
+import metrics
+import profiling
+import reqlog
+import score_store
+import scoring
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+ARTIFACTS_BUCKET = os.environ.get("ARTIFACTS_BUCKET", "")
+SIGNALS_TABLE = os.environ.get("SIGNALS_TABLE", "")
+SCORES_TABLE = os.environ.get("SCORES_TABLE", "")
+
+s3_client = boto3.client("s3", region_name="eu-west-3")
+dynamodb = boto3.resource("dynamodb")
+signals_table = dynamodb.Table(SIGNALS_TABLE) if SIGNALS_TABLE else None
+scores_table = dynamodb.Table(SCORES_TABLE) if SCORES_TABLE else None
+
+
+@metrics.instrument("scoring")
+@reqlog.logged("scoring")
+@profiling.profiled("scoring")
+def handler(event, context):
+    """
+    Input event (optionnel) :
+    {
+      "city": "paris",                              (défaut : DEFAULT_CITY)
+      "iris_key": "geo/paris/iris_centroids.csv"    (défaut : artefact de la ville)
+    }
+    """
+    logger.info("Scoring batch request")
+
+    if not (ARTIFACTS_BUCKET and signals_table and scores_table):
+        return {"statusCode": 500, "body": json.dumps({"error": "ARTIFACTS_BUCKET/SIGNALS_TABLE/SCORES_TABLE not configured"})}
+
+    city = cities.slug((event or {}).get("city"))
+    iris_key = (event or {}).get("iris_key") or cities.artifact_key(city, cities.IRIS_INDEX_NAME)
+    reqlog.field("city", city)
+    try:
+        obj = s3_client.get_object(Bucket=ARTIFACTS_BUCKET, Key=iris_key)
+        raw = obj["Body"].read().decode("utf-8")
+        iris_rows = scoring.load_iris_rows(raw)
+    except Exception as e:
+        logger.error(f"IRIS universe unavailable: {e}")
+        return {"statusCode": 500, "body": json.dumps({"error": f"Cannot read s3://{ARTIFACTS_BUCKET}/{iris_key}: {e}"})}
+
+    with metrics.timer("DynamoDBReadLatency"):
+        signals = scoring.scan_signals(signals_table, city)
+
+    t0 = time.perf_counter()
+    items, X = scoring.compute_scores(iris_rows, signals, return_features=True)
+    compute_ms = (time.perf_counter() - t0) * 1000
+    metrics.put("ScoringComputeLatency", round(compute_ms, 3))
+
+    version = score_store.new_version()
+    explain_payload.attach(items, version)
+    with metrics.timer("DynamoDBWriteLatency"):
+        written = score_store.stage_version(scores_table, version, items, city)
+    metrics.put("ScoresWritten", written, "Count")
+
+    # Modèle de mailles de la même version : scores à la demande hors lignes pré-calculées
+    model_bytes = 0
+    if city in cities.CITIES:
+        centroids = {iris_id: (lat, lng) for iris_id, lat, lng in cities.IrisIndex.loads(raw).rows()}
+        if centroids:
+            with metrics.timer("CellModelBuildLatency"):
+                blob = cell_model.build(city, centroids, [r[0] for r in iris_rows], X, scoring.model_coefficients())
+            s3_client.put_object(Bucket=ARTIFACTS_BUCKET, Key=cell_model.model_key(city, version), Body=blob,
+                                 ContentType="application/octet-stream")
+            model_bytes = len(blob)
+    # Snapshot compact de la version : diffé par publish_handler contre la version précédente (changes.py)
+    s3_client.put_object(Bucket=ARTIFACTS_BUCKET, Key=changes.snapshot_key(city, version), Body=changes.snapshot_bytes(items),
+                         ContentType="application/octet-stream")
+    logger.info(f"Scored {len(items)} IRIS from {len(signals)} signals in {compute_ms:.1f} ms, staged {written} as {version} for {city}")
+
+    result = {
+        "city": city,
+        "version": version,
+        "iris_count": len(items),
+        "signal_count": len(signals),
+        "compute_ms": round(compute_ms, 1),
+        "scores_written": written,
+        "cell_model_bytes": model_bytes,
+        "status": "staged"
+    }
+    return {"statusCode": 200, "body": json.dumps(result)}
@@ -3,6 +3,8 @@ Textract handler — extrait le texte d'un PDF depuis S3.
 Stratégie :
   1. Textract DetectDocumentText (synchrone, recommandé si activé)
   2. Fallback pypdf (pure Python) si Textract non disponible sur ce compte
+Le texte est ensuite compacté (relevance) : en-têtes / pieds de page répétés retirés et
+seuls les passages pertinents, dans un budget de tokens, partent vers Bedrock.
 """
 import io
 import json
@@ -11,6 +13,13 @@ import os
 import boto3
 from botocore.exceptions import ClientError
 
+import metrics
+import profiling
+import rate_limiter
+import relevance
+import reqlog
+from tracing import Trace
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
@@ -26,24 +35,27 @@ dynamodb = boto3.resource("dynamodb")
 signals_table = dynamodb.Table(SIGNALS_TABLE) if SIGNALS_TABLE else None
 
 
-def _extract_with_pypdf(s3_bucket: str, s3_key: str) -> tuple[list[str], int]:
+def _extract_with_pypdf(s3_bucket: str, s3_key: str, trace: Trace = None) -> list[list[str]]:
     """Fallback : télécharge le PDF depuis S3 et extrait le texte avec pypdf."""
-    logger.info(f"Fallback pypdf pour s3://{s3_bucket}/{s3_key}")
-    obj = s3_client.get_object(Bucket=s3_bucket, Key=s3_key)
-    pdf_bytes = obj["Body"].read()
+    reqlog.note(f"Fallback pypdf pour s3://{s3_bucket}/{s3_key}")
+    trace = trace or Trace(s3_key)
+    with trace.span("download"):
+        obj = s3_client.get_object(Bucket=s3_bucket, Key=s3_key)
+        pdf_bytes = obj["Body"].read()
 
     from pypdf import PdfReader
     reader = PdfReader(io.BytesIO(pdf_bytes))
-    lines = []
-    for page in reader.pages:
-        text = page.extract_text() or ""
-        for line in text.splitlines():
-            line = line.strip()
-            if line:
-                lines.append(line)
-    return lines, len(reader.pages)
+    pages = []
+    for page_no, page in enumerate(reader.pages, 1):
+        with trace.span("extract_page", page=page_no):
+            text = page.extract_text() or ""
+        pages.append([line.strip() for line in text.splitlines() if line.strip()])
+    return pages
 
 
+@metrics.instrument("textract")
+@reqlog.logged("textract")
+@profiling.profiled("textract")
 def handler(event, context):
     """
     Input event:
@@ -51,11 +63,10 @@ def handler(event, context):
       "s3_bucket": "...",
       "s3_key": "pdfs/plu_paris_zone1.pdf",
       "doc_type": "zoning",
-      "city": "Paris"
+      "city": "Paris",
+      "extractor": "pypdf"          (optionnel : force pypdf)
     }
     """
-    logger.info(f"Textract request: {json.dumps(event)}")
-
     s3_bucket = event.get("s3_bucket", RAW_BUCKET)
     s3_key = event.get("s3_key", "")
     doc_type = event.get("doc_type", "unknown")
@@ -64,49 +75,76 @@ def handler(event, context):
     if not s3_key:
         return {"statusCode": 400, "body": json.dumps({"error": "s3_key required"})}
 
+    trace = Trace.from_payload(event, s3_key)
+    trace.add_queue_wait(event)
+
     extraction_method = "textract"
-    lines = []
-    page_count = 0
+    pages = []
+    # "extractor": "pypdf" (backfill, tools/backfill.py) : pypdf sans passer par Textract
+    use_pypdf = event.get("extractor") == "pypdf"
 
     # Tentative Textract AnalyzeDocument (synchrone, supporte PDF)
-    try:
-        response = textract.analyze_document(
-            Document={"S3Object": {"Bucket": s3_bucket, "Name": s3_key}},
-            FeatureTypes=_ANALYZE_FEATURES
-        )
-        for block in response.get("Blocks", []):
-            if block["BlockType"] == "LINE":
-                lines.append(block["Text"])
-        page_count = len(set(b.get("Page", 1) for b in response.get("Blocks", [])))
-        logger.info(f"Textract AnalyzeDocument OK : {len(lines)} lignes, {page_count} pages")
-
-    except ClientError as e:
-        code = e.response["Error"]["Code"]
-        logger.warning(f"Textract indisponible ({code}) — bascule sur pypdf")
-        if code in ("SubscriptionRequiredException", "AccessDeniedException",
-                    "UnsupportedDocumentException", "InvalidParameterException"):
-            try:
-                lines, page_count = _extract_with_pypdf(s3_bucket, s3_key)
-                extraction_method = "pypdf"
-                logger.info(f"pypdf OK : {len(lines)} lignes, {page_count} pages")
-            except Exception as pypdf_err:
-                logger.error(f"pypdf error: {pypdf_err}")
-                return {"statusCode": 500, "body": json.dumps({"error": f"Both extractors failed: {pypdf_err}"})}
-        else:
-            logger.error(f"Textract error inattendue: {e}")
-            return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
-
-    full_text = "\n".join(lines)
+    if not use_pypdf:
+        try:
+            with metrics.timer("TextractLatency"), trace.span("textract_analyze"):
+                response = rate_limiter.call(
+                    "textract", textract.analyze_document,
+                    Document={"S3Object": {"Bucket": s3_bucket, "Name": s3_key}},
+                    FeatureTypes=_ANALYZE_FEATURES,
+                    deadline=rate_limiter.deadline_for(context)
+                )
+            by_page: dict[int, list] = {}
+            for block in response.get("Blocks", []):
+                if block["BlockType"] == "LINE":
+                    by_page.setdefault(block.get("Page", 1), []).append(block["Text"])
+            pages = [by_page[n] for n in sorted(by_page)]
+            reqlog.note(f"Textract AnalyzeDocument OK : {sum(map(len, pages))} lignes, {len(pages)} pages")
+
+        except ClientError as e:
+            code = e.response["Error"]["Code"]
+            logger.warning(f"Textract indisponible ({code}) — bascule sur pypdf")
+            if code not in ("SubscriptionRequiredException", "AccessDeniedException",
+                            "UnsupportedDocumentException", "InvalidParameterException"):
+                logger.error(f"Textract error inattendue: {e}")
+                return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
+            use_pypdf = True
+
+    if use_pypdf:
+        try:
+            with metrics.timer("PypdfLatency"):
+                pages = _extract_with_pypdf(s3_bucket, s3_key, trace)
+            extraction_method = "pypdf"
+            reqlog.note(f"pypdf OK : {sum(map(len, pages))} lignes, {len(pages)} pages")
+        except Exception as pypdf_err:
+            logger.error(f"pypdf error: {pypdf_err}")
+            return {"statusCode": 500, "body": json.dumps({"error": f"Both extractors failed: {pypdf_err}"})}
+
+    page_count = len(pages)
+    metrics.put("PagesExtracted", page_count, "Count")
+    metrics.set_property("ExtractionMethod", extraction_method)
+
+    # Seuls les passages pertinents (budget de tokens) partent vers Bedrock
+    with metrics.timer("RelevanceLatency"), trace.span("relevance"):
+        compact_text, stats = relevance.compact(pages)
+    metrics.put("RelevanceCompaction", round(stats["chars_out"] / max(stats["chars_in"], 1), 4), "None")
+    metrics.put("PassagesKept", stats["kept"], "Count")
+    reqlog.note(f"Relevance : {stats['kept']}/{stats['passages']} passages, "
+                f"{stats['chars_in']} -> {stats['chars_out']} caractères")
+
     result = {
         "s3_key": s3_key,
         "doc_type": doc_type,
         "city": city,
         "page_count": page_count,
-        "line_count": len(lines),
-        "extracted_text": full_text[:10000],  # Limiter pour le payload Step Functions
+        "line_count": sum(map(len, pages)),
+        "extracted_text": compact_text[:10000],  # Limiter pour le payload Step Functions
+        "relevance": stats,
         "extraction_method": extraction_method,
-        "status": "extracted"
+        "status": "extracted",
+        "trace": trace.to_dict()
     }
 
-    logger.info(f"Extraction terminée ({extraction_method}) : {len(lines)} lignes, {page_count} pages")
+    reqlog.field("s3_key", s3_key)
+    reqlog.field("extraction_method", extraction_method)
+    reqlog.field("page_count", page_count)
     return {"statusCode": 200, "body": json.dumps(result)}
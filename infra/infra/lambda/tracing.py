@@ -0,0 +1,78 @@
+"""
+Tracing — spans de temps par document, transportés dans le payload Step Functions.
+
+Chaque étape reprend la trace reçue (`payload["trace"]`), y ajoute ses spans puis la
+renvoie dans sa sortie. La dernière étape (bedrock_handler) la persiste dans
+PrenSignalsTable sous pk=DOC#<s3_key>, sk=TRACE. tools/trace_report.py agrège p50/p95
+par étape sur un run.
+
+Format :
+{
+  "doc_id": "pdfs/x.pdf",
+  "run_id": "<nom d'exécution Step Functions>",
+  "spans": [{"stage": "download", "ms": 41.2, "at": 1760000000.123, ...attributs}]
+}
+"""
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+MAX_SPANS = 300  # borne la taille du payload Step Functions (256 Ko)
+
+
+class Trace:
+    def __init__(self, doc_id: str, run_id: str = None, spans: list = None):
+        self.doc_id = doc_id
+        self.run_id = run_id
+        self.spans = list(spans or [])
+        self.dropped = 0
+
+    @classmethod
+    def from_payload(cls, payload: dict, doc_id: str) -> "Trace":
+        """Reprend la trace de l'étape précédente, ou en démarre une (run_id depuis l'exécution)."""
+        existing = payload.get("trace") or {}
+        run_id = existing.get("run_id") or (payload.get("execution") or {}).get("name")
+        trace = cls(existing.get("doc_id") or doc_id, run_id, existing.get("spans"))
+        trace.dropped = existing.get("dropped", 0)
+        return trace
+
+    def add(self, stage: str, ms: float, at: float = None, **attrs):
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return
+        span = {"stage": stage, "ms": round(ms, 3), "at": round(at if at is not None else time.time(), 3)}
+        span.update(attrs)
+        self.spans.append(span)
+
+    @contextmanager
+    def span(self, stage: str, **attrs):
+        at = time.time()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, (time.perf_counter() - t0) * 1000, at, **attrs)
+
+    def add_queue_wait(self, payload: dict):
+        """Attente avant la 1re étape : submitted_at (client) sinon début de l'exécution."""
+        started = payload.get("submitted_at") or (payload.get("execution") or {}).get("start")
+        if not started:
+            return
+        try:
+            t_start = datetime.fromisoformat(started.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return
+        now = time.time()
+        self.add("queue_wait", max(now - t_start, 0.0) * 1000, t_start)
+
+    def stage_totals(self) -> dict:
+        totals: dict[str, float] = {}
+        for span in self.spans:
+            totals[span["stage"]] = totals.get(span["stage"], 0.0) + span["ms"]
+        return {k: round(v, 3) for k, v in totals.items()}
+
+    def to_dict(self) -> dict:
+        out = {"doc_id": self.doc_id, "run_id": self.run_id, "spans": self.spans}
+        if self.dropped:
+            out["dropped"] = self.dropped
+        return out
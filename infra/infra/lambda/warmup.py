@@ -0,0 +1,125 @@
+"""
+Warmup — préchargement en arrière-plan au cold start et pings de maintien au chaud.
+
+Appelé à l'import d'un handler, `start(tasks)` lance chaque tâche dans son propre
+thread démon : index IRIS de la ville (ouvre aussi la connexion S3), pointeur de
+version active (ouvre la connexion DynamoDB)... pendant que le runtime termine l'init
+et livre le premier event. Le handler n'attend que la pièce qu'il utilise :
+
+  - `wait("pointer", city)` avant une lecture de score ;
+  - l'index IRIS n'a pas besoin d'attente explicite : cities.get_index prend le verrou
+    tenu par le chargement en cours.
+
+Une tâche absente (ville non préchargée, warm-up désactivé) ne fait pas attendre ; une
+tâche en échec non plus — le handler refait alors l'appel lui-même, comme sans warm-up.
+
+`@warmup.pingable(service)` répond aux pings planifiés (EventBridge, ou
+{"warmup": true}) sans passer par le handler : le ping attend la fin des tâches en
+cours et rejoue celles déjà terminées (no-op pour un index chargé, relecture d'un
+pointeur dont le TTL a expiré), le conteneur reste chaud pour la requête suivante. Ses métriques partent
+sous la dimension Service "<service>-warmup" pour ne pas fausser la latence de l'API.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+import cities
+import metrics
+import score_store
+
+logger = logging.getLogger()
+
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "1") == "1"
+WARMUP_CITIES = [cities.slug(c) for c in os.environ.get("WARMUP_CITIES", cities.DEFAULT_CITY).split(",") if c.strip()]
+WARMUP_WAIT_SECONDS = float(os.environ.get("WARMUP_WAIT_SECONDS", "2.0"))
+
+_tasks: dict = {}     # clé (kind, city) -> callable
+_done: dict = {}      # clé -> threading.Event
+_timings: dict = {}   # clé -> {"ms": durée, "ok": bool}
+
+
+def city_tasks(table, index: bool = True) -> dict:
+    """Tâches standard des handlers de lecture : pointeur (et index IRIS) de chaque ville de WARMUP_CITIES."""
+    tasks = {}
+    for city in WARMUP_CITIES:
+        if index:
+            tasks[("index", city)] = functools.partial(cities.get_index, city)
+        if table is not None:
+            tasks[("pointer", city)] = functools.partial(score_store.active_version, table, city)
+    return tasks
+
+
+def _run(key, fn):
+    t0 = time.perf_counter()
+    ok = True
+    try:
+        fn()
+    except Exception as e:
+        ok = False
+        logger.warning(f"Warmup task {key} failed: {e}")
+    finally:
+        _timings[key] = {"ms": round((time.perf_counter() - t0) * 1000, 3), "ok": ok}
+        _done[key].set()
+
+
+def start(tasks: dict) -> None:
+    """Lance les tâches (une par thread démon) ; sans effet si WARMUP_ENABLED=0."""
+    if not WARMUP_ENABLED:
+        return
+    for key, fn in tasks.items():
+        if key in _done:
+            continue
+        _tasks[key] = fn
+        _done[key] = threading.Event()
+        threading.Thread(target=_run, args=(key, fn), name=f"warmup-{'-'.join(key)}", daemon=True).start()
+
+
+def wait(kind: str, city: str, timeout: float = WARMUP_WAIT_SECONDS) -> None:
+    """Attend la tâche (kind, city) si elle est en cours ; WarmupWait (ms) quand l'attente est réelle."""
+    done = _done.get((kind, cities.slug(city)))
+    if done is None or done.is_set():
+        return
+    t0 = time.perf_counter()
+    done.wait(timeout)
+    metrics.put("WarmupWait", round((time.perf_counter() - t0) * 1000, 3))
+
+
+def status() -> dict:
+    """{"kind:city": {"ms", "ok"} ou None si en cours}."""
+    return {":".join(key): _timings.get(key) for key in _done}
+
+
+def is_ping(event) -> bool:
+    if not isinstance(event, dict):
+        return False
+    return event.get("warmup") is True or (
+        event.get("source") == "aws.events" and event.get("detail-type") == "Scheduled Event")
+
+
+def pingable(service: str):
+    """Décorateur (au-dessus de metrics.instrument) : court-circuite les pings de warm-up."""
+    def decorator(fn):
+        @metrics.instrument(f"{service}-warmup")
+        def answer_ping(event, context):
+            t0 = time.perf_counter()
+            for key, done in list(_done.items()):
+                if done.is_set():
+                    try:
+                        _tasks[key]()
+                    except Exception as e:
+                        logger.warning(f"Warmup ping task {key} failed: {e}")
+                else:
+                    done.wait(max(0.0, WARMUP_WAIT_SECONDS - (time.perf_counter() - t0)))
+            metrics.put("WarmPing", 1, "Count")
+            return {"statusCode": 200, "body": json.dumps({"warm": True, "tasks": status()})}
+
+        @functools.wraps(fn)
+        def wrapper(event, context):
+            if is_ping(event):
+                return answer_ping(event, context)
+            return fn(event, context)
+        return wrapper
+    return decorator
@@ -4,6 +4,7 @@ from aws_cdk import (
     RemovalPolicy,
     CfnOutput,
     Tags,
+    BundlingOptions,
     aws_s3 as s3,
     aws_dynamodb as dynamodb,
     aws_lambda as lambda_,
@@ -14,6 +15,9 @@ from aws_cdk import (
     aws_logs as logs,
     aws_iam as iam,
     aws_cloudwatch as cloudwatch,
+    aws_events as events,
+    aws_events_targets as events_targets,
+    aws_sqs as sqs,
 )
 from constructs import Construct
 
@@ -73,17 +77,62 @@ class PrenLiteStack(Stack):
             removal_policy=RemovalPolicy.DESTROY
         )
 
+        # Index des signaux par IRIS (preuves de /explain), plus récents d'abord
+        signals_table.add_global_secondary_index(
+            index_name="ByIris",
+            partition_key=dynamodb.Attribute(
+                name="iris_id",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="created_at",
+                type=dynamodb.AttributeType.STRING
+            ),
+            projection_type=dynamodb.ProjectionType.INCLUDE,
+            non_key_attributes=["description", "confidence", "evidence_span", "signal_type", "impact"]
+        )
+
+        # Jeux de scores versionnés (iris_id + version) + un item pointeur par ville "#POINTER#<city>" / "ACTIVE"
         scores_table = dynamodb.Table(
             self, "PrenScoresTable",
             partition_key=dynamodb.Attribute(
                 name="iris_id",
                 type=dynamodb.AttributeType.STRING
             ),
+            sort_key=dynamodb.Attribute(
+                name="version",
+                type=dynamodb.AttributeType.STRING
+            ),
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
             point_in_time_recovery=True,
             removal_policy=RemovalPolicy.DESTROY
         )
 
+        # Cache applicatif (réponses Bedrock, pk=BEDROCK#<sha256>, purgé par TTL) et
+        # seaux de débit partagés du rate limiter (pk=LIMIT#<service>)
+        cache_table = dynamodb.Table(
+            self, "PrenCacheTable",
+            partition_key=dynamodb.Attribute(
+                name="pk",
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            removal_policy=RemovalPolicy.DESTROY
+        )
+
+        # Jobs de scoring de portefeuille (statut, progression ; purgés par TTL)
+        jobs_table = dynamodb.Table(
+            self, "PrenJobsTable",
+            partition_key=dynamodb.Attribute(
+                name="job_id",
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            removal_policy=RemovalPolicy.DESTROY
+        )
+
         # 3) Lambda Functions
         # Ingest handler
         ingest_handler = lambda_.Function(
@@ -115,9 +164,10 @@ class PrenLiteStack(Stack):
             }
         )
 
-        # Grant read permissions
+        # Grant read permissions (index IRIS par ville : geo/<city>/iris_centroids.csv)
         scores_table.grant_read_data(score_handler)
         signals_table.grant_read_data(score_handler)
+        artifacts_bucket.grant_read(score_handler, "geo/*")
 
         # Explain handler
         explain_handler = lambda_.Function(
@@ -128,13 +178,16 @@ class PrenLiteStack(Stack):
             log_retention=logs.RetentionDays.ONE_WEEK,
             environment={
                 "SCORES_TABLE": scores_table.table_name,
-                "SIGNALS_TABLE": signals_table.table_name
+                "SIGNALS_TABLE": signals_table.table_name,
+                "EVIDENCE_INDEX": "ByIris",
+                "EVIDENCE_LIMIT": "10"
             }
         )
 
         # Grant read permissions
         scores_table.grant_read_data(explain_handler)
         signals_table.grant_read_data(explain_handler)
+        artifacts_bucket.grant_read(explain_handler, "geo/*")
 
         # Health handler
         health_handler = lambda_.Function(
@@ -144,12 +197,35 @@ class PrenLiteStack(Stack):
             code=lambda_.Code.from_asset("infra/lambda"),
             log_retention=logs.RetentionDays.ONE_WEEK,
             environment={
-                "SCORES_TABLE": scores_table.table_name
+                "SCORES_TABLE": scores_table.table_name,
+                "SIGNALS_TABLE": signals_table.table_name,
+                "HEALTH_CITIES": "paris",
+                "HEALTH_CACHE_SECONDS": "60",
+                "HEALTH_PROBE_TIMEOUT": "1.0"
             }
         )
 
-        # Grant read permissions
+        # Grant read permissions (sondes deep : scores, signaux, artefacts geo/)
         scores_table.grant_read_data(health_handler)
+        signals_table.grant_read_data(health_handler)
+        artifacts_bucket.grant_read(health_handler, "geo/*")
+
+        # History handler (série des scores par IRIS, voir infra/lambda/history.py)
+        history_handler = lambda_.Function(
+            self, "HistoryHandler",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="history_handler.handler",
+            code=lambda_.Code.from_asset("infra/lambda"),
+            log_retention=logs.RetentionDays.ONE_WEEK,
+            environment={
+                "SCORES_TABLE": scores_table.table_name,
+                "HISTORY_MAX_POINTS": "1000"
+            }
+        )
+
+        # Grant read permissions (index IRIS pour les requêtes lat/lng)
+        scores_table.grant_read_data(history_handler)
+        artifacts_bucket.grant_read(history_handler, "geo/*")
 
         # Textract handler
         textract_handler = lambda_.Function(
@@ -162,7 +238,10 @@ class PrenLiteStack(Stack):
             log_retention=logs.RetentionDays.ONE_WEEK,
             environment={
                 "RAW_BUCKET": raw_bucket.bucket_name,
-                "SIGNALS_TABLE": signals_table.table_name
+                "SIGNALS_TABLE": signals_table.table_name,
+                "RATE_LIMIT_TABLE": cache_table.table_name,
+                "TEXTRACT_MAX_RPS": "2",
+                "RELEVANCE_TOKEN_BUDGET": "1200"
             }
         )
 
@@ -180,6 +259,7 @@ class PrenLiteStack(Stack):
         )
         raw_bucket.grant_read(textract_handler)
         signals_table.grant_write_data(textract_handler)
+        cache_table.grant_read_write_data(textract_handler)
 
         # 4) API Gateway HTTP API
         http_api = apigwv2.HttpApi(
@@ -211,6 +291,18 @@ class PrenLiteStack(Stack):
             integration=explain_integration
         )
 
+        # History integration
+        history_integration = apigwv2_integrations.HttpLambdaIntegration(
+            "HistoryIntegration",
+            history_handler
+        )
+
+        http_api.add_routes(
+            path="/history",
+            methods=[apigwv2.HttpMethod.GET],
+            integration=history_integration
+        )
+
         # Health integration
         health_integration = apigwv2_integrations.HttpLambdaIntegration(
             "HealthIntegration",
@@ -258,14 +350,20 @@ class PrenLiteStack(Stack):
             log_retention=logs.RetentionDays.ONE_WEEK,
             environment={
                 "SIGNALS_TABLE": signals_table.table_name,
-                "BEDROCK_MODEL_ID": "eu.amazon.nova-micro-v1:0"
+                "BEDROCK_MODEL_ID": "eu.amazon.nova-micro-v1:0",
+                "ARTIFACTS_BUCKET": artifacts_bucket.bucket_name,
+                "BEDROCK_CACHE_TABLE": cache_table.table_name,
+                "BEDROCK_CACHE_TTL_DAYS": "30",
+                "RATE_LIMIT_TABLE": cache_table.table_name,
+                "BEDROCK_MAX_RPS": "5",
+                "RELEVANCE_TOKEN_BUDGET": "1200"
             }
         )
 
         # Permissions Bedrock
         bedrock_handler.add_to_role_policy(
             iam.PolicyStatement(
-                actions=["bedrock:InvokeModel"],
+                actions=["bedrock:InvokeModel", "bedrock:InvokeModelWithResponseStream"],
                 resources=[
                     f"arn:aws:bedrock:eu-west-3::foundation-model/amazon.nova-micro-v1:0",
                     f"arn:aws:bedrock:*::foundation-model/amazon.nova-micro-v1:0",
@@ -274,8 +372,20 @@ class PrenLiteStack(Stack):
             )
         )
         signals_table.grant_write_data(bedrock_handler)
+        cache_table.grant_read_write_data(bedrock_handler)
+        artifacts_bucket.grant_read(bedrock_handler, "geo/*")
 
         # 6) Step Functions State Machine — Pipeline réel Textract → Bedrock
+        # Étape 0 : horodatage de l'exécution (queue wait + run_id de la trace par document)
+        stamp_state = sfn.Pass(
+            self, "StampExecution",
+            parameters={
+                "start.$": "$$.Execution.StartTime",
+                "name.$": "$$.Execution.Name"
+            },
+            result_path="$.execution"
+        )
+
         # Étape 1 : extraction Textract
         textract_task = tasks.LambdaInvoke(
             self, "ExtractText",
@@ -293,8 +403,8 @@ class PrenLiteStack(Stack):
         # Étape 3 : succès
         success_state = sfn.Succeed(self, "IngestionComplete")
 
-        # Workflow : Textract → Bedrock → Success
-        definition = textract_task.next(bedrock_task).next(success_state)
+        # Workflow : Stamp → Textract → Bedrock → Success
+        definition = stamp_state.next(textract_task).next(bedrock_task).next(success_state)
 
         state_machine = sfn.StateMachine(
             self, "PrenIngestionStateMachine",
@@ -311,7 +421,366 @@ class PrenLiteStack(Stack):
             )
         )
 
-        # 7) CDK Outputs
+        # 7) Scoring batch — numpy via une layer construite au synth (pip dans l'image Lambda)
+        numpy_layer = lambda_.LayerVersion(
+            self, "NumpyLayer",
+            code=lambda_.Code.from_asset(
+                "infra/layers/numpy",
+                bundling=BundlingOptions(
+                    image=lambda_.Runtime.PYTHON_3_11.bundling_image,
+                    command=["bash", "-c", "pip install -r requirements.txt -t /asset-output/python"]
+                )
+            ),
+            compatible_runtimes=[lambda_.Runtime.PYTHON_3_11]
+        )
+
+        scoring_handler = lambda_.Function(
+            self, "ScoringHandler",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="scoring_handler.handler",
+            code=lambda_.Code.from_asset("infra/lambda"),
+            layers=[numpy_layer],
+            timeout=Duration.minutes(5),
+            memory_size=1024,
+            log_retention=logs.RetentionDays.ONE_WEEK,
+            environment={
+                "ARTIFACTS_BUCKET": artifacts_bucket.bucket_name,
+                "SIGNALS_TABLE": signals_table.table_name,
+                "SCORES_TABLE": scores_table.table_name
+            }
+        )
+        artifacts_bucket.grant_read(scoring_handler, "geo/*")
+        # Modèle de mailles de chaque version (geo/<city>/cell_model/<version>.bin, lu par /score)
+        artifacts_bucket.grant_put(scoring_handler, "geo/*")
+        signals_table.grant_read_data(scoring_handler)
+        scores_table.grant_write_data(scoring_handler)
+
+        # Publication atomique : une écriture conditionnelle du pointeur de version, puis
+        # historique par IRIS (history.py) et diff des snapshots (numpy) pour le flux
+        # /changes (infra/lambda/changes.py)
+        publish_handler = lambda_.Function(
+            self, "PublishHandler",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="publish_handler.handler",
+            code=lambda_.Code.from_asset("infra/lambda"),
+            layers=[numpy_layer],
+            timeout=Duration.minutes(5),
+            memory_size=512,
+            log_retention=logs.RetentionDays.ONE_WEEK,
+            environment={
+                "SCORES_TABLE": scores_table.table_name,
+                "CHANGE_MIN_DELTA": "0.01",
+                "CHANGE_EVENT_DELTA": "0.1"
+            }
+        )
+        scores_table.grant_read_write_data(publish_handler)
+        # Snapshots geo/<city>/snapshots/ lus, diffs geo/<city>/changes/ écrits
+        artifacts_bucket.grant_read(publish_handler, "geo/*")
+        artifacts_bucket.grant_put(publish_handler, "geo/*")
+
+        # Événements de seuil (momentum Low->High, score +/- 0.1) : opt-in
+        # (cdk deploy -c change_events=true), une file SQS que les clients consomment
+        if self.node.try_get_context("change_events") in (True, "true"):
+            change_events_queue = sqs.Queue(
+                self, "ChangeEventsQueue",
+                retention_period=Duration.days(4),
+                encryption=sqs.QueueEncryption.SQS_MANAGED
+            )
+            publish_handler.add_environment("CHANGES_QUEUE_URL", change_events_queue.queue_url)
+            change_events_queue.grant_send_messages(publish_handler)
+            CfnOutput(
+                self, "ChangeEventsQueueUrl",
+                value=change_events_queue.queue_url,
+                description="SQS queue for score threshold-crossing events"
+            )
+
+        # Changes handler (GET /changes?since=<version>, pages de diffs publiés)
+        changes_handler = lambda_.Function(
+            self, "ChangesHandler",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="changes_handler.handler",
+            code=lambda_.Code.from_asset("infra/lambda"),
+            log_retention=logs.RetentionDays.ONE_WEEK,
+            environment={
+                "SCORES_TABLE": scores_table.table_name,
+                "CHANGES_PAGE_SIZE": "500"
+            }
+        )
+        scores_table.grant_read_data(changes_handler)
+        artifacts_bucket.grant_read(changes_handler, "geo/*")
+
+        score_all_task = tasks.LambdaInvoke(
+            self, "ScoreAllIris",
+            lambda_function=scoring_handler,
+            output_path="$.Payload"
+        )
+
+        publish_task = tasks.LambdaInvoke(
+            self, "PublishScores",
+            lambda_function=publish_handler,
+            output_path="$.Payload"
+        )
+
+        scoring_state_machine = sfn.StateMachine(
+            self, "PrenScoringStateMachine",
+            state_machine_name="PrenScoringStateMachine",
+            definition_body=sfn.DefinitionBody.from_chainable(
+                score_all_task.next(publish_task).next(sfn.Succeed(self, "ScoringComplete"))
+            ),
+            timeout=Duration.minutes(15)
+        )
+
+        # Scoring de portefeuille (infra/lambda/portfolio.py) : CSV id,lat,lng -> résultat
+        # sous jobs/<job_id>/ ; l'étape rend la main avant son timeout et boucle via Choice
+        portfolio_handler = lambda_.Function(
+            self, "PortfolioHandler",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="portfolio_handler.handler",
+            code=lambda_.Code.from_asset("infra/lambda"),
+            layers=[numpy_layer],
+            timeout=Duration.minutes(15),
+            memory_size=1024,
+            log_retention=logs.RetentionDays.ONE_WEEK,
+            environment={
+                "JOBS_TABLE": jobs_table.table_name,
+                "SCORES_TABLE": scores_table.table_name,
+                "RAW_BUCKET": raw_bucket.bucket_name,
+                "PORTFOLIO_CHUNK_BYTES": str(1 << 20),
+                "PORTFOLIO_PART_BYTES": str(8 << 20),
+                "PORTFOLIO_YIELD_MARGIN_SECONDS": "60"
+            }
+        )
+        raw_bucket.grant_read(portfolio_handler, "portfolios/*")
+        artifacts_bucket.grant_read(portfolio_handler, "geo/*")
+        artifacts_bucket.grant_put(portfolio_handler, "jobs/*")
+        scores_table.grant_read_data(portfolio_handler)
+        jobs_table.grant_read_write_data(portfolio_handler)
+
+        portfolio_task = tasks.LambdaInvoke(
+            self, "ScorePortfolioChunk",
+            lambda_function=portfolio_handler,
+            output_path="$.Payload"
+        )
+        portfolio_failed = sfn.Fail(self, "PortfolioFailed", error="PortfolioJobFailed")
+        # Timeout, OOM ou erreur du runtime : le handler n'a pas pu marquer le job ; l'étape
+        # d'échec le rappelle avec l'erreur (job failed, multipart upload abandonné)
+        abort_task = tasks.LambdaInvoke(
+            self, "AbortPortfolioJob",
+            lambda_function=portfolio_handler,
+            output_path="$.Payload"
+        )
+        abort_task.next(portfolio_failed)
+        portfolio_task.add_catch(abort_task, errors=["States.ALL"], result_path="$.error")
+        portfolio_task.next(
+            sfn.Choice(self, "PortfolioDone?")
+            .when(sfn.Condition.string_equals("$.status", "running"), portfolio_task)
+            .when(sfn.Condition.string_equals("$.status", "succeeded"), sfn.Succeed(self, "PortfolioComplete"))
+            .otherwise(portfolio_failed)
+        )
+
+        portfolio_state_machine = sfn.StateMachine(
+            self, "PrenPortfolioStateMachine",
+            state_machine_name="PrenPortfolioStateMachine",
+            definition_body=sfn.DefinitionBody.from_chainable(portfolio_task),
+            timeout=Duration.hours(2)
+        )
+
+        jobs_handler = lambda_.Function(
+            self, "JobsHandler",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="jobs_handler.handler",
+            code=lambda_.Code.from_asset("infra/lambda"),
+            log_retention=logs.RetentionDays.ONE_WEEK,
+            environment={
+                "JOBS_TABLE": jobs_table.table_name,
+                "RAW_BUCKET": raw_bucket.bucket_name,
+                "PORTFOLIO_STATE_MACHINE_ARN": portfolio_state_machine.state_machine_arn
+            }
+        )
+        portfolio_state_machine.grant_start_execution(jobs_handler)
+        raw_bucket.grant_read(jobs_handler, "portfolios/*")
+        raw_bucket.grant_put(jobs_handler, "portfolios/*")
+        artifacts_bucket.grant_read(jobs_handler, "jobs/*")
+        jobs_table.grant_read_write_data(jobs_handler)
+
+        jobs_integration = apigwv2_integrations.HttpLambdaIntegration(
+            "JobsIntegration",
+            jobs_handler
+        )
+
+        http_api.add_routes(
+            path="/jobs",
+            methods=[apigwv2.HttpMethod.POST],
+            integration=jobs_integration
+        )
+
+        http_api.add_routes(
+            path="/jobs/uploads",
+            methods=[apigwv2.HttpMethod.POST],
+            integration=jobs_integration
+        )
+
+        http_api.add_routes(
+            path="/jobs/{job_id}",
+            methods=[apigwv2.HttpMethod.GET],
+            integration=jobs_integration
+        )
+
+        # Changes integration
+        changes_integration = apigwv2_integrations.HttpLambdaIntegration(
+            "ChangesIntegration",
+            changes_handler
+        )
+
+        http_api.add_routes(
+            path="/changes",
+            methods=[apigwv2.HttpMethod.GET],
+            integration=changes_integration
+        )
+
+        # Profilage opt-in (infra/lambda/profiling.py) : activer PROFILE_ENABLED=1 ou
+        # PROFILE_SAMPLE_RATE sur une fonction ; les profils vont sous profiles/ de l'ArtifactsBucket
+        for fn in (ingest_handler, score_handler, explain_handler, health_handler,
+                   textract_handler, bedrock_handler, scoring_handler, publish_handler,
+                   portfolio_handler, jobs_handler, history_handler, changes_handler):
+            fn.add_environment("ARTIFACTS_BUCKET", artifacts_bucket.bucket_name)
+            artifacts_bucket.grant_put(fn, "profiles/*")
+            # Journal de requête (infra/lambda/reqlog.py) : 1 % des requêtes en détail,
+            # erreurs et requêtes lentes toujours
+            fn.add_environment("LOG_SAMPLE_RATE", "0.01")
+            fn.add_environment("LOG_SLOW_MS", "500")
+
+        # Compression des réponses HTTP (infra/lambda/compression.py) : gzip / deflate
+        # négociés sur Accept-Encoding au-delà de COMPRESS_MIN_BYTES
+        for fn in (score_handler, explain_handler, health_handler, jobs_handler, history_handler,
+                   changes_handler):
+            fn.add_environment("COMPRESS_MIN_BYTES", "1024")
+            fn.add_environment("COMPRESS_LEVEL", "6")
+
+        # Warm-up au cold start (infra/lambda/warmup.py) : index IRIS et pointeur de version
+        # des villes WARMUP_CITIES chargés en arrière-plan dès l'import. Pings planifiés
+        # opt-in (cdk deploy -c warm_ping=true) pour garder un conteneur chaud par fonction
+        warm_ping_rule = events.Rule(
+            self, "WarmPingRule",
+            schedule=events.Schedule.rate(Duration.minutes(5)),
+            enabled=self.node.try_get_context("warm_ping") in (True, "true")
+        )
+        for fn in (score_handler, explain_handler):
+            fn.add_environment("WARMUP_CITIES", "paris")
+            warm_ping_rule.add_target(
+                events_targets.LambdaFunction(fn, event=events.RuleTargetInput.from_object({"warmup": True}))
+            )
+
+        # 8) Dashboard + alarmes p99 sur les métriques EMF émises par infra/lambda/metrics.py
+        def pren_metric(name, service, statistic="p99"):
+            return cloudwatch.Metric(
+                namespace="PREN",
+                metric_name=name,
+                dimensions_map={"Service": service},
+                statistic=statistic,
+                period=Duration.minutes(5)
+            )
+
+        api_services = ["score", "explain", "health", "history", "changes"]
+        pipeline_stages = [
+            ("textract", "TextractLatency"),
+            ("textract", "PypdfLatency"),
+            ("bedrock", "BedrockLatency"),
+            ("bedrock", "DynamoDBWriteLatency"),
+            ("score", "DynamoDBReadLatency"),
+            ("score", "CellModelScoreLatency"),
+            ("explain", "DynamoDBReadLatency"),
+            ("explain", "EvidenceQueryLatency"),
+            ("history", "HistoryReadLatency"),
+            ("scoring", "HistoryWriteLatency"),
+            ("publish", "ChangesDiffLatency"),
+            ("changes", "ChangesReadLatency"),
+        ]
+
+        dashboard = cloudwatch.Dashboard(
+            self, "PrenDashboard",
+            dashboard_name="PREN-Lite"
+        )
+        dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="API latency p50 / p99 (ms)",
+                left=[pren_metric("Latency", svc, stat) for svc in api_services for stat in ("p50", "p99")],
+                width=12
+            ),
+            cloudwatch.GraphWidget(
+                title="Stage latency p99 (ms)",
+                left=[pren_metric(name, svc).with_(label=f"{svc} {name}") for svc, name in pipeline_stages],
+                width=12
+            )
+        )
+        dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Cold starts",
+                left=[pren_metric("ColdStart", svc, "Sum") for svc in api_services + ["textract", "bedrock"]],
+                right=[pren_metric("WarmupWait", svc).with_(label=f"{svc} warm-up wait") for svc in ("score", "explain")],
+                width=8
+            ),
+            cloudwatch.GraphWidget(
+                title="Bedrock tokens / cache",
+                left=[pren_metric("TokensIn", "bedrock", "Sum"), pren_metric("TokensOut", "bedrock", "Sum")],
+                right=[pren_metric("BedrockCacheHit", "bedrock", "Sum"), pren_metric("BedrockCacheMiss", "bedrock", "Sum")],
+                width=8
+            ),
+            cloudwatch.GraphWidget(
+                title="Pages extracted / signals stored",
+                left=[pren_metric("PagesExtracted", "textract", "Sum"), pren_metric("SignalsStored", "bedrock", "Sum")],
+                width=8
+            )
+        )
+        dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Rate limiter (Bedrock / Textract)",
+                left=[pren_metric("RateLimitWait", svc).with_(label=f"{svc} wait") for svc in ("bedrock", "textract")],
+                right=[pren_metric("ThrottleRetry", svc, "Sum").with_(label=f"{svc} throttles")
+                       for svc in ("bedrock", "textract")],
+                width=12
+            ),
+            cloudwatch.GraphWidget(
+                title="Bedrock stream: first signal / aborts",
+                left=[pren_metric("BedrockFirstSignalMs", "bedrock"), pren_metric("BedrockLatency", "bedrock")],
+                right=[pren_metric("BedrockStreamAbort", "bedrock", "Sum")],
+                width=12
+            )
+        )
+        dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="API response bytes (before / after compression)",
+                left=[pren_metric(name, svc, "Sum").with_(label=f"{svc} {name}")
+                      for svc in api_services for name in ("ResponseBytes", "ResponseBytesSent")],
+                width=24
+            )
+        )
+        dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Portfolio jobs: rows/s and rows scored",
+                left=[pren_metric("PortfolioRowsPerSecond", "portfolio", "Average")],
+                right=[pren_metric("PortfolioRows", "portfolio", "Sum"),
+                       pren_metric("PortfolioJobsSubmitted", "jobs", "Sum")],
+                width=12
+            ),
+            cloudwatch.GraphWidget(
+                title="Portfolio chunk latency p50 / p99 (ms)",
+                left=[pren_metric("PortfolioChunkLatency", "portfolio", stat) for stat in ("p50", "p99")],
+                width=12
+            )
+        )
+
+        for svc, threshold_ms in (("score", 1000), ("explain", 1500), ("health", 1000)):
+            cloudwatch.Alarm(
+                self, f"{svc.capitalize()}P99LatencyAlarm",
+                metric=pren_metric("Latency", svc),
+                threshold=threshold_ms,
+                evaluation_periods=3,
+                datapoints_to_alarm=2,
+                treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING
+            )
+
+        # 9) CDK Outputs
         CfnOutput(
             self, "RawBucketName",
             value=raw_bucket.bucket_name,
@@ -360,6 +829,12 @@ class PrenLiteStack(Stack):
             description="CloudWatch Alarm name for API 5XX errors"
         )
 
+        CfnOutput(
+            self, "DashboardName",
+            value=dashboard.dashboard_name,
+            description="CloudWatch dashboard (EMF latency / throughput metrics)"
+        )
+
         CfnOutput(
             self, "TextractHandlerName",
             value=textract_handler.function_name,
@@ -371,3 +846,27 @@ class PrenLiteStack(Stack):
             value=bedrock_handler.function_name,
             description="Bedrock Lambda function name"
         )
+
+        CfnOutput(
+            self, "PublishHandlerName",
+            value=publish_handler.function_name,
+            description="Score version publish/rollback Lambda function name"
+        )
+
+        CfnOutput(
+            self, "JobsTableName",
+            value=jobs_table.table_name,
+            description="DynamoDB portfolio jobs table"
+        )
+
+        CfnOutput(
+            self, "PortfolioStateMachineArn",
+            value=portfolio_state_machine.state_machine_arn,
+            description="Step Functions portfolio scoring ARN"
+        )
+
+        CfnOutput(
+            self, "ScoringStateMachineArn",
+            value=scoring_state_machine.state_machine_arn,
+            description="Step Functions scoring batch ARN"
+        )
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Modules des Lambdas importés à plat, comme dans le runtime (infra/lambda à la racine),
+# et fakes AWS de tools/fakes.py
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+for _path in (os.path.join(ROOT, "infra", "lambda"), os.path.join(ROOT, "tools")):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
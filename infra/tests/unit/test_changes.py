@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import changes
+from fakes import FakeAWS, FakeDynamoResource, FakeS3
+
+BUCKET = "artifacts"
+CITY = "paris"
+V0, V1, V2, V3, V4 = ("20251231T020000Z", "20260101T020000Z", "20260102T020000Z", "20260103T020000Z",
+                      "20260104T020000Z")
+
+
+class _Clock(datetime):
+    """datetime.now figé : une séquence de publication par entrée du flux."""
+    current = None
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    monkeypatch.setattr(changes, "datetime", _Clock)
+    changes._artifacts.clear()
+    aws = FakeAWS()
+    table = FakeDynamoResource(aws).create_table("PrenScoresTable", "iris_id", "version")
+    return table, FakeS3(aws)
+
+
+def _snapshot(rows):
+    """rows : (iris_id, score, momentum) ; relu par load_snapshot (colonnes triées par iris_id)."""
+    s3 = FakeS3(FakeAWS())
+    items = [{"iris_id": i, "future_value_score": s, "confidence": 0.5, "momentum": m} for i, s, m in rows]
+    s3.put_object(Bucket=BUCKET, Key=changes.snapshot_key(CITY, V1), Body=changes.snapshot_bytes(items))
+    return changes.load_snapshot(s3, BUCKET, CITY, V1)
+
+
+def _publish(table, s3, hours, from_version, to_version, rows):
+    _Clock.current = datetime(2026, 1, 5, tzinfo=timezone.utc) + timedelta(hours=hours)
+    return changes.record(table, s3, BUCKET, CITY, from_version, to_version, rows)
+
+
+def _rows(prefix, n):
+    return [{"iris_id": f"{prefix}{k:02d}", "change": "added", "future_value_score": 0.5} for k in range(n)]
+
+
+def test_diff_added_removed_updated():
+    old = _snapshot([("A", 0.5, "Low"), ("B", 0.5, "Low"), ("C", 0.5, "Low"), ("D", 0.5, "Low"), ("F", 0.5, "High")])
+    new = _snapshot([("B", 0.62, "Low"), ("C", 0.505, "Low"), ("D", 0.5, "High"), ("E", 0.3, "Medium"),
+                     ("F", 0.5, "High")])
+    rows = {r["iris_id"]: r for r in changes.diff(old, new, min_delta=0.01)}
+    assert sorted(rows) == ["A", "B", "D", "E"]   # C : déplacement sous le seuil, F : inchangé
+    assert rows["A"]["change"] == "removed" and rows["A"]["previous_score"] == 0.5
+    assert rows["B"]["change"] == "updated" and rows["B"]["delta"] == pytest.approx(0.12)
+    assert (rows["D"]["previous_momentum"], rows["D"]["momentum"]) == ("Low", "High")
+    assert rows["E"] == {"iris_id": "E", "change": "added", "future_value_score": 0.3, "momentum": "Medium",
+                         "confidence": 0.5}
+    assert [r["iris_id"] for r in changes.diff(old, new)] == ["A", "B", "D", "E"]   # triées
+
+
+def test_diff_from_empty_snapshot():
+    new = _snapshot([("B", 0.6, "Low"), ("A", 0.4, "High")])
+    rows = changes.diff(changes.empty_snapshot(), new)
+    assert [(r["iris_id"], r["change"]) for r in rows] == [("A", "added"), ("B", "added")]
+    assert changes.diff(new, changes.empty_snapshot())[0]["change"] == "removed"
+    assert changes.diff(changes.empty_snapshot(), changes.empty_snapshot()) == []
+
+
+def _all_pages(table, s3, since, limit):
+    pages, token = [], None
+    while True:
+        page = changes.read_page(table, s3, BUCKET, CITY, since, token, limit)
+        pages.append(page)
+        token = page["next_token"]
+        if token is None:
+            return pages
+
+
+def test_page_boundary_inside_an_entry(feed):
+    table, s3 = feed
+    first, second = _rows("a", 5), _rows("b", 3)
+    _publish(table, s3, 1, V0, V1, first)
+    _publish(table, s3, 2, V1, V2, second)
+    pages = _all_pages(table, s3, V0, 3)
+    assert [len(p["changes"]) for p in pages] == [3, 3, 2]
+    assert [p["to_version"] for p in pages] == [None, None, V2]
+    ids = [c["iris_id"] for p in pages for c in p["changes"]]
+    assert ids == [r["iris_id"] for r in first + second]
+    assert pages[1]["changes"][1]["to_version"] == V1 and pages[1]["changes"][2]["to_version"] == V2
+
+
+def test_page_ending_exactly_at_entry_end(feed):
+    table, s3 = feed
+    _publish(table, s3, 1, V0, V1, _rows("a", 5))
+    _publish(table, s3, 2, V1, V2, _rows("b", 3))
+    pages = _all_pages(table, s3, V0, 5)
+    assert [len(p["changes"]) for p in pages] == [5, 3]
+    assert changes.decode_token(pages[0]["next_token"])[1] == 0
+    # Dernière entrée consommée pile : pas de page vide en plus
+    pages = _all_pages(table, s3, V0, 8)
+    assert [len(p["changes"]) for p in pages] == [8]
+    assert pages[0]["to_version"] == V2
+
+
+def test_since_current_version_is_empty(feed):
+    table, s3 = feed
+    _publish(table, s3, 1, None, V1, _rows("a", 2))
+    page = changes.read_page(table, s3, BUCKET, CITY, V1)
+    assert page == {"changes": [], "next_token": None, "to_version": V1}
+
+
+def test_since_after_rollback_resumes_at_last_occurrence(feed):
+    table, s3 = feed
+    _publish(table, s3, 1, None, V1, _rows("a", 2))
+    _publish(table, s3, 2, V1, V2, _rows("b", 2))
+    _publish(table, s3, 3, V2, V3, _rows("c", 2))
+    _publish(table, s3, 4, V3, V2, _rows("r", 2))   # rollback : V2 revient dans le flux
+    _publish(table, s3, 5, V2, V4, _rows("d", 2))
+    # Client synchronisé sur V2 après le rollback : seul V2 -> V4 lui manque
+    ids = [c["iris_id"] for p in _all_pages(table, s3, V2, 3) for c in p["changes"]]
+    assert ids == ["d00", "d01"]
+    # Client resté sur V3 : le rollback puis V4
+    ids = [c["iris_id"] for p in _all_pages(table, s3, V3, 3) for c in p["changes"]]
+    assert ids == ["r00", "r01", "d00", "d01"]
+
+
+def test_invalid_token(feed):
+    table, s3 = feed
+    with pytest.raises(ValueError):
+        changes.read_page(table, s3, BUCKET, CITY, V1, "not-a-token")
+
+
+def test_invalid_since(feed):
+    table, s3 = feed
+    _publish(table, s3, 1, V0, V1, _rows("a", 2))
+    for bad in ("", "garbage", "2026-01-01", "20260101"):
+        with pytest.raises(ValueError):
+            changes.read_page(table, s3, BUCKET, CITY, bad)
+
+
+def test_unknown_since_inside_the_feed(feed):
+    table, s3 = feed
+    _publish(table, s3, 1, V0, V1, _rows("a", 2))
+    _publish(table, s3, 2, V1, V3, _rows("b", 2))
+    # V2 stagée mais jamais publiée, ou version postérieure au flux : 400, pas une page vide
+    for unknown in (V2, "20260201T020000Z"):
+        with pytest.raises(ValueError, match="Unknown score version"):
+            changes.read_page(table, s3, BUCKET, CITY, unknown)
+
+
+def test_since_before_the_feed_requires_resync(feed):
+    table, s3 = feed
+    with pytest.raises(changes.ResyncRequired):
+        changes.read_page(table, s3, BUCKET, CITY, V1)   # flux vide
+    _publish(table, s3, 1, None, V1, _rows("a", 2))
+    _publish(table, s3, 2, V1, V2, _rows("b", 2))
+    with pytest.raises(changes.ResyncRequired):
+        changes.read_page(table, s3, BUCKET, CITY, V0)
+    assert [c["iris_id"] for c in changes.read_page(table, s3, BUCKET, CITY, V1)["changes"]] == ["b00", "b01"]
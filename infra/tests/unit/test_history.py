@@ -0,0 +1,113 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import history
+from fakes import FakeAWS, FakeDynamoResource
+
+DAY = 86400
+T0 = int(datetime(2026, 1, 1, 2, tzinfo=timezone.utc).timestamp())
+
+
+def _scores_table():
+    dynamodb = FakeDynamoResource(FakeAWS())
+    return dynamodb, dynamodb.create_table("PrenScoresTable", "iris_id", "version")
+
+
+def _items(score, confidence=0.6, momentum="Medium"):
+    return [{"iris_id": "751010101", "future_value_score": score, "confidence": confidence, "momentum": momentum}]
+
+
+def test_round_trip_with_negative_deltas():
+    points = [
+        (T0, 50, 60, 1),
+        (T0 + DAY, 12, 61, 0),          # score -38
+        (T0 + 2 * DAY, 100, 5, 2),      # confiance -56
+        (T0 + 2 * DAY + 1, 0, 0, 0),    # 1 s plus tard, tout à zéro
+        (T0 + 400 * DAY, 99, 100, 2),   # grand delta de temps (varint multi-octets)
+    ]
+    assert history.decode(history.encode(points)) == points
+
+
+def test_incremental_append_matches_full_encode():
+    points = [(T0 + k * DAY, (k * 37) % 101, 100 - k, k % 3) for k in range(50)]
+    blob, prev = bytes([history.FORMAT_VERSION]), None
+    for point in points:
+        blob += history.encode_point(prev, point)
+        prev = point
+    assert blob == history.encode(points)
+
+
+def test_decode_empty_and_unknown_format():
+    assert history.decode(b"") == []
+    with pytest.raises(ValueError):
+        history.decode(bytes([history.FORMAT_VERSION + 1, 0, 0, 0]))
+
+
+def test_append_run_replay_adds_nothing():
+    dynamodb, table = _scores_table()
+    assert history.append_run(dynamodb, table, "20260101T020000Z", _items(0.5), "paris") == 1
+    assert history.append_run(dynamodb, table, "20260102T020000Z", _items(0.42, 0.7, "Low"), "paris") == 1
+    # Même version rejouée (avec ou sans horodatage de publication) : rien n'est ajouté
+    assert history.append_run(dynamodb, table, "20260102T020000Z", _items(0.9), "paris") == 0
+    assert history.append_run(dynamodb, table, "20260102T020000Z", _items(0.9), "paris", T0 + 2 * DAY) == 0
+    # Version plus ancienne sans horodatage de publication : rien non plus
+    assert history.append_run(dynamodb, table, "20260101T020000Z", _items(0.9), "paris") == 0
+    points = history.get_series(table, "751010101")
+    assert points == [(T0, 50, 60, 1), (T0 + DAY, 42, 70, 0)]
+    item = table.get_item(Key={"iris_id": "751010101", "version": history.HISTORY_SK})["Item"]
+    assert item["points"] == 2 and "restored" not in item
+
+
+def test_append_run_rollback_restores_older_version():
+    dynamodb, table = _scores_table()
+    history.append_run(dynamodb, table, "20260101T020000Z", _items(0.5), "paris")
+    history.append_run(dynamodb, table, "20260102T020000Z", _items(0.42, 0.7, "Low"), "paris")
+    # Rollback vers la version du 1er, republiée le 3 à 10 h : point horodaté à la republication
+    rolled_back_at = T0 + 2 * DAY + 8 * 3600
+    assert history.append_run(dynamodb, table, "20260101T020000Z", _items(0.5), "paris", rolled_back_at) == 1
+    # Rejeu du rollback : rien
+    assert history.append_run(dynamodb, table, "20260101T020000Z", _items(0.5), "paris", rolled_back_at + 60) == 0
+    points, restored = history.read(table, "751010101")
+    assert points == [(T0, 50, 60, 1), (T0 + DAY, 42, 70, 0), (rolled_back_at, 50, 60, 1)]
+    assert restored == {str(rolled_back_at): "20260101T020000Z"}
+    # as_of : version active à chaque instant
+    assert history.version_of(history.at(points, T0 + 2 * DAY), restored) == "20260102T020000Z"
+    now = history.to_json(history.at(points, T0 + 3 * DAY), restored)
+    assert (now["score_version"], now["future_value_score"]) == ("20260101T020000Z", 0.5)
+    assert now["scored_at"] == "2026-01-03T10:00:00+00:00"
+    # Run suivant, plus récent que le rollback : point normal, la note du rollback est conservée
+    assert history.append_run(dynamodb, table, "20260104T020000Z", _items(0.6), "paris", T0 + 3 * DAY + 60) == 1
+    points, restored = history.read(table, "751010101")
+    assert [history.version_of(p, restored) for p in points] == [
+        "20260101T020000Z", "20260102T020000Z", "20260101T020000Z", "20260104T020000Z"]
+
+
+def test_append_run_rejects_non_timestamp_version():
+    dynamodb, table = _scores_table()
+    with pytest.raises(ValueError):
+        history.append_run(dynamodb, table, "v2", _items(0.5))
+
+
+def test_at():
+    points = [(T0, 50, 60, 1), (T0 + DAY, 42, 70, 0), (T0 + 3 * DAY, 45, 70, 0)]
+    assert history.at(points, T0 - 1) is None
+    assert history.at([], T0) is None
+    assert history.at(points, T0) == points[0]
+    assert history.at(points, T0 + DAY - 1) == points[0]
+    assert history.at(points, T0 + 2 * DAY) == points[1]
+    assert history.at(points, T0 + 10 * DAY) == points[2]
+
+
+def test_parse_as_of():
+    day_start = int(datetime(2026, 1, 5, tzinfo=timezone.utc).timestamp())
+    assert history.parse_as_of("20260105T020000Z") == day_start + 2 * 3600
+    assert history.parse_as_of("2026-01-05") == day_start + 86399
+    assert history.parse_as_of("2026-01-05", end_of_day=False) == day_start
+    assert history.parse_as_of("20260105") == day_start + 86399
+    assert history.parse_as_of("2026-01-05T10:00:00Z") == day_start + 10 * 3600
+    assert history.parse_as_of("2026-01-05T10:00:00") == day_start + 10 * 3600   # sans fuseau : UTC
+    assert history.parse_as_of("2026-01-05T12:00:00+02:00") == day_start + 10 * 3600
+    for bad in ("", "yesterday", "2026-13-01", "2026-01-05T25:00"):
+        with pytest.raises(ValueError):
+            history.parse_as_of(bad)
@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+from nova_stream import SignalStream, StreamInvalid
+
+SIGNAL_A = {"type": "permit", "description": "Permis de construire {R+5} délivré", "impact": "positive",
+            "confidence": 0.8, "location_hint": "rue de Rivoli", "evidence_span": "PC 075 101"}
+SIGNAL_B = {"type": "zoning", "description": 'Zone "UG" étendue \\ secteur [nord]', "impact": "negative",
+            "confidence": 0.4, "location_hint": "", "evidence_span": "art. UG.1"}
+DOC = {"signals": [SIGNAL_A, SIGNAL_B], "summary": "Deux signaux", "signal_count": 2}
+
+
+def _feed_all(stream, text, size):
+    emitted = []
+    for start in range(0, len(text), size):
+        emitted.extend(stream.feed(text[start:start + size]))
+    return emitted
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10_000])
+def test_chunk_boundaries(size):
+    text = json.dumps(DOC, ensure_ascii=False)
+    stream = SignalStream()
+    emitted = _feed_all(stream, text, size)
+    assert [s["description"] for s in emitted] == [SIGNAL_A["description"], SIGNAL_B["description"]]
+    doc = stream.result()
+    assert doc["summary"] == "Deux signaux"
+    assert doc["signals"] == emitted
+
+
+def test_signal_emitted_as_soon_as_its_object_closes():
+    text = json.dumps(DOC)
+    end_of_first = text.index('"}') + 2
+    stream = SignalStream()
+    assert [s["type"] for s in stream.feed(text[:end_of_first])] == ["permit"]
+    assert [s["type"] for s in stream.feed(text[end_of_first:])] == ["zoning"]
+
+
+@pytest.mark.parametrize("size", [1, 5])
+def test_escaped_quotes_and_braces_inside_strings(size):
+    tricky = {"type": "permit", "description": 'a \\"} ]{ [ "quoted" \\\\', "evidence_span": "x"}
+    text = json.dumps({"signals": [tricky], "summary": "}]\"{"})
+    stream = SignalStream()
+    emitted = _feed_all(stream, text, size)
+    assert [s["description"] for s in emitted] == [tricky["description"]]
+    assert stream.result()["summary"] == "}]\"{"
+
+
+def test_fenced_json_block():
+    text = "```json\n" + json.dumps(DOC) + "\n```\n"
+    stream = SignalStream()
+    emitted = _feed_all(stream, text, 5)
+    assert len(emitted) == 2
+    assert stream.result()["signal_count"] == 2
+
+
+def test_fence_split_across_chunks():
+    stream = SignalStream()
+    assert stream.feed("``") == []
+    assert stream.feed("`json") == []
+    assert len(stream.feed("\n" + json.dumps(DOC) + "\n```")) == 2
+
+
+def test_prose_preamble_raises():
+    stream = SignalStream()
+    with pytest.raises(StreamInvalid):
+        stream.feed("Voici les signaux extraits : ")
+
+
+@pytest.mark.parametrize("element", ['"texte"', "42", "true", "null", "[1, 2]"])
+def test_non_object_signal_element_raises(element):
+    text = '{"signals": [' + json.dumps(SIGNAL_A) + ", " + element + "]}"
+    stream = SignalStream()
+    with pytest.raises(StreamInvalid):
+        _feed_all(stream, text, 4)
+
+
+def test_unusable_object_is_counted_not_emitted():
+    text = json.dumps({"signals": [{"type": "permit"}, SIGNAL_A]})
+    stream = SignalStream()
+    assert len(_feed_all(stream, text, 3)) == 1
+    assert stream.rejected == 1
+
+
+def test_text_after_root_object_raises():
+    stream = SignalStream()
+    stream.feed(json.dumps(DOC))
+    with pytest.raises(StreamInvalid):
+        stream.feed("\nJ'espère que cela aide.")
+
+
+def test_truncated_stream_raises_on_result():
+    stream = SignalStream()
+    stream.feed(json.dumps(DOC)[:-10])
+    with pytest.raises(StreamInvalid):
+        stream.result()
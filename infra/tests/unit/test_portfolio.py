@@ -0,0 +1,139 @@
+import csv
+import importlib
+import io
+import json
+import random
+
+import pytest
+
+import cities
+import portfolio
+import score_store
+from fakes import FakeAWS, FakeBoto3, to_dynamo
+
+VERSION = "20260101T020000Z"
+RAW_BUCKET, ARTIFACTS_BUCKET = "raw", "artifacts"
+N_IRIS = 40
+
+
+class _Expired:
+    """Contexte Lambda sans temps restant : chaque part envoyée est un point de reprise."""
+
+    def get_remaining_time_in_millis(self):
+        return 0
+
+
+def _index(n=N_IRIS, seed=0):
+    rng = random.Random(seed)
+    return cities.IrisIndex([(f"751{k:06d}", rng.uniform(48.82, 48.90), rng.uniform(2.26, 2.41)) for k in range(n)])
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    boto = FakeBoto3(FakeAWS())
+    restore = boto.install()   # clients créés à l'import du handler
+    try:
+        handler = importlib.import_module("portfolio_handler")
+    finally:
+        restore()
+    scores = boto.dynamodb.create_table("PrenScoresTable", "iris_id", "version")
+    jobs = boto.dynamodb.create_table("PrenJobsTable", "job_id")
+    index = _index()
+    scores.seed(to_dynamo({"iris_id": iris_id, "version": VERSION, "future_value_score": 0.5, "momentum": "Low",
+                           "confidence": 0.6}) for iris_id, _, _ in index.rows())
+    scores.seed([{"iris_id": "#POINTER#paris", "version": "ACTIVE", "active_version": VERSION}])
+    for attr, value in {"s3_client": boto.s3, "dynamodb": boto.dynamodb, "jobs_table": jobs,
+                        "scores_table": scores, "ARTIFACTS_BUCKET": ARTIFACTS_BUCKET}.items():
+        monkeypatch.setattr(handler, attr, value)
+    monkeypatch.setattr(cities, "get_index", lambda city: index if city == "paris" else None)
+    monkeypatch.setattr(portfolio, "_snapshot", {})
+    monkeypatch.setattr(portfolio, "_centroids", {})
+    monkeypatch.setattr(score_store, "_cache", {})
+    return handler, boto.s3, jobs
+
+
+def _portfolio_csv(n, seed=1):
+    rng = random.Random(seed)
+    lines = ["loan_id,latitude,longitude"]
+    for k in range(n):
+        if k % 97 == 0:
+            lines.append(f"L{k},n/a,")                                   # invalid
+        elif k % 89 == 0:
+            lines.append(f"L{k},45.76,4.83")                             # Lyon : pas d'index ici
+        else:
+            lines.append(f'"L{k}",{rng.uniform(48.82, 48.90):.6f},{rng.uniform(2.26, 2.41):.6f}')
+    return ("\r\n".join(lines)).encode("utf-8")   # CRLF et pas de fin de ligne finale
+
+
+def test_iter_blocks_cuts_on_line_ends(monkeypatch):
+    monkeypatch.setattr(portfolio, "CHUNK_BYTES", 7)
+    data = b"\xef\xbb\xbfid,lat\n1,2\n333333333333,4\n5"
+    blocks = list(portfolio.iter_blocks(io.BytesIO(data), 0))
+    assert all(text.endswith("\n") for text, _ in blocks[:-1])
+    assert "".join(text for text, _ in blocks) == data.decode("utf-8-sig")
+    assert blocks[-1][1] == len(data)
+    # Reprise à un offset rendu : la suite exacte du flux
+    text, end = blocks[1]
+    rest = list(portfolio.iter_blocks(io.BytesIO(data[end:]), end))
+    assert "".join(t for t, _ in blocks[2:]) == "".join(t for t, _ in rest) and rest[-1][1] == len(data)
+
+
+def test_score_block_statuses(fake):
+    ids = ["a", "b", "c", "d"]
+    lats = portfolio.np.array([48.86, float("nan"), 45.76, 0.0])
+    lngs = portfolio.np.array([2.35, 2.35, 4.83, 0.0])
+    versions = {}
+    handler, _, _ = fake
+    rows = portfolio.score_block(ids, lats, lngs, versions, handler.dynamodb, handler.scores_table)
+    assert [r["status"] for r in rows] == ["ok", "invalid", "no_iris", "out_of_area"]
+    assert versions["paris"] == VERSION and rows[0]["score_version"] == VERSION
+    assert rows[2]["city"] == "lyon"
+
+
+def _result_rows(s3, fmt):
+    body = s3.objects[(ARTIFACTS_BUCKET, portfolio.result_key("job-1", fmt))].decode("utf-8")
+    if fmt == "csv":
+        return list(csv.DictReader(io.StringIO(body)))
+    return [json.loads(line) for line in body.splitlines()]
+
+
+# Parts de 5 Mo (minimum S3) : ~73k lignes CSV, ~28k lignes NDJSON par part
+@pytest.mark.parametrize("fmt, n, min_calls", [("csv", 110_000, 2), ("ndjson", 70_000, 3)])
+def test_forced_yields_lose_and_duplicate_no_row(fake, monkeypatch, fmt, n, min_calls):
+    handler, s3, jobs = fake
+    monkeypatch.setattr(portfolio, "CHUNK_BYTES", 64 * 1024)
+    monkeypatch.setattr(portfolio, "PART_BYTES", 5 << 20)
+    s3.objects[(RAW_BUCKET, "portfolios/book.csv")] = _portfolio_csv(n)
+    state = {"job_id": "job-1", "format": fmt, "source": {"bucket": RAW_BUCKET, "key": "portfolios/book.csv"}}
+    portfolio.create_job(jobs, "job-1", state["source"], fmt)
+
+    calls = 0
+    while True:
+        out = handler.handler({"job": state}, _Expired())
+        calls += 1
+        state = out["job"]
+        if out["status"] != "running":
+            break
+    assert out["status"] == "succeeded" and calls >= min_calls   # reprises forcées après chaque part
+
+    rows = _result_rows(s3, fmt)
+    assert [r["id"] for r in rows] == [f"L{k}" for k in range(n)]
+    assert state["rows_done"] == n
+    assert state["rows_ok"] == sum(1 for r in rows if r["status"] == "ok")
+    assert {r["status"] for r in rows} == {"ok", "invalid", "no_iris"}
+
+
+def test_caches_follow_index_and_versions(fake, monkeypatch):
+    handler, _, _ = fake
+    lats, lngs = portfolio.np.array([48.86]), portfolio.np.array([2.35])
+    portfolio.score_block(["a"], lats, lngs, {}, handler.dynamodb, handler.scores_table)
+    first = portfolio._city_centroids("paris")
+    assert portfolio._city_centroids("paris") is first
+    # Job suivant figé sur une autre version : les items de l'ancienne sont oubliés
+    rows = portfolio.score_block(["a"], lats, lngs, {"paris": "20260102T020000Z"}, handler.dynamodb,
+                                 handler.scores_table)
+    assert rows[0]["status"] == "no_score" and set(portfolio._snapshot) == {"20260102T020000Z"}
+    # Nouvel index de la ville (rechargé) : centroïdes recalculés
+    new_index = _index(seed=5)
+    monkeypatch.setattr(cities, "get_index", lambda city: new_index)
+    assert portfolio._city_centroids("paris") is not first
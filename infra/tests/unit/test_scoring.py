@@ -0,0 +1,10 @@
+import scoring
+
+
+def test_legacy_signal_confidence_does_not_break_the_batch():
+    # Signaux de l'ancien bedrock_handler : str(confidence), "None" quand Nova renvoyait null
+    signals = [{"iris_id": "751010101", "signal_type": "permit", "impact": "positive", "confidence": c,
+                "description": "Permis", "created_at": "2026-01-01T00:00:00"} for c in ("None", "0.9", None, "nan")]
+    assert [scoring.signal_confidence(s) for s in signals] == [0.5, 0.9, 0.5, 0.5]
+    items = scoring.compute_scores([("751010101", "paris")], signals)
+    assert len(items) == 1 and 0.0 <= items[0]["future_value_score"] <= 1.0
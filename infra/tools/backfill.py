@@ -0,0 +1,322 @@
+"""
+Backfill — ré-extraction et re-structuration de tout le RawBucket en parallèle.
+
+Après un changement d'extraction ou de prompt, chaque document est repassé par le code
+des handlers eux-mêmes (textract_handler puis bedrock_handler, appelés comme par la
+machine à états) sans orchestrer une exécution Step Functions par fichier :
+
+  - un pool de processus (--workers, défaut : tous les cœurs) ; chaque worker importe
+    une fois les handlers — clients S3 / Textract / Bedrock / DynamoDB, pypdf, gazetteer
+    et cache Bedrock restent chargés pour tous ses documents ;
+  - --extractor pypdf (défaut) extrait les PDF en local, CPU-bound : c'est ce qui sature
+    les cœurs (les .txt gardent le chemin du handler) ; --extractor textract garde le
+    chemin du handler pour tous les documents (Textract puis pypdf) ;
+  - doc_type / city repris des signaux déjà stockés du document (sinon déduits du nom
+    de fichier), signaux surnuméraires de l'ancienne extraction supprimés ;
+  - checkpoint NDJSON (une ligne par document terminé, écrite par le processus
+    principal) : relancer la même commande reprend là où le run s'est arrêté, seuls
+    les documents en échec ou non traités repartent ;
+  - rapport de débit (--report, JSON) : docs/s, pages/s, Mo/s, percentiles par étape,
+    utilisation CPU des workers.
+
+Usage :
+  python tools/backfill.py --bucket <RawBucket> --signals-table <PrenSignalsTable> \\
+      --cache-table <PrenBedrockCache> [--prefix pdfs/] [--workers 16] \\
+      [--checkpoint backfill.ckpt] [--report backfill_report.json] [--extract-only]
+  python tools/backfill.py --corpus ./pdfs --latency bedrock=0.05   (fakes de tools/fakes.py)
+"""
+import argparse
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.join(TOOLS_DIR, "..", "infra", "lambda")
+for _path in (TOOLS_DIR, LAMBDA_DIR):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from trace_report import percentile  # noqa: E402
+
+DOC_SUFFIXES = (".pdf", ".txt")
+PROGRESS_SECONDS = 5.0
+
+_worker: dict = {}   # état du worker : config, handlers importés, runtime local éventuel
+
+
+class BackfillContext:
+    """Contexte Lambda minimal : échéance des attentes du rate limiter à 15 minutes."""
+    function_name = "backfill"
+    memory_limit_in_mb = 0
+    aws_request_id = "backfill"
+
+    def get_remaining_time_in_millis(self):
+        return 900_000
+
+
+# --- Listing --------------------------------------------------------------------------
+
+def list_bucket(bucket: str, prefix: str) -> list[tuple[str, int]]:
+    """(clé, taille) des documents du bucket sous `prefix` (ListObjectsV2 paginé)."""
+    import boto3
+    paginator = boto3.client("s3").get_paginator("list_objects_v2")
+    docs = []
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        docs.extend((obj["Key"], obj["Size"]) for obj in page.get("Contents", [])
+                    if obj["Key"].lower().endswith(DOC_SUFFIXES))
+    return docs
+
+
+def list_corpus(corpus: str) -> list[tuple[str, int]]:
+    """Même convention de clés que local_runtime.load_corpus : pdfs/<chemin relatif>."""
+    docs = []
+    for root, _, files in os.walk(corpus):
+        for fname in sorted(files):
+            if fname.lower().endswith(DOC_SUFFIXES):
+                path = os.path.join(root, fname)
+                docs.append(("pdfs/" + os.path.relpath(path, corpus).replace(os.sep, "/"), os.path.getsize(path)))
+    return docs
+
+
+# --- Checkpoint -----------------------------------------------------------------------
+
+def load_checkpoint(path: str) -> dict:
+    """clé -> dernière ligne du checkpoint ; une dernière ligne tronquée (arrêt brutal) est ignorée."""
+    done = {}
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                done[row["key"]] = row
+    return done
+
+
+# --- Worker ---------------------------------------------------------------------------
+
+def _init_worker(config: dict):
+    """Une fois par processus : environnement, fakes éventuels, import des handlers et de pypdf."""
+    _worker["config"] = config
+    if not config.get("emf"):
+        sys.stdout = open(os.devnull, "w")   # lignes EMF des handlers
+    if config.get("corpus"):
+        from bench_handlers import parse_latency
+        from local_runtime import LocalRuntime
+        runtime = LocalRuntime(parse_latency(config.get("latency", "")), seed=os.getpid())
+        config["bucket"] = os.environ["RAW_BUCKET"]
+        _worker["runtime"] = runtime
+    else:
+        os.environ.update({k: v for k, v in config["env"].items() if v})
+    import bedrock_handler
+    importlib.import_module("pypdf")   # import payé une fois par worker, pas par document
+    import textract_handler
+    _worker["textract"] = textract_handler.handler
+    _worker["bedrock"] = bedrock_handler.handler
+    _worker["signals_table"] = bedrock_handler.signals_table
+    # Les handlers mettent le logger racine à INFO à l'import
+    logging.getLogger().setLevel(config.get("log_level", "ERROR"))
+
+
+def _doc_meta(key: str) -> tuple[str, str]:
+    """doc_type / city de l'extraction précédente (SIGNAL#000), sinon déduits du nom de fichier."""
+    config, table = _worker["config"], _worker["signals_table"]
+    if table is not None:
+        item = table.get_item(Key={"pk": f"DOC#{key}", "sk": "SIGNAL#000"},
+                              ProjectionExpression="doc_type, city").get("Item")
+        if item and item.get("doc_type"):
+            return item["doc_type"], item.get("city") or config["city"]
+    stem = os.path.basename(key).lower()
+    doc_type = "zoning" if ("plu" in stem or "zon" in stem) else "permit" if "permis" in stem else "unknown"
+    return doc_type, config["city"]
+
+
+def _prune_signals(key: str, stored: int) -> int:
+    """Supprime les SIGNAL#nnn au-delà des `stored` signaux de la nouvelle extraction."""
+    from boto3.dynamodb.conditions import Key
+    table = _worker["signals_table"]
+    if table is None:
+        return 0
+    resp = table.query(KeyConditionExpression=Key("pk").eq(f"DOC#{key}") & Key("sk").begins_with("SIGNAL#"),
+                       ProjectionExpression="pk, sk")
+    stale = [it for it in resp.get("Items", []) if int(it["sk"].split("#")[1]) >= stored]
+    for it in stale:
+        table.delete_item(Key={"pk": it["pk"], "sk": it["sk"]})
+    return len(stale)
+
+
+def process(key: str) -> dict:
+    """Un document : extraction puis structuration via les handlers ; une ligne de checkpoint."""
+    config = _worker["config"]
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    row = {"key": key, "worker": os.getpid()}
+    try:
+        if config.get("corpus"):
+            with open(os.path.join(config["corpus"], key.removeprefix("pdfs/")), "rb") as f:
+                _worker["runtime"].put_document(key, f.read())
+        doc_type, city = _doc_meta(key)
+        event = {"s3_bucket": config["bucket"], "s3_key": key, "doc_type": doc_type, "city": city}
+        if config["extractor"] == "pypdf" and key.lower().endswith(".pdf"):
+            event["extractor"] = "pypdf"
+        extracted = _worker["textract"](event, BackfillContext())
+        body = json.loads(extracted["body"])
+        row["extract_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+        if extracted["statusCode"] != 200:
+            return {**row, "status": "failed", "stage": "extract", "error": body.get("error")}
+        row.update(pages=body["page_count"], method=body["extraction_method"])
+
+        if not config.get("extract_only"):
+            t1 = time.perf_counter()
+            structured = _worker["bedrock"](body, BackfillContext())
+            out = json.loads(structured["body"])
+            row["structure_ms"] = round((time.perf_counter() - t1) * 1000, 3)
+            if structured["statusCode"] != 200:
+                return {**row, "status": "failed", "stage": "structure", "error": out.get("error")}
+            row.update(signals=out["signals_stored"], cache_hit=out["cache_hit"],
+                       pruned=_prune_signals(key, out["signals_stored"]))
+        row["status"] = "ok"
+        return row
+    except Exception as e:
+        return {**row, "status": "failed", "stage": "worker", "error": repr(e)}
+    finally:
+        row["total_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+        row["cpu_ms"] = round((time.process_time() - cpu0) * 1000, 3)
+        if config.get("corpus"):
+            _worker["runtime"].s3.objects.pop((config["bucket"], key), None)
+
+
+# --- Rapport --------------------------------------------------------------------------
+
+def _stage(rows: list, field: str) -> dict:
+    values = [r[field] for r in rows if field in r]
+    if not values:
+        return {}
+    return {"count": len(values), "p50_ms": round(percentile(values, 50), 1),
+            "p95_ms": round(percentile(values, 95), 1), "max_ms": round(max(values), 1)}
+
+
+def build_report(rows: list, sizes: dict, listed: int, resumed: int, workers: int, elapsed: float,
+                 interrupted: bool) -> dict:
+    ok = [r for r in rows if r["status"] == "ok"]
+    failed = [r for r in rows if r["status"] != "ok"]
+    pages = sum(r.get("pages", 0) for r in ok)
+    mbytes = sum(sizes.get(r["key"], 0) for r in rows) / 1e6
+    cpu_s = sum(r.get("cpu_ms", 0) for r in rows) / 1000
+    return {
+        "documents_listed": listed,
+        "documents_resumed": resumed,
+        "documents_processed": len(rows),
+        "documents_ok": len(ok),
+        "documents_failed": len(failed),
+        "interrupted": interrupted,
+        "workers": workers,
+        "cpu_count": os.cpu_count(),
+        "elapsed_s": round(elapsed, 2),
+        "docs_per_s": round(len(rows) / elapsed, 2) if elapsed else 0.0,
+        "pages_per_s": round(pages / elapsed, 2) if elapsed else 0.0,
+        "mb_per_s": round(mbytes / elapsed, 3) if elapsed else 0.0,
+        # Temps CPU des workers / (durée x workers) : proche de 1 = cœurs saturés
+        "cpu_utilization": round(cpu_s / (elapsed * workers), 3) if elapsed else 0.0,
+        "pages": pages,
+        "signals_stored": sum(r.get("signals", 0) for r in ok),
+        "signals_pruned": sum(r.get("pruned", 0) for r in ok),
+        "bedrock_cache_hits": sum(1 for r in ok if r.get("cache_hit")),
+        "extraction_methods": dict(Counter(r.get("method") for r in ok)),
+        "stages": {name: _stage(rows, f"{name}_ms") for name in ("extract", "structure", "total")},
+        "per_worker": dict(Counter(str(r["worker"]) for r in rows)),
+        "failures": [{k: r.get(k) for k in ("key", "stage", "error")} for r in failed[:20]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-extract and re-structure every document of the raw bucket")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--bucket", help="RawBucket name (real AWS)")
+    source.add_argument("--corpus", help="Local directory of PDF / .txt documents (AWS fakes)")
+    parser.add_argument("--prefix", default="pdfs/")
+    parser.add_argument("--city", default="Paris", help="City when no previous extraction is stored")
+    parser.add_argument("--signals-table", default=os.environ.get("SIGNALS_TABLE", ""))
+    parser.add_argument("--cache-table", default=os.environ.get("BEDROCK_CACHE_TABLE", ""),
+                        help="Bedrock response cache (also the rate limiter table)")
+    parser.add_argument("--extractor", choices=["pypdf", "textract"], default="pypdf")
+    parser.add_argument("--extract-only", action="store_true", help="Skip Bedrock structuring")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--limit", type=int, help="Process at most N pending documents")
+    parser.add_argument("--checkpoint", default="backfill.ckpt", help="NDJSON checkpoint (resumed if present)")
+    parser.add_argument("--fresh", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--report", default="backfill_report.json")
+    parser.add_argument("--latency", default="", help="Fakes only: injected latency (s), e.g. bedrock=0.5")
+    parser.add_argument("--emf", action="store_true", help="Keep the handlers' EMF metric lines on stdout")
+    parser.add_argument("--log-level", default="ERROR")
+    args = parser.parse_args()
+
+    docs = list_corpus(args.corpus) if args.corpus else list_bucket(args.bucket, args.prefix)
+    sizes = dict(docs)
+    if args.fresh and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    done = {k for k, row in load_checkpoint(args.checkpoint).items() if row["status"] == "ok"}
+    pending = [k for k, _ in docs if k not in done]
+    if args.limit:
+        pending = pending[:args.limit]
+    resumed = sum(1 for k, _ in docs if k in done)
+    print(f"{len(docs)} documents listed, {resumed} already done ({args.checkpoint}), "
+          f"{len(pending)} to process with {args.workers} workers", file=sys.stderr)
+
+    config = {
+        "corpus": os.path.abspath(args.corpus) if args.corpus else None,
+        "bucket": args.bucket,
+        "city": args.city,
+        "extractor": args.extractor,
+        "extract_only": args.extract_only,
+        "latency": args.latency,
+        "emf": args.emf,
+        "log_level": args.log_level.upper(),
+        "env": {"RAW_BUCKET": args.bucket, "SIGNALS_TABLE": args.signals_table,
+                "BEDROCK_CACHE_TABLE": args.cache_table, "RATE_LIMIT_TABLE": args.cache_table},
+    }
+    rows, interrupted = [], False
+    t0 = last_progress = time.perf_counter()
+    # spawn : chaque worker crée ses propres clients (jamais hérités d'un fork)
+    ctx = multiprocessing.get_context("spawn")
+    with open(args.checkpoint, "a", encoding="utf-8") as checkpoint, \
+            ctx.Pool(args.workers, initializer=_init_worker, initargs=(config,)) as pool:
+        try:
+            for row in pool.imap_unordered(process, pending, chunksize=1):
+                checkpoint.write(json.dumps(row) + "\n")
+                checkpoint.flush()
+                rows.append(row)
+                now = time.perf_counter()
+                if now - last_progress >= PROGRESS_SECONDS:
+                    rate = len(rows) / (now - t0)
+                    eta = (len(pending) - len(rows)) / rate if rate else 0
+                    print(f"{len(rows)}/{len(pending)} documents, {rate:.1f} docs/s, ETA {eta:.0f}s",
+                          file=sys.stderr)
+                    last_progress = now
+        except KeyboardInterrupt:
+            interrupted = True
+            pool.terminate()
+    elapsed = time.perf_counter() - t0
+
+    report = build_report(rows, sizes, len(docs), resumed, args.workers, elapsed, interrupted)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"{report['documents_ok']} ok, {report['documents_failed']} failed in {report['elapsed_s']}s — "
+          f"{report['docs_per_s']} docs/s, {report['pages_per_s']} pages/s, {report['mb_per_s']} MB/s, "
+          f"CPU utilization {report['cpu_utilization']:.0%} of {args.workers} workers")
+    for name, stage in report["stages"].items():
+        if stage:
+            print(f"  {name:<10} p50 {stage['p50_ms']:>8.1f} ms   p95 {stage['p95_ms']:>8.1f} ms   "
+                  f"max {stage['max_ms']:>8.1f} ms")
+    print(f"report written to {args.report}" + (" (interrupted: rerun to resume)" if interrupted else ""))
+    if report["documents_failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""
+Benchmark hors ligne des handlers (score, explain, health, textract, bedrock).
+
+Chaque handler est importé tel quel, ses clients boto3 remplacés par les fakes en
+mémoire de tools/fakes.py (latence injectable), puis invoqué avec des events
+réalistes : HTTP API payload v2 pour les routes, payload Step Functions pour
+l'ingestion. Aucun compte AWS n'est nécessaire.
+
+Mesures par handler :
+  - latence p50/p90/p99/max sur --iterations invocations (après --warmup) ;
+  - mémoire : pic tracemalloc et octets encore retenus après chaque invocation (passe séparée,
+    pour ne pas fausser les latences) ;
+  - import à froid : import du module dans un interpréteur neuf (boto3 compris),
+    médiane de --cold-runs sous-processus.
+
+Les résultats (JSON) embarquent le commit git et la configuration, pour comparer
+deux commits :
+  python tools/bench_handlers.py --out bench-main.json
+  python tools/bench_handlers.py --compare bench-main.json --threshold 15
+
+Latence AWS simulée (secondes, par service ou service.opération) :
+  --latency dynamodb=0.004,s3=0.015,bedrock=0.8
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.join(TOOLS_DIR, "..", "infra", "lambda")
+
+# Emprise de Paris intra-muros (lat_min, lat_max, lng_min, lng_max)
+PARIS_BBOX = (48.815, 48.902, 2.224, 2.470)
+
+BENCH_ENV = {
+    "AWS_DEFAULT_REGION": "eu-west-3",
+    "AWS_ACCESS_KEY_ID": "bench",
+    "AWS_SECRET_ACCESS_KEY": "bench",
+    "SCORES_TABLE": "bench-scores",
+    "SIGNALS_TABLE": "bench-signals",
+    "RAW_BUCKET": "bench-raw",
+    # Clients remplacés après import : le warm-up partirait sur les vrais clients boto3
+    "WARMUP_ENABLED": "0",
+}
+
+HANDLERS = ["score", "explain", "health", "textract", "bedrock"]
+BENCH_VERSION = "bench"
+# Hors BENCH_ENV : gazetteer.py chargerait sinon l'artefact via un vrai client S3
+BENCH_ARTIFACTS_BUCKET = "bench-artifacts"
+
+
+def _setup_path_and_env():
+    for k, v in BENCH_ENV.items():
+        os.environ.setdefault(k, v)
+    if LAMBDA_DIR not in sys.path:
+        sys.path.insert(0, LAMBDA_DIR)
+    if TOOLS_DIR not in sys.path:
+        sys.path.insert(0, TOOLS_DIR)
+
+
+class LambdaContext:
+    function_name = "bench"
+    memory_limit_in_mb = 512
+
+    def __init__(self):
+        self.aws_request_id = str(uuid.uuid4())
+
+    def get_remaining_time_in_millis(self):
+        return 30000
+
+
+def http_event(route: str, params: dict, headers: dict = None, raw_query: str = None,
+               method: str = "GET", source_ip: str = "203.0.113.10") -> dict:
+    """Event HTTP API (payload v2) tel que transmis par API Gateway."""
+    headers = headers or {
+        "accept": "application/json",
+        "accept-encoding": "gzip, deflate, br",
+        "host": "bench.execute-api.eu-west-3.amazonaws.com",
+        "user-agent": "bench_handlers/1.0",
+        "x-forwarded-for": source_ip,
+        "x-forwarded-proto": "https",
+    }
+    return {
+        "version": "2.0",
+        "routeKey": f"{method} {route}",
+        "rawPath": route,
+        "rawQueryString": raw_query if raw_query is not None else "&".join(f"{k}={v}" for k, v in params.items()),
+        "headers": headers,
+        "queryStringParameters": {k: str(v) for k, v in params.items()} or None,
+        "requestContext": {
+            "accountId": "000000000000",
+            "apiId": "bench",
+            "domainName": headers.get("host", "bench.execute-api.eu-west-3.amazonaws.com"),
+            "http": {"method": method, "path": route, "protocol": "HTTP/1.1",
+                     "sourceIp": source_ip, "userAgent": headers.get("user-agent", "")},
+            "requestId": uuid.uuid4().hex[:16],
+            "routeKey": f"{method} {route}",
+            "stage": "$default",
+            "timeEpoch": int(time.time() * 1000),
+        },
+        "isBase64Encoded": False,
+    }
+
+
+def _sample_document(pages: int, rng: random.Random) -> str:
+    phrases = [
+        "Le permis de construire n° PC 075 117 24 V0042 est accordé pour 48 logements.",
+        "Modification du PLU : zonage UG étendu au secteur Batignolles.",
+        "Prolongement du tramway T3 et création d'une station Porte d'Asnières.",
+        "Rénovation énergétique de l'ensemble immobilier rue Cardinet.",
+        "Ouverture d'un commerce de proximité boulevard Pereire.",
+        "Le conseil municipal approuve le compte rendu de la séance précédente.",
+        "Article 12 : stationnement des véhicules, normes applicables.",
+    ]
+    return "\n".join(rng.choice(phrases) for _ in range(pages * 50))
+
+
+class BenchRuntime:
+    """Tables, buckets et clients fakes partagés par tous les handlers du run."""
+
+    def __init__(self, latency: dict, jitter: float, n_iris: int, seed: int = 0):
+        import explain_payload
+        from fakes import FakeAWS, FakeBedrock, FakeDynamoResource, FakeS3, FakeTextract, to_dynamo
+
+        self.aws = FakeAWS(latency, jitter, seed)
+        self.rng = random.Random(seed)
+        self.dynamodb = FakeDynamoResource(self.aws)
+        self.scores = self.dynamodb.create_table(BENCH_ENV["SCORES_TABLE"], "iris_id", "version")
+        self.signals = self.dynamodb.create_table(
+            BENCH_ENV["SIGNALS_TABLE"], "pk", "sk", indexes={"ByIris": ("iris_id", "created_at")})
+        self.s3 = FakeS3(self.aws)
+        self.textract = FakeTextract(self.aws, self.s3)
+        self.bedrock = FakeBedrock(self.aws)
+
+        iris_ids = ["PARIS_DEMO_1", "PARIS_DEMO_2", "PARIS_DEMO_3"] + [f"751{i:06d}" for i in range(n_iris)]
+        self.iris_ids = iris_ids
+        now = datetime.now(timezone.utc).isoformat()
+        items = []
+        for i, iris_id in enumerate(iris_ids):
+            items.append({
+                "iris_id": iris_id,
+                "city": "Paris",
+                "future_value_score": round(0.4 + 0.5 * self.rng.random(), 4),
+                "momentum": self.rng.choice(["High", "Medium", "Low"]),
+                "confidence": round(0.3 + 0.6 * self.rng.random(), 4),
+                "data_freshness_days": float(self.rng.randint(1, 90)),
+                "top_signals": "permit: PC 48 logements|infrastructure: tramway T3|zoning: PLU UG",
+                "updated_at": now,
+                "evidence": [{"doc_id": f"pdfs/doc_{i}.pdf", "description": "Permis de construire 48 logements",
+                              "signal_type": "permit", "impact": "positive", "confidence": 0.8}],
+            })
+        explain_payload.attach(items, BENCH_VERSION)
+        self.scores.seed(to_dynamo({**it, "version": BENCH_VERSION}) for it in items)
+        self.scores.seed([
+            {"iris_id": "#VERSION#paris", "version": BENCH_VERSION, "item_count": len(items), "created_at": now},
+            {"iris_id": "#POINTER#paris", "version": "ACTIVE", "active_version": BENCH_VERSION, "published_at": now},
+        ])
+        self.signals.seed(
+            {"pk": f"DOC#pdfs/doc_{i % 50}.pdf", "sk": f"SIGNAL#{i:03d}", "iris_id": iris_id,
+             "created_at": now, "description": "Permis de construire 48 logements", "confidence": "0.8",
+             "evidence_span": "Le permis de construire n° PC 075 117 24 V0042 est accordé",
+             "signal_type": "permit", "impact": "positive"}
+            for i, iris_id in enumerate(iris_ids * 5)
+        )
+        self.doc_text = _sample_document(3, self.rng)
+        self.s3.objects[(BENCH_ENV["RAW_BUCKET"], "pdfs/bench.pdf")] = self.doc_text.encode("utf-8")
+        self.s3.objects[(BENCH_ARTIFACTS_BUCKET, "geo/paris/gazetteer.json.gz")] = b"\x1f\x8b"
+        # Centroïdes répartis sur l'emprise : /score passe par l'index spatial de la ville
+        lat_min, lat_max, lng_min, lng_max = PARIS_BBOX
+        self.s3.objects[(BENCH_ARTIFACTS_BUCKET, "geo/paris/iris_centroids.csv")] = (
+            "iris_id,city,lat,lng\n" + "".join(
+                f"{iris_id},Paris,{self.rng.uniform(lat_min, lat_max):.6f},{self.rng.uniform(lng_min, lng_max):.6f}\n"
+                for iris_id in iris_ids)
+        ).encode("utf-8")
+
+    def patch(self, module):
+        """Remplace les clients AWS créés à l'import du handler par les fakes."""
+        replacements = {
+            "table": self.scores,
+            "signals_table": self.signals,
+            "dynamodb": self.dynamodb,
+            "s3_client": self.s3,
+            "textract": self.textract,
+            "bedrock": self.bedrock,
+            "ARTIFACTS_BUCKET": BENCH_ARTIFACTS_BUCKET,
+        }
+        for attr, fake in replacements.items():
+            if hasattr(module, attr):
+                setattr(module, attr, fake)
+
+    def event(self, name: str) -> dict:
+        lat_min, lat_max, lng_min, lng_max = PARIS_BBOX
+        if name == "score":
+            return http_event("/score", {"lat": round(self.rng.uniform(lat_min, lat_max), 6),
+                                         "lng": round(self.rng.uniform(lng_min, lng_max), 6)})
+        if name == "explain":
+            return http_event("/explain", {"iris_id": self.rng.choice(self.iris_ids)})
+        if name == "health":
+            return http_event("/health", {"deep": 1})
+        if name == "textract":
+            return {"s3_bucket": BENCH_ENV["RAW_BUCKET"], "s3_key": "pdfs/bench.pdf", "doc_type": "zoning",
+                    "city": "Paris", "execution": {"name": "bench", "start": datetime.now(timezone.utc).isoformat()}}
+        if name == "bedrock":
+            return {"statusCode": 200, "body": json.dumps({
+                "s3_key": "pdfs/bench.pdf", "doc_type": "zoning", "city": "Paris",
+                "extracted_text": self.doc_text[:10000], "page_count": 3, "extraction_method": "textract",
+            })}
+        raise ValueError(name)
+
+
+def _load_handler(name: str, runtime: BenchRuntime):
+    import importlib
+    module = importlib.import_module(f"{name}_handler")
+    runtime.patch(module)
+    if "cities" in sys.modules:
+        runtime.patch(sys.modules["cities"])
+    return module.handler
+
+
+def _percentiles(samples_ms: list) -> dict:
+    from trace_report import percentile
+    return {
+        "p50_ms": round(percentile(samples_ms, 50), 3),
+        "p90_ms": round(percentile(samples_ms, 90), 3),
+        "p99_ms": round(percentile(samples_ms, 99), 3),
+        "max_ms": round(max(samples_ms), 3),
+        "mean_ms": round(statistics.fmean(samples_ms), 3),
+    }
+
+
+@contextlib.contextmanager
+def _lambda_log_handler(stream):
+    """Comme le runtime Lambda : un handler sur le logger racine formate chaque ligne."""
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("[%(levelname)s]\t%(asctime)s.%(msecs)03dZ\t%(message)s"))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    try:
+        yield
+    finally:
+        root.removeHandler(handler)
+
+
+def bench_handler(name: str, runtime: BenchRuntime, iterations: int, warmup: int, alloc_iterations: int) -> dict:
+    fn = _load_handler(name, runtime)
+    statuses = {}
+    # Les lignes EMF (une par invocation) partent vers /dev/null : même coût, sans bruit
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), _lambda_log_handler(devnull):
+        for _ in range(warmup):
+            fn(runtime.event(name), LambdaContext())
+
+        samples = []
+        for _ in range(iterations):
+            event, ctx = runtime.event(name), LambdaContext()
+            t0 = time.perf_counter()
+            resp = fn(event, ctx)
+            samples.append((time.perf_counter() - t0) * 1000)
+            statuses[resp.get("statusCode")] = statuses.get(resp.get("statusCode"), 0) + 1
+
+        allocated, peaks = [], []
+        for _ in range(alloc_iterations):
+            event, ctx = runtime.event(name), LambdaContext()
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            fn(event, ctx)
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            stats = after.compare_to(before, "filename")
+            allocated.append(sum(s.size_diff for s in stats if s.size_diff > 0))
+            peaks.append(peak)
+
+    result = _percentiles(samples)
+    result["iterations"] = iterations
+    result["status_codes"] = {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))}
+    if allocated:
+        result["retained_kib_per_call"] = round(statistics.median(allocated) / 1024, 2)
+        result["peak_kib_per_call"] = round(statistics.median(peaks) / 1024, 2)
+    return result
+
+
+def cold_import_ms(name: str, runs: int) -> float:
+    """Médiane du temps d'import du module handler dans un interpréteur neuf."""
+    code = (
+        "import sys, time; sys.path.insert(0, sys.argv[1]); t0 = time.perf_counter(); "
+        f"import {name}_handler; print((time.perf_counter() - t0) * 1000)"
+    )
+    env = {**os.environ, **BENCH_ENV}
+    times = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code, LAMBDA_DIR], env=env, capture_output=True,
+                             text=True, check=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return round(statistics.median(times), 2)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=TOOLS_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def parse_latency(spec: str) -> dict:
+    latency = {}
+    for part in filter(None, (spec or "").split(",")):
+        key, _, value = part.partition("=")
+        latency[key.strip()] = float(value)
+    return latency
+
+
+def compare(current: dict, baseline: dict, threshold_pct: float) -> list:
+    """Lignes (handler, métrique, base, actuel, delta %, régression?) pour les métriques communes."""
+    rows = []
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        for metric in ("p50_ms", "p99_ms", "retained_kib_per_call", "cold_import_ms"):
+            if metric not in cur or metric not in base or not base[metric]:
+                continue
+            delta = (cur[metric] - base[metric]) / base[metric] * 100
+            rows.append((name, metric, base[metric], cur[metric], delta, delta > threshold_pct))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline latency / allocation benchmark of the Lambda handlers")
+    parser.add_argument("--handlers", default=",".join(HANDLERS), help="Comma-separated subset of " + ",".join(HANDLERS))
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--alloc-iterations", type=int, default=20, help="Invocations traced with tracemalloc")
+    parser.add_argument("--cold-runs", type=int, default=3, help="Fresh interpreters per cold-import measure (0 = skip)")
+    parser.add_argument("--latency", default="", help="Injected AWS latency in seconds, e.g. dynamodb=0.004,s3=0.015")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Relative jitter on injected latency (0.2 = ±20%%)")
+    parser.add_argument("--iris", type=int, default=1000, help="Seeded IRIS score items")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write results JSON here")
+    parser.add_argument("--compare", help="Baseline results JSON from another commit")
+    parser.add_argument("--threshold", type=float, default=15.0, help="Regression threshold in %% (with --compare)")
+    args = parser.parse_args()
+
+    _setup_path_and_env()
+    names = [n.strip() for n in args.handlers.split(",") if n.strip()]
+    unknown = set(names) - set(HANDLERS)
+    if unknown:
+        parser.error(f"unknown handlers: {', '.join(sorted(unknown))}")
+
+    latency = parse_latency(args.latency)
+    runtime = BenchRuntime(latency, args.jitter, args.iris, args.seed)
+    results = {}
+    for name in names:
+        results[name] = bench_handler(name, runtime, args.iterations, args.warmup, args.alloc_iterations)
+        if args.cold_runs > 0:
+            results[name]["cold_import_ms"] = cold_import_ms(name, args.cold_runs)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "iterations": args.iterations,
+            "latency": latency,
+            "jitter": args.jitter,
+            "iris": args.iris,
+            "seed": args.seed,
+        },
+        "results": results,
+        "aws_calls": runtime.aws.calls,
+    }
+
+    print(f"commit {report['meta']['commit']}  python {report['meta']['python']}  latency {latency or 'none'}")
+    print(f"{'handler':<10} {'p50_ms':>9} {'p90_ms':>9} {'p99_ms':>9} {'max_ms':>9} {'retain_kib':>10} {'peak_kib':>9} {'cold_ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['p50_ms']:>9.3f} {r['p90_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['max_ms']:>9.3f} "
+              f"{r.get('retained_kib_per_call', 0):>10.2f} {r.get('peak_kib_per_call', 0):>9.2f} "
+              f"{r.get('cold_import_ms', 0):>9.2f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=lambda o: float(o) if isinstance(o, Decimal) else str(o))
+        print(f"Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("latency") != latency:
+            print("warning: baseline was run with a different --latency; deltas include simulated AWS time")
+        rows = compare(report, baseline, args.threshold)
+        print(f"\nvs {baseline.get('meta', {}).get('commit', '?')} (threshold {args.threshold:.0f}%)")
+        for name, metric, base, cur, delta, regressed in rows:
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:<10} {metric:<20} {base:>10.3f} -> {cur:>10.3f} {delta:>+8.1f}%{flag}")
+        if any(r[5] for r in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Construit l'artefact gazetteer d'une ville (geo/<city>/gazetteer.json.gz) à partir de fichiers locaux :
+
+  --ban        extrait de la Base Adresse Nationale (CSV ';', ex. adresses-75.csv.gz)
+  --quartiers  quartiers administratifs de Paris (CSV ';', colonnes l_qu + geom_x_y)
+  --iris       centroïdes IRIS (CSV ',', colonnes iris_id, city, lat, lng)
+
+Chaque voie / quartier est rattaché à l'IRIS dont le centroïde est le plus proche ;
+une voie qui traverse plusieurs IRIS prend l'IRIS majoritaire (en nombre d'adresses).
+
+Usage :
+  python tools/build_gazetteer.py --ban adresses-75.csv.gz --quartiers quartier_paris.csv \
+      --iris iris_centroids.csv --out gazetteer.json.gz [--city paris] [--upload-bucket <ArtifactsBucket>]
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+from collections import Counter, defaultdict
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "infra", "lambda")
+if LAMBDA_DIR not in sys.path:
+    sys.path.insert(0, LAMBDA_DIR)
+
+import cities  # noqa: E402
+
+
+def _open_text(path):
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8")
+    return open(path, encoding="utf-8", newline="")
+
+
+def _lower_keys(row):
+    return {k.strip().lower(): v for k, v in row.items() if k}
+
+
+class NearestIris(cities.IrisIndex):
+    """Index IRIS de cities.py (même recherche par grille) ; find rend (iris_id, city)."""
+
+    def __init__(self, rows):
+        super().__init__(((iris_id, city), lat, lng) for iris_id, city, lat, lng in rows)
+
+
+def load_iris(path):
+    rows = []
+    with _open_text(path) as f:
+        for row in csv.DictReader(f):
+            row = _lower_keys(row)
+            rows.append((row["iris_id"], row.get("city") or "Paris", float(row["lat"]), float(row["lng"])))
+    return rows
+
+
+def ban_entries(path, nearest):
+    """Une entrée par (voie, commune) avec l'IRIS majoritaire et le nombre d'adresses."""
+    counts = defaultdict(Counter)
+    city_of = {}
+    with _open_text(path) as f:
+        for row in csv.DictReader(f, delimiter=";"):
+            row = _lower_keys(row)
+            name = (row.get("nom_voie") or "").strip()
+            if not name or not row.get("lat") or not row.get("lon"):
+                continue
+            hit = nearest.find(float(row["lat"]), float(row["lon"]))
+            if hit is None:
+                continue
+            key = (name, (row.get("nom_commune") or "").strip())
+            counts[key][hit[0]] += 1
+            city_of[hit[0]] = hit[1]
+    entries = []
+    for (name, _commune), per_iris in counts.items():
+        iris_id, _ = per_iris.most_common(1)[0]
+        entries.append([name, "voie", iris_id, city_of[iris_id], sum(per_iris.values())])
+    return entries
+
+
+def quartier_entries(path, nearest):
+    entries = []
+    with _open_text(path) as f:
+        for row in csv.DictReader(f, delimiter=";"):
+            row = _lower_keys(row)
+            name = (row.get("l_qu") or row.get("name") or "").strip()
+            if row.get("geom_x_y"):
+                lat_s, lng_s = row["geom_x_y"].split(",")
+            else:
+                lat_s, lng_s = row.get("lat"), row.get("lng")
+            if not name or not lat_s or not lng_s:
+                continue
+            hit = nearest.find(float(lat_s), float(lng_s))
+            if hit is not None:
+                # Poids élevé : un nom de quartier l'emporte sur une voie homonyme
+                entries.append([name, "quartier", hit[0], hit[1], 10000])
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline location_hint -> IRIS gazetteer")
+    parser.add_argument("--ban", help="BAN CSV extract (';' separated, optionally .gz)")
+    parser.add_argument("--quartiers", help="Paris quartiers CSV (';' separated)")
+    parser.add_argument("--iris", required=True, help="IRIS centroids CSV (iris_id,city,lat,lng)")
+    parser.add_argument("--out", default="gazetteer.json.gz")
+    parser.add_argument("--city", default="paris", help="City slug of the artifact (default paris)")
+    parser.add_argument("--upload-bucket", help="Upload to s3://<bucket>/geo/<city>/gazetteer.json.gz")
+    args = parser.parse_args()
+
+    nearest = NearestIris(load_iris(args.iris))
+    entries = []
+    if args.quartiers:
+        entries += quartier_entries(args.quartiers, nearest)
+    if args.ban:
+        entries += ban_entries(args.ban, nearest)
+
+    payload = gzip.compress(json.dumps({"version": 1, "entries": entries}, ensure_ascii=False).encode("utf-8"))
+    with open(args.out, "wb") as f:
+        f.write(payload)
+    print(f"{len(entries)} entries -> {args.out} ({len(payload)} bytes)")
+
+    if args.upload_bucket:
+        import boto3
+        key = f"geo/{args.city}/gazetteer.json.gz"
+        boto3.client("s3").put_object(Bucket=args.upload_bucket, Key=key, Body=payload)
+        print(f"Uploaded to s3://{args.upload_bucket}/{key}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,702 @@
+"""
+Fakes AWS en mémoire pour exécuter les handlers de infra/lambda hors ligne.
+
+Les handlers créent leurs clients boto3 à l'import. Deux façons d'y substituer ces fakes :
+  - après import, remplacer leurs attributs module (`table`, `signals_table`,
+    `s3_client`, `textract`, `bedrock`...) — tools/bench_handlers.py ;
+  - avant import, FakeBoto3.install() redirige boto3.client / boto3.resource —
+    tools/local_runtime.py (pipeline complet, y compris les clients créés à la demande).
+
+Chaque appel passe par FakeAWS.call(service, op), qui injecte la latence configurée
+(secondes, fixe + gigue) — pour simuler un aller-retour DynamoDB/S3/Bedrock réaliste —
+et le throttling : probabilité d'échec (`throttle`) et/ou débit max par seconde
+(`rate`, seau à jetons), avec le code d'erreur que renvoie le vrai service.
+
+Sous-ensemble DynamoDB couvert : get/put/update/delete_item, query (table et GSI),
+scan, batch_writer, batch_get_item ; mises à jour SET / ADD ; expressions simples (=, <, <=, >, >=, begins_with,
+attribute_exists / attribute_not_exists, AND/OR) sous forme de chaîne ou d'objets
+boto3.dynamodb.conditions.
+"""
+import copy
+import json
+import random
+import re
+import threading
+import time
+from decimal import Decimal
+
+from botocore.exceptions import ClientError
+
+
+THROTTLE_CODES = {
+    "dynamodb": "ProvisionedThroughputExceededException",
+    "s3": "SlowDown",
+    "textract": "ProvisionedThroughputExceededException",
+    "bedrock": "ThrottlingException",
+}
+
+
+class FakeAWS:
+    """Registre de latence / throttling partagé par tous les fakes d'un run."""
+
+    def __init__(self, latency: dict = None, jitter: float = 0.0, seed: int = 0,
+                 throttle: dict = None, rate: dict = None):
+        # clés "service" ou "service.operation", ex. {"dynamodb": 0.004, "bedrock.converse": 1.5}
+        self.latency = dict(latency or {})
+        self.jitter = jitter
+        self.throttle = dict(throttle or {})  # probabilité, ex. {"bedrock": 0.05}
+        self.rate = dict(rate or {})          # appels/s, ex. {"textract": 2}
+        self.calls: dict[str, int] = {}
+        self.throttled: dict[str, int] = {}
+        self._buckets: dict[str, list] = {}   # clé -> [jetons, dernier remplissage]
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _lookup(self, table: dict, service: str, key: str, default=None):
+        return table.get(key, table.get(service, default))
+
+    def _over_rate(self, service: str, key: str, now: float) -> bool:
+        limit = self._lookup(self.rate, service, key)
+        if not limit:
+            return False
+        bucket_key = key if key in self.rate else service
+        tokens, last = self._buckets.get(bucket_key, [float(limit), now])
+        tokens = min(float(limit), tokens + (now - last) * limit)
+        if tokens < 1.0:
+            self._buckets[bucket_key] = [tokens, now]
+            return True
+        self._buckets[bucket_key] = [tokens - 1.0, now]
+        return False
+
+    def call(self, service: str, op: str, defer: bool = False) -> float:
+        """Compte l'appel, attend la latence (ou la retourne si defer) et lève le throttling."""
+        key = f"{service}.{op}"
+        with self._lock:
+            self.calls[key] = self.calls.get(key, 0) + 1
+            delay = self._lookup(self.latency, service, key, 0.0)
+            if delay and self.jitter:
+                delay *= 1 + self._rng.uniform(-self.jitter, self.jitter)
+            throttled = (self._rng.random() < self._lookup(self.throttle, service, key, 0.0)
+                         or self._over_rate(service, key, time.monotonic()))
+            if throttled:
+                self.throttled[key] = self.throttled.get(key, 0) + 1
+        if delay > 0 and not defer:
+            time.sleep(delay)
+        if throttled:
+            raise _client_error(THROTTLE_CODES.get(service, "ThrottlingException"), op, "Rate exceeded")
+        return delay
+
+
+def _client_error(code: str, op: str, message: str = ""):
+    return ClientError({"Error": {"Code": code, "Message": message or code}}, op)
+
+
+# --- Expressions DynamoDB -------------------------------------------------------
+
+_COMPARATORS = {
+    "=": lambda a, b: a == b,
+    "<>": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+}
+_CMP_RE = re.compile(r"^\s*([#\w.]+)\s*(=|<>|<=|>=|<|>)\s*(:\w+)\s*$")
+_FN_RE = re.compile(r"^\s*(attribute_exists|attribute_not_exists)\s*\(\s*([#\w.]+)\s*\)\s*$")
+_BEGINS_RE = re.compile(r"^\s*begins_with\s*\(\s*([#\w.]+)\s*,\s*(:\w+)\s*\)\s*$")
+_BETWEEN_RE = re.compile(r"^\s*([#\w.]+)\s+BETWEEN\s+(:\w+)\s+AND\s+(:\w+)\s*$", re.I)
+
+
+def _string_predicate(expr: str, names: dict, values: dict):
+    """Compile une expression chaîne simple en prédicat item -> bool."""
+    names = names or {}
+    values = values or {}
+
+    def attr(token):
+        return names.get(token, token)
+
+    or_parts = re.split(r"\s+OR\s+", expr, flags=re.I)
+    compiled = []
+    for part in or_parts:
+        ands = []
+        # BETWEEN contient un AND : le traiter avant le découpage
+        m = _BETWEEN_RE.match(part)
+        pieces = [part] if m else re.split(r"\s+AND\s+", part, flags=re.I)
+        for piece in pieces:
+            piece = piece.strip()
+            if (m := _BETWEEN_RE.match(piece)):
+                a, lo, hi = attr(m.group(1)), values[m.group(2)], values[m.group(3)]
+                ands.append(lambda it, a=a, lo=lo, hi=hi: it.get(a) is not None and lo <= it.get(a) <= hi)
+            elif (m := _CMP_RE.match(piece)):
+                a, op, v = attr(m.group(1)), m.group(2), values[m.group(3)]
+                ands.append(lambda it, a=a, op=op, v=v: _COMPARATORS[op](it.get(a), v))
+            elif (m := _FN_RE.match(piece)):
+                fn, a = m.group(1), attr(m.group(2))
+                if fn == "attribute_exists":
+                    ands.append(lambda it, a=a: a in it)
+                else:
+                    ands.append(lambda it, a=a: a not in it)
+            elif (m := _BEGINS_RE.match(piece)):
+                a, v = attr(m.group(1)), values[m.group(2)]
+                ands.append(lambda it, a=a, v=v: isinstance(it.get(a), str) and it[a].startswith(v))
+            else:
+                raise NotImplementedError(f"Fake DynamoDB: unsupported expression {piece!r}")
+        compiled.append(ands)
+    return lambda it: any(all(p(it) for p in ands) for ands in compiled)
+
+
+def _condition_predicate(cond):
+    """Prédicat depuis un objet boto3.dynamodb.conditions (Key/Attr)."""
+    name = type(cond).__name__
+    vals = cond._values
+    if name == "And":
+        left, right = _condition_predicate(vals[0]), _condition_predicate(vals[1])
+        return lambda it: left(it) and right(it)
+    if name == "Or":
+        left, right = _condition_predicate(vals[0]), _condition_predicate(vals[1])
+        return lambda it: left(it) or right(it)
+    if name == "Not":
+        inner = _condition_predicate(vals[0])
+        return lambda it: not inner(it)
+    attr_name = vals[0].name
+    if name == "AttributeExists":
+        return lambda it: attr_name in it
+    if name == "AttributeNotExists":
+        return lambda it: attr_name not in it
+    if name == "BeginsWith":
+        return lambda it: isinstance(it.get(attr_name), str) and it[attr_name].startswith(vals[1])
+    if name == "Between":
+        return lambda it: it.get(attr_name) is not None and vals[1] <= it[attr_name] <= vals[2]
+    ops = {"Equals": "=", "NotEquals": "<>", "LessThan": "<", "LessThanEquals": "<=",
+           "GreaterThan": ">", "GreaterThanEquals": ">="}
+    if name in ops:
+        cmp = _COMPARATORS[ops[name]]
+        return lambda it: cmp(it.get(attr_name), vals[1])
+    raise NotImplementedError(f"Fake DynamoDB: unsupported condition {name}")
+
+
+def _predicate(expr, names=None, values=None):
+    if expr is None:
+        return lambda it: True
+    if isinstance(expr, str):
+        return _string_predicate(expr, names, values)
+    return _condition_predicate(expr)
+
+
+def _split_top_level(expr: str) -> list:
+    """Découpe "a = :a, b = if_not_exists(b, :z) + :one" sur les virgules hors parenthèses."""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(expr):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(expr[start:i])
+            start = i + 1
+    parts.append(expr[start:])
+    return [p for p in parts if p.strip()]
+
+
+def _check_types(value):
+    if isinstance(value, float):
+        raise TypeError("Float types are not supported. Use Decimal types instead.")
+    if isinstance(value, dict):
+        for v in value.values():
+            _check_types(v)
+    elif isinstance(value, (list, tuple, set)):
+        for v in value:
+            _check_types(v)
+
+
+def _project(item: dict, projection: str, names: dict) -> dict:
+    if not projection:
+        return item
+    names = names or {}
+    keep = [names.get(a.strip(), a.strip()) for a in projection.split(",")]
+    return {k: item[k] for k in keep if k in item}
+
+
+# --- DynamoDB -------------------------------------------------------------------
+
+class FakeBatchWriter:
+    def __init__(self, table):
+        self.table = table
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def put_item(self, Item):
+        _check_types(Item)
+        self.pending.append(("put", Item))
+        if len(self.pending) >= 25:
+            self.flush()
+
+    def delete_item(self, Key):
+        self.pending.append(("delete", Key))
+        if len(self.pending) >= 25:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.table.aws.call("dynamodb", "batch_write_item")
+        for kind, payload in self.pending:
+            if kind == "put":
+                self.table._items[self.table._key(payload)] = copy.deepcopy(payload)
+            else:
+                self.table._items.pop(self.table._key(payload), None)
+        self.pending = []
+
+
+class FakeTable:
+    """Table DynamoDB en mémoire (clés hash/range, GSI optionnels)."""
+
+    def __init__(self, aws: FakeAWS, name: str, hash_key: str, range_key: str = None, indexes: dict = None):
+        self.aws = aws
+        self.name = name
+        self.table_name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indexes = indexes or {}  # {"ByIris": ("iris_id", "created_at")}
+        self._items: dict = {}
+        self._lock = threading.Lock()
+
+    def _key(self, item: dict):
+        return (item[self.hash_key], item.get(self.range_key) if self.range_key else None)
+
+    def seed(self, items):
+        """Charge des items sans latence ni comptage (préparation d'un benchmark)."""
+        for item in items:
+            self._items[self._key(item)] = copy.deepcopy(item)
+
+    def get_item(self, Key, ConsistentRead=False, ProjectionExpression=None, ExpressionAttributeNames=None):
+        self.aws.call("dynamodb", "get_item")
+        item = self._items.get(self._key(Key))
+        if item is None:
+            return {}
+        return {"Item": _project(copy.deepcopy(item), ProjectionExpression, ExpressionAttributeNames)}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None):
+        self.aws.call("dynamodb", "put_item")
+        _check_types(Item)
+        with self._lock:
+            if ConditionExpression is not None:
+                current = self._items.get(self._key(Item), {})
+                if not _predicate(ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)(current):
+                    raise _client_error("ConditionalCheckFailedException", "PutItem")
+            self._items[self._key(Item)] = copy.deepcopy(Item)
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        self.aws.call("dynamodb", "delete_item")
+        self._items.pop(self._key(Key), None)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues="NONE"):
+        self.aws.call("dynamodb", "update_item")
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        with self._lock:
+            existing = self._items.get(self._key(Key))
+            # La condition porte sur l'item existant : attribute_not_exists(pk) passe s'il est absent
+            if ConditionExpression is not None and not _predicate(ConditionExpression, names, values)(existing or {}):
+                raise _client_error("ConditionalCheckFailedException", "UpdateItem")
+            current = copy.deepcopy(existing) if existing else dict(Key)
+            m = re.match(r"^\s*(?:SET\s+(.*?))?\s*(?:ADD\s+(.*))?$", UpdateExpression, re.I | re.S)
+            if not m or not (m.group(1) or m.group(2)):
+                raise NotImplementedError(f"Fake DynamoDB: unsupported update {UpdateExpression!r}")
+            for assignment in _split_top_level(m.group(1) or ""):
+                left, right = [p.strip() for p in assignment.split("=", 1)]
+                plus = re.match(r"^if_not_exists\(\s*([#\w]+)\s*,\s*(:\w+)\s*\)\s*(?:\+\s*(:\w+))?$", right)
+                if plus:
+                    base = current.get(names.get(plus.group(1), plus.group(1)), values[plus.group(2)])
+                    current[names.get(left, left)] = base + values[plus.group(3)] if plus.group(3) else base
+                else:
+                    current[names.get(left, left)] = values[right]
+            for addition in _split_top_level(m.group(2) or ""):
+                attr_name, value = addition.split()
+                attr_name = names.get(attr_name, attr_name)
+                current[attr_name] = current.get(attr_name, 0) + values[value]
+            _check_types(current)
+            self._items[self._key(Key)] = current
+        return {"Attributes": copy.deepcopy(current)} if ReturnValues == "ALL_NEW" else {}
+
+    def _paginate(self, rows, Limit, ExclusiveStartKey, key_fields):
+        start = 0
+        if ExclusiveStartKey:
+            marker = tuple(ExclusiveStartKey.get(k) for k in key_fields)
+            for i, row in enumerate(rows):
+                if tuple(row.get(k) for k in key_fields) == marker:
+                    start = i + 1
+                    break
+        page = rows[start:start + Limit] if Limit else rows[start:]
+        resp = {"Count": len(page), "ScannedCount": len(page)}
+        if Limit and start + Limit < len(rows):
+            last = page[-1]
+            resp["LastEvaluatedKey"] = {k: last[k] for k in key_fields if k in last}
+        return page, resp
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None, ProjectionExpression=None,
+              ExpressionAttributeNames=None, ExpressionAttributeValues=None, ScanIndexForward=True,
+              Limit=None, ExclusiveStartKey=None, ConsistentRead=False, Select=None):
+        self.aws.call("dynamodb", "query")
+        if IndexName:
+            hash_key, range_key = self.indexes[IndexName]
+        else:
+            hash_key, range_key = self.hash_key, self.range_key
+        key_pred = _predicate(KeyConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        rows = [it for it in self._items.values() if hash_key in it and key_pred(it)]
+        if range_key:
+            rows.sort(key=lambda it: (it.get(range_key) is None, it.get(range_key)), reverse=not ScanIndexForward)
+        key_fields = [k for k in (self.hash_key, self.range_key, hash_key, range_key) if k]
+        page, resp = self._paginate(rows, Limit, ExclusiveStartKey, list(dict.fromkeys(key_fields)))
+        filt = _predicate(FilterExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        resp["Items"] = [_project(copy.deepcopy(it), ProjectionExpression, ExpressionAttributeNames)
+                         for it in page if filt(it)]
+        resp["Count"] = len(resp["Items"])
+        return resp
+
+    def scan(self, FilterExpression=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+             ExpressionAttributeValues=None, Limit=None, ExclusiveStartKey=None, Segment=None, TotalSegments=None):
+        self.aws.call("dynamodb", "scan")
+        rows = sorted(self._items.values(), key=lambda it: (str(it.get(self.hash_key)), str(it.get(self.range_key))))
+        if TotalSegments:
+            rows = [r for r in rows if hash(str(r.get(self.hash_key))) % TotalSegments == Segment]
+        key_fields = [k for k in (self.hash_key, self.range_key) if k]
+        page, resp = self._paginate(rows, Limit or 1000, ExclusiveStartKey, key_fields)
+        filt = _predicate(FilterExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        resp["Items"] = [_project(copy.deepcopy(it), ProjectionExpression, ExpressionAttributeNames)
+                         for it in page if filt(it)]
+        resp["Count"] = len(resp["Items"])
+        return resp
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return FakeBatchWriter(self)
+
+
+class FakeDynamoResource:
+    def __init__(self, aws: FakeAWS):
+        self.aws = aws
+        self.tables: dict[str, FakeTable] = {}
+
+    def create_table(self, name: str, hash_key: str, range_key: str = None, indexes: dict = None) -> FakeTable:
+        self.tables[name] = FakeTable(self.aws, name, hash_key, range_key, indexes)
+        return self.tables[name]
+
+    def Table(self, name: str) -> FakeTable:
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems):
+        """Jusqu'à 100 clés ; renvoie toujours tout (pas d'UnprocessedKeys)."""
+        self.aws.call("dynamodb", "batch_get_item")
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.tables[name]
+            if len(request["Keys"]) > 100:
+                raise _client_error("ValidationException", "BatchGetItem", "Too many items requested")
+            found = (table._items.get(table._key(key)) for key in request["Keys"])
+            responses[name] = [
+                _project(copy.deepcopy(it), request.get("ProjectionExpression"), request.get("ExpressionAttributeNames"))
+                for it in found if it is not None
+            ]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+
+# --- S3 / Textract / Bedrock ------------------------------------------------------
+
+class _Body:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def read(self, amt=None):
+        data, self._data = (self._data, b"") if amt is None else (self._data[:amt], self._data[amt:])
+        return data
+
+    def iter_lines(self):
+        yield from self._data.splitlines()
+
+    def close(self):
+        self._data = b""
+
+
+class FakeS3:
+    def __init__(self, aws: FakeAWS):
+        self.aws = aws
+        self.objects: dict[tuple, bytes] = {}
+        self.uploads: dict[str, dict] = {}   # multipart en cours : upload_id -> {bucket, key, parts}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.aws.call("s3", "put_object")
+        self.objects[(Bucket, Key)] = Body.encode("utf-8") if isinstance(Body, str) else bytes(Body)
+        return {"ETag": f'"{hash(self.objects[(Bucket, Key)]) & 0xffffffff:x}"'}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self.aws.call("s3", "get_object")
+        if (Bucket, Key) not in self.objects:
+            raise _client_error("NoSuchKey", "GetObject", f"{Key} not found")
+        data = self.objects[(Bucket, Key)]
+        m = re.match(r"^bytes=(\d+)-(\d*)$", kwargs.get("Range") or "")
+        if m:
+            start = int(m.group(1))
+            end = min(int(m.group(2)) if m.group(2) else len(data) - 1, len(data) - 1)
+            if start >= len(data):
+                raise _client_error("InvalidRange", "GetObject", "The requested range is not satisfiable")
+            return {"Body": _Body(data[start:end + 1]), "ContentLength": end + 1 - start,
+                    "ContentRange": f"bytes {start}-{end}/{len(data)}"}
+        return {"Body": _Body(data), "ContentLength": len(data)}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self.aws.call("s3", "head_object")
+        if (Bucket, Key) not in self.objects:
+            raise _client_error("404", "HeadObject", "Not Found")
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None, MaxKeys=1000, **kwargs):
+        self.aws.call("s3", "list_objects_v2")
+        keys = sorted(k for b, k in self.objects if b == Bucket and k.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        resp = {"Contents": [{"Key": k, "Size": len(self.objects[(Bucket, k)])} for k in page], "KeyCount": len(page)}
+        if start + MaxKeys < len(keys):
+            resp["IsTruncated"] = True
+            resp["NextContinuationToken"] = str(start + MaxKeys)
+        return resp
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.aws.call("s3", "create_multipart_upload")
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {"bucket": Bucket, "key": Key, "parts": {}}
+        return {"Bucket": Bucket, "Key": Key, "UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self.aws.call("s3", "upload_part")
+        if UploadId not in self.uploads:
+            raise _client_error("NoSuchUpload", "UploadPart")
+        data = Body.encode("utf-8") if isinstance(Body, str) else bytes(Body)
+        self.uploads[UploadId]["parts"][PartNumber] = data
+        return {"ETag": f'"{hash(data) & 0xffffffff:x}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self.aws.call("s3", "complete_multipart_upload")
+        upload = self.uploads.pop(UploadId, None)
+        if upload is None:
+            raise _client_error("NoSuchUpload", "CompleteMultipartUpload")
+        numbers = [p["PartNumber"] for p in MultipartUpload["Parts"]]
+        if numbers != sorted(numbers):
+            raise _client_error("InvalidPartOrder", "CompleteMultipartUpload")
+        for n in numbers[:-1]:
+            if len(upload["parts"][n]) < 5 * 1024 * 1024:
+                raise _client_error("EntityTooSmall", "CompleteMultipartUpload")
+        self.objects[(Bucket, Key)] = b"".join(upload["parts"][n] for n in numbers)
+        return {"Bucket": Bucket, "Key": Key}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self.aws.call("s3", "abort_multipart_upload")
+        self.uploads.pop(UploadId, None)
+        return {}
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **kwargs):
+        params = Params or {}
+        return (f"https://{params.get('Bucket')}.s3.eu-west-3.amazonaws.com/{params.get('Key')}"
+                f"?X-Amz-Expires={ExpiresIn}&X-Amz-Signature=fake")
+
+
+class FakeStepFunctions:
+    """StartExecution enregistrée seulement ; l'exécution est pilotée par l'appelant (local_runtime)."""
+
+    def __init__(self, aws: FakeAWS):
+        self.aws = aws
+        self.executions: list[dict] = []
+
+    def start_execution(self, stateMachineArn, input="{}", name=None, **kwargs):
+        self.aws.call("stepfunctions", "start_execution")
+        if name and any(e["name"] == name for e in self.executions):
+            raise _client_error("ExecutionAlreadyExists", "StartExecution")
+        arn = f"{stateMachineArn.replace(':stateMachine:', ':execution:')}:{name or len(self.executions)}"
+        self.executions.append({"arn": arn, "name": name, "input": json.loads(input)})
+        return {"executionArn": arn, "startDate": time.time()}
+
+
+class FakeSQS:
+    """SendMessageBatch : messages conservés par file (10 entrées max, Id uniques)."""
+
+    def __init__(self, aws: FakeAWS):
+        self.aws = aws
+        self.messages: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.aws.call("sqs", "send_message_batch")
+        if not 1 <= len(Entries) <= 10:
+            raise _client_error("TooManyEntriesInBatchRequest", "SendMessageBatch")
+        if len({e["Id"] for e in Entries}) != len(Entries):
+            raise _client_error("BatchEntryIdsNotDistinct", "SendMessageBatch")
+        with self._lock:
+            queue = self.messages.setdefault(QueueUrl, [])
+            start = len(queue)
+            queue.extend(json.loads(e["MessageBody"]) for e in Entries)
+        return {"Successful": [{"Id": e["Id"], "MessageId": f"local-{start + k}"} for k, e in enumerate(Entries)],
+                "Failed": []}
+
+
+class FakeTextract:
+    """AnalyzeDocument : une ligne LINE par ligne de texte de l'objet S3 (pages de 50 lignes)."""
+
+    def __init__(self, aws: FakeAWS, s3: FakeS3, lines_per_page: int = 50):
+        self.aws = aws
+        self.s3 = s3
+        self.lines_per_page = lines_per_page
+
+    def analyze_document(self, Document, FeatureTypes=None):
+        self.aws.call("textract", "analyze_document")
+        loc = Document["S3Object"]
+        data = self.s3.objects.get((loc["Bucket"], loc["Name"]))
+        if data is None:
+            raise _client_error("InvalidS3ObjectException", "AnalyzeDocument")
+        if data[:5] == b"%PDF-":
+            raise _client_error("UnsupportedDocumentException", "AnalyzeDocument")
+        blocks = []
+        for i, line in enumerate(data.decode("utf-8", errors="replace").splitlines()):
+            if line.strip():
+                blocks.append({"BlockType": "LINE", "Text": line.strip(), "Page": i // self.lines_per_page + 1})
+        return {"Blocks": blocks}
+
+
+class FakeBedrock:
+    """
+    Converse / ConverseStream : signaux JSON déterministes dérivés du texte du prompt.
+    `bad_json` : probabilité d'une réponse précédée de prose (JSON invalide dès le 1er token).
+    En streaming, 25 % de la latence précède le 1er fragment, le reste est réparti entre
+    les fragments de STREAM_CHUNK caractères.
+    """
+
+    STREAM_CHUNK = 48
+
+    KEYWORDS = [
+        ("permis", "permit"), ("zonage", "zoning"), ("plu", "zoning"), ("tramway", "infrastructure"),
+        ("metro", "infrastructure"), ("gare", "infrastructure"), ("renovation", "renovation"),
+        ("commerce", "commercial"),
+    ]
+
+    def __init__(self, aws: FakeAWS, bad_json: float = 0.0, seed: int = 0):
+        self.aws = aws
+        self.bad_json = bad_json
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _response_text(self, prompt: str) -> str:
+        text = prompt.lower()
+        signals = []
+        for word, kind in self.KEYWORDS:
+            idx = text.find(word)
+            if idx >= 0:
+                signals.append({
+                    "type": kind,
+                    "description": f"Mention de '{word}' dans le document",
+                    "impact": "positive",
+                    "confidence": 0.7,
+                    "location_hint": "quartier Batignolles",
+                    "evidence_span": prompt[idx:idx + 80],
+                })
+        out = json.dumps({"signals": signals, "summary": "Document municipal (fake)", "signal_count": len(signals)},
+                         ensure_ascii=False)
+        with self._lock:
+            bad = self._rng.random() < self.bad_json
+        return "Voici les signaux extraits du document :\n" + out if bad else out
+
+    def converse(self, modelId, messages, inferenceConfig=None, **kwargs):
+        self.aws.call("bedrock", "converse")
+        prompt = messages[-1]["content"][0]["text"]
+        out = self._response_text(prompt)
+        return {
+            "output": {"message": {"role": "assistant", "content": [{"text": out}]}},
+            "usage": {"inputTokens": len(prompt) // 4, "outputTokens": len(out) // 4},
+            "stopReason": "end_turn",
+        }
+
+    def converse_stream(self, modelId, messages, inferenceConfig=None, **kwargs):
+        delay = self.aws.call("bedrock", "converse_stream", defer=True)
+        prompt = messages[-1]["content"][0]["text"]
+        return {"stream": _FakeEventStream(prompt, self._response_text(prompt), delay, self.STREAM_CHUNK)}
+
+
+class _FakeEventStream:
+    """Itérable d'événements ConverseStream ; close() arrête l'itération (comme EventStream.close)."""
+
+    def __init__(self, prompt: str, out: str, delay: float, chunk: int):
+        self.prompt, self.out, self.delay, self.chunk = prompt, out, delay, chunk
+        self.closed = False
+
+    def __iter__(self):
+        chunks = [self.out[i:i + self.chunk] for i in range(0, len(self.out), self.chunk)] or [""]
+        if self.delay:
+            time.sleep(self.delay * 0.25)
+        yield {"messageStart": {"role": "assistant"}}
+        for text in chunks:
+            if self.closed:
+                return
+            if self.delay:
+                time.sleep(self.delay * 0.75 / len(chunks))
+            yield {"contentBlockDelta": {"delta": {"text": text}, "contentBlockIndex": 0}}
+        yield {"contentBlockStop": {"contentBlockIndex": 0}}
+        yield {"messageStop": {"stopReason": "end_turn"}}
+        yield {"metadata": {"usage": {"inputTokens": len(self.prompt) // 4, "outputTokens": len(self.out) // 4},
+                            "metrics": {"latencyMs": int(self.delay * 1000)}}}
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBoto3:
+    """
+    Remplaçants de boto3.client / boto3.resource : à installer AVANT l'import des
+    handlers, pour que les clients créés au chargement du module soient déjà des fakes.
+    """
+
+    def __init__(self, aws: FakeAWS, bad_json: float = 0.0):
+        self.aws = aws
+        self.dynamodb = FakeDynamoResource(aws)
+        self.s3 = FakeS3(aws)
+        self.textract = FakeTextract(aws, self.s3)
+        self.bedrock = FakeBedrock(aws, bad_json)
+        self.stepfunctions = FakeStepFunctions(aws)
+        self.sqs = FakeSQS(aws)
+
+    def client(self, service_name, *args, **kwargs):
+        clients = {"s3": self.s3, "textract": self.textract, "bedrock-runtime": self.bedrock,
+                   "stepfunctions": self.stepfunctions, "sqs": self.sqs}
+        if service_name not in clients:
+            raise NotImplementedError(f"No fake for boto3 client {service_name!r}")
+        return clients[service_name]
+
+    def resource(self, service_name, *args, **kwargs):
+        if service_name != "dynamodb":
+            raise NotImplementedError(f"No fake for boto3 resource {service_name!r}")
+        return self.dynamodb
+
+    def install(self):
+        """Redirige boto3.client / boto3.resource vers les fakes ; retourne une fonction de restauration."""
+        import boto3
+        saved = (boto3.client, boto3.resource)
+        boto3.client, boto3.resource = self.client, self.resource
+
+        def restore():
+            boto3.client, boto3.resource = saved
+        return restore
+
+
+def to_dynamo(value):
+    """float -> Decimal récursif (comme il faut le faire avant un put_item boto3)."""
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [to_dynamo(v) for v in value]
+    return value
@@ -0,0 +1,197 @@
+"""
+Générateur de charge pour /score et /explain (serveur local tools/local_api.py ou
+endpoint déployé).
+
+Boucle ouverte : les requêtes partent à un rythme fixe (--rps) quel que soit le temps
+de réponse, et la latence est mesurée depuis l'instant prévu d'envoi — un serveur
+saturé se voit dans les percentiles au lieu de ralentir le générateur.
+
+Distributions de coordonnées :
+  uniform   uniforme sur l'emprise de Paris intra-muros
+  hotspot   --hot-fraction des requêtes autour de quelques points chauds (gaussienne,
+            --hot-sigma en degrés), le reste uniforme — proche d'un trafic réel où
+            quelques quartiers concentrent les recherches
+
+Les réponses sont lues sans décompression : bytes_mean est la taille sur le fil
+(--accept-encoding "" pour comparer avec des réponses non compressées).
+
+Usage :
+  python tools/loadgen.py --url http://127.0.0.1:8080 --rps 200 --duration 30 \\
+      --mix score=0.8,explain=0.2 --distribution hotspot
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_handlers import PARIS_BBOX
+from trace_report import percentile
+
+# Points chauds par défaut : Châtelet, Batignolles, Bercy, La Défense (limite ouest), Belleville
+HOT_SPOTS = [
+    (48.8584, 2.3470),
+    (48.8872, 2.3170),
+    (48.8352, 2.3857),
+    (48.8920, 2.2360),
+    (48.8722, 2.3768),
+]
+
+
+class CoordinateSampler:
+    def __init__(self, distribution: str, hot_fraction: float, hot_sigma: float, seed: int):
+        self.distribution = distribution
+        self.hot_fraction = hot_fraction
+        self.hot_sigma = hot_sigma
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample(self) -> tuple[float, float]:
+        lat_min, lat_max, lng_min, lng_max = PARIS_BBOX
+        with self.lock:
+            if self.distribution == "hotspot" and self.rng.random() < self.hot_fraction:
+                lat0, lng0 = self.rng.choice(HOT_SPOTS)
+                lat = min(max(self.rng.gauss(lat0, self.hot_sigma), lat_min), lat_max)
+                lng = min(max(self.rng.gauss(lng0, self.hot_sigma), lng_min), lng_max)
+            else:
+                lat = self.rng.uniform(lat_min, lat_max)
+                lng = self.rng.uniform(lng_min, lng_max)
+        return round(lat, 6), round(lng, 6)
+
+
+def parse_mix(spec: str) -> list[tuple[str, float]]:
+    mix = []
+    for part in spec.split(","):
+        route, _, weight = part.partition("=")
+        mix.append((route.strip().lstrip("/"), float(weight or 1)))
+    return mix
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: dict[str, list] = {}
+        self.bytes: dict[str, list] = {}
+        self.statuses: dict[str, int] = {}
+        self.cold_starts = 0
+        self.containers = set()
+
+    def record(self, route: str, status, latency_ms: float, headers=None, size: int = 0):
+        with self.lock:
+            self.latencies.setdefault(route, []).append(latency_ms)
+            self.bytes.setdefault(route, []).append(size)
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+            if headers is not None:
+                if headers.get("X-Cold-Start") == "1":
+                    self.cold_starts += 1
+                if headers.get("X-Container-Id"):
+                    self.containers.add(headers["X-Container-Id"])
+
+
+def _fire(url: str, route: str, scheduled: float, timeout: float, results: Results, accept_encoding: str = ""):
+    status, headers, size = None, None, 0
+    request = urllib.request.Request(url, headers={"Accept-Encoding": accept_encoding} if accept_encoding else {})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as resp:
+            size = len(resp.read())
+            status, headers = resp.status, resp.headers
+    except urllib.error.HTTPError as e:
+        size = len(e.read())
+        status, headers = e.code, e.headers
+    except Exception as e:
+        status = type(e).__name__
+    results.record(route, status, (time.perf_counter() - scheduled) * 1000, headers, size)
+
+
+def run(base_url: str, rps: float, duration: float, mix: list, sampler: CoordinateSampler,
+        concurrency: int, timeout: float, seed: int, accept_encoding: str = "") -> tuple[Results, float, int]:
+    rng = random.Random(seed + 1)
+    routes, weights = zip(*mix)
+    results = Results()
+    total = int(rps * duration)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i in range(total):
+            scheduled = start + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            route = rng.choices(routes, weights)[0]
+            lat, lng = sampler.sample()
+            url = f"{base_url.rstrip('/')}/{route}?lat={lat}&lng={lng}"
+            pool.submit(_fire, url, route, scheduled, timeout, results, accept_encoding)
+    elapsed = time.perf_counter() - start
+    return results, elapsed, total
+
+
+def summarize(results: Results, elapsed: float, total: int) -> dict:
+    summary = {"requests": total, "elapsed_s": round(elapsed, 3), "throughput_rps": round(total / elapsed, 1),
+               "status_codes": dict(sorted(results.statuses.items())), "cold_starts": results.cold_starts,
+               "containers": len(results.containers), "routes": {}}
+    all_latencies = []
+    for route, values in sorted(results.latencies.items()):
+        all_latencies.extend(values)
+        summary["routes"][route] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p90_ms": round(percentile(values, 90), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(max(values), 2),
+            "bytes_mean": round(statistics.fmean(results.bytes[route]), 1),
+        }
+    if all_latencies:
+        summary["routes"]["ALL"] = {
+            "count": len(all_latencies),
+            "p50_ms": round(percentile(all_latencies, 50), 2),
+            "p90_ms": round(percentile(all_latencies, 90), 2),
+            "p99_ms": round(percentile(all_latencies, 99), 2),
+            "max_ms": round(max(all_latencies), 2),
+            "bytes_mean": round(statistics.fmean(b for v in results.bytes.values() for b in v), 1),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load generator for /score and /explain")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="API base URL")
+    parser.add_argument("--rps", type=float, default=50.0)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds")
+    parser.add_argument("--mix", default="score=0.8,explain=0.2", help="Route weights")
+    parser.add_argument("--distribution", choices=["uniform", "hotspot"], default="uniform")
+    parser.add_argument("--hot-fraction", type=float, default=0.8)
+    parser.add_argument("--hot-sigma", type=float, default=0.003, help="Hot-spot spread in degrees (~300 m)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Max in-flight requests")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--accept-encoding", default="gzip", help='Accept-Encoding header ("" for none)')
+    parser.add_argument("--out", help="Write the summary JSON here")
+    args = parser.parse_args()
+
+    sampler = CoordinateSampler(args.distribution, args.hot_fraction, args.hot_sigma, args.seed)
+    results, elapsed, total = run(args.url, args.rps, args.duration, parse_mix(args.mix), sampler,
+                                  args.concurrency, args.timeout, args.seed, args.accept_encoding)
+    summary = summarize(results, elapsed, total)
+
+    print(f"{total} requests in {elapsed:.1f}s — {summary['throughput_rps']} req/s "
+          f"(target {args.rps:g}), statuses {summary['status_codes']}")
+    if summary["containers"]:
+        print(f"containers {summary['containers']}, cold starts {summary['cold_starts']}")
+    print(f"{'route':<10} {'count':>7} {'p50_ms':>9} {'p90_ms':>9} {'p99_ms':>9} {'max_ms':>9} {'bytes':>8}")
+    for route, r in summary["routes"].items():
+        print(f"{route:<10} {r['count']:>7} {r['p50_ms']:>9.2f} {r['p90_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['max_ms']:>9.2f} {r['bytes_mean']:>8.0f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    if any(not code.startswith(("2", "4")) for code in results.statuses):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+API Gateway local — sert /score, /explain et /health en HTTP en invoquant les
+handlers de infra/lambda avec des events HTTP API payload v2.
+
+Deux modes :
+  --workers 0 (défaut)  handlers importés dans le processus du serveur, un seul
+                        « conteneur » partagé par tous les threads : une invocation à
+                        la fois, comme un conteneur Lambda (les requêtes concurrentes
+                        attendent leur tour).
+  --workers N           jusqu'à N processus workers, chacun émulant un conteneur
+                        Lambda : une requête à la fois, démarrage à froid (interpréteur
+                        neuf + import des handlers) au premier besoin, recyclage après
+                        --idle-timeout secondes sans requête (le suivant repart à froid).
+
+Par défaut les clients AWS sont les fakes de tools/fakes.py, pré-remplis comme pour
+bench_handlers (--latency pour simuler les allers-retours). --aws garde les vrais
+clients boto3 (SCORES_TABLE / SIGNALS_TABLE à définir dans l'environnement).
+
+Chaque réponse porte X-Container-Id, X-Cold-Start et X-Handler-Ms.
+
+Usage :
+  python tools/local_api.py --port 8080 --workers 4 --idle-timeout 60
+  curl 'http://127.0.0.1:8080/score?lat=48.8566&lng=2.3522'
+"""
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+if TOOLS_DIR not in sys.path:
+    sys.path.insert(0, TOOLS_DIR)
+
+from bench_handlers import BenchRuntime, LambdaContext, _setup_path_and_env, http_event, parse_latency  # noqa: E402
+
+ROUTES = {
+    "/score": "score_handler",
+    "/explain": "explain_handler",
+    "/health": "health_handler",
+}
+
+
+class Container:
+    """Handlers importés + clients (fakes ou réels) : l'état d'un conteneur Lambda."""
+
+    def __init__(self, use_fakes: bool, latency: dict, jitter: float, n_iris: int, emf: bool):
+        import importlib
+        t0 = time.perf_counter()
+        if not emf:
+            sys.stdout = open(os.devnull, "w")  # une ligne EMF par invocation sinon
+        _setup_path_and_env()
+        runtime = BenchRuntime(latency, jitter, n_iris) if use_fakes else None
+        self.handlers = {}
+        for route, module_name in ROUTES.items():
+            module = importlib.import_module(module_name)
+            if runtime:
+                runtime.patch(module)
+            self.handlers[route] = module.handler
+        if runtime and "cities" in sys.modules:
+            runtime.patch(sys.modules["cities"])
+        self.init_ms = (time.perf_counter() - t0) * 1000
+        self.invocations = 0
+
+    def invoke(self, route: str, event: dict) -> tuple[dict, float, bool]:
+        cold = self.invocations == 0
+        self.invocations += 1
+        t0 = time.perf_counter()
+        resp = self.handlers[route](event, LambdaContext())
+        return resp, (time.perf_counter() - t0) * 1000, cold
+
+
+def _worker_main(conn, *options):
+    """Boucle d'un processus worker : un conteneur, une requête à la fois."""
+    container = Container(*options)
+    conn.send(("ready", container.init_ms))
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            return
+        route, event = msg
+        try:
+            conn.send(("ok", container.invoke(route, event)))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+
+class Worker:
+    def __init__(self, ctx, worker_id: int, options: tuple):
+        self.id = worker_id
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, *options), daemon=True)
+        self.process.start()
+        self.init_ms = None
+        self.last_used = time.monotonic()
+        self.served = 0
+
+    def wait_ready(self):
+        status, init_ms = self.conn.recv()
+        self.init_ms = init_ms
+
+    def invoke(self, route: str, event: dict):
+        self.conn.send((route, event))
+        status, payload = self.conn.recv()
+        self.last_used = time.monotonic()
+        self.served += 1
+        if status == "error":
+            raise RuntimeError(payload)
+        return payload
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.kill()
+
+
+class WorkerPool:
+    """Conteneurs à la demande : réutilise un worker libre, sinon en démarre un (à froid)."""
+
+    def __init__(self, max_workers: int, idle_timeout: float, options: tuple):
+        self.ctx = multiprocessing.get_context("spawn")  # interpréteur neuf = vrai cold start
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        self.options = options
+        self.idle: list[Worker] = []
+        self.busy = 0
+        self.next_id = 0
+        self.cold_starts = 0
+        self.cond = threading.Condition()
+        threading.Thread(target=self._reaper, daemon=True).start()
+
+    def _acquire(self) -> tuple[Worker, bool]:
+        with self.cond:
+            while True:
+                if self.idle:
+                    worker = self.idle.pop()  # LIFO : les conteneurs chauds restent chauds
+                    self.busy += 1
+                    return worker, False
+                if self.busy + len(self.idle) < self.max_workers:
+                    self.busy += 1
+                    self.next_id += 1
+                    self.cold_starts += 1
+                    worker_id = self.next_id
+                    break
+                self.cond.wait()
+        try:
+            worker = Worker(self.ctx, worker_id, self.options)
+            worker.wait_ready()
+        except Exception:
+            with self.cond:
+                self.busy -= 1
+                self.cond.notify()
+            raise
+        return worker, True
+
+    def _release(self, worker: Worker, alive: bool = True):
+        with self.cond:
+            self.busy -= 1
+            if alive:
+                self.idle.append(worker)
+            self.cond.notify()
+        if not alive:
+            worker.stop()
+
+    def invoke(self, route: str, event: dict):
+        worker, spawned = self._acquire()
+        try:
+            resp, handler_ms, cold = worker.invoke(route, event)
+        except Exception:
+            self._release(worker, alive=False)
+            raise
+        self._release(worker)
+        init_ms = worker.init_ms if spawned else 0.0
+        return resp, handler_ms, cold, f"w{worker.id}", init_ms
+
+    def _reaper(self):
+        while True:
+            time.sleep(max(self.idle_timeout / 4, 0.5))
+            now = time.monotonic()
+            with self.cond:
+                expired = [w for w in self.idle if now - w.last_used > self.idle_timeout]
+                self.idle = [w for w in self.idle if w not in expired]
+            for worker in expired:
+                worker.stop()
+
+    def shutdown(self):
+        with self.cond:
+            workers, self.idle = self.idle, []
+        for worker in workers:
+            worker.stop()
+
+
+class InProcessBackend:
+    def __init__(self, options: tuple):
+        self.container = Container(*options)
+        self.cold_starts = 1
+        # metrics._current, reqlog._current et les compteurs du conteneur supposent une
+        # invocation à la fois
+        self.lock = threading.Lock()
+
+    def invoke(self, route: str, event: dict):
+        with self.lock:
+            resp, handler_ms, cold = self.container.invoke(route, event)
+        return resp, handler_ms, cold, "local", self.container.init_ms if cold else 0.0
+
+    def shutdown(self):
+        pass
+
+
+def make_request_handler(backend):
+    class ApiGatewayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, status: int, headers: dict, body: bytes):
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, str(v))
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if parts.path not in ROUTES:
+                self._send(404, {"Content-Type": "application/json"}, b'{"message":"Not Found"}')
+                return
+            # payload v2 : paramètres répétés joints par des virgules, en-têtes en minuscules
+            params = {}
+            for k, v in parse_qsl(parts.query, keep_blank_values=True):
+                params[k] = f"{params[k]},{v}" if k in params else v
+            headers = {k.lower(): v for k, v in self.headers.items()}
+            event = http_event(parts.path, params, headers=headers, raw_query=parts.query,
+                               source_ip=self.client_address[0])
+            t0 = time.perf_counter()
+            try:
+                resp, handler_ms, cold, container_id, init_ms = backend.invoke(parts.path, event)
+            except Exception as e:
+                self._send(502, {"Content-Type": "application/json"},
+                           json.dumps({"message": "Internal Server Error", "detail": str(e)}).encode())
+                return
+            body = resp.get("body") or ""
+            body = base64.b64decode(body) if resp.get("isBase64Encoded") else body.encode("utf-8")
+            out_headers = dict(resp.get("headers") or {})
+            out_headers.update({
+                "X-Container-Id": container_id,
+                "X-Cold-Start": "1" if cold else "0",
+                "X-Init-Ms": f"{init_ms:.1f}",
+                "X-Handler-Ms": f"{handler_ms:.3f}",
+                "X-Gateway-Ms": f"{(time.perf_counter() - t0) * 1000:.3f}",
+            })
+            self._send(int(resp.get("statusCode", 200)), out_headers, body)
+
+    return ApiGatewayHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP API (payload v2) in front of the Lambda handlers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=0, help="Max worker processes (0 = in-process)")
+    parser.add_argument("--idle-timeout", type=float, default=300.0, help="Recycle idle workers after N seconds")
+    parser.add_argument("--aws", action="store_true", help="Use real boto3 clients instead of fakes")
+    parser.add_argument("--latency", default="", help="Injected AWS latency for fakes, e.g. dynamodb=0.004")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--iris", type=int, default=1000, help="Seeded IRIS score items (fakes)")
+    parser.add_argument("--emf", action="store_true", help="Keep the handlers' EMF metric lines on stdout")
+    args = parser.parse_args()
+
+    options = (not args.aws, parse_latency(args.latency), args.jitter, args.iris, args.emf)
+    backend = WorkerPool(args.workers, args.idle_timeout, options) if args.workers > 0 else InProcessBackend(options)
+    server = ThreadingHTTPServer((args.host, args.port), make_request_handler(backend))
+    server.daemon_threads = True
+    mode = f"{args.workers} workers, idle timeout {args.idle_timeout:.0f}s" if args.workers > 0 else "in-process"
+    print(f"Listening on http://{args.host}:{args.port} ({mode}, {'AWS' if args.aws else 'fakes'})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        backend.shutdown()
+        print(f"cold starts: {backend.cold_starts}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""
+Runtime local — exécute le pipeline complet sans compte AWS.
+
+LocalRuntime installe les fakes de tools/fakes.py (S3, DynamoDB, Textract, Bedrock ;
+latence et throttling configurables) à la place de boto3.client / boto3.resource
+AVANT d'importer les handlers : les clients créés au chargement des modules (et ceux
+créés à la demande : gazetteer, profiling) sont donc des fakes.
+
+StepFunctionsDriver rejoue les machines à états de pren_lite_stack.py :
+  ingestion : StampExecution → ExtractText → StructureSignals
+  scoring   : ScoreAllIris → PublishScores
+  portfolio : ScorePortfolioChunk en boucle tant que "status" vaut "running", Catch
+              vers AbortPortfolioJob (run_portfolio : POST /jobs, boucle, GET /jobs/{job_id})
+Comme LambdaInvoke avec output_path="$.Payload", la sortie d'une étape (le dict
+retourné par le handler) est l'entrée de la suivante ; une exception du handler fait
+échouer l'exécution (States.TaskFailed).
+
+Usage :
+  python tools/local_runtime.py --corpus ./pdfs --concurrency 8 \\
+      --latency textract=0.8,bedrock=1.2,dynamodb=0.005 --throttle bedrock=0.05 \\
+      --gazetteer geo/gazetteer.json.gz --score --profile run.pstats
+  python tools/local_runtime.py --portfolio loans.csv --iris iris_centroids.csv
+"""
+import argparse
+import contextlib
+import cProfile
+import importlib
+import json
+import logging
+import os
+import pstats
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.join(TOOLS_DIR, "..", "infra", "lambda")
+for _path in (TOOLS_DIR, LAMBDA_DIR):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from bench_handlers import LambdaContext, http_event, parse_latency  # noqa: E402
+from fakes import FakeAWS, FakeBoto3  # noqa: E402
+from trace_report import percentile  # noqa: E402
+
+LOCAL_ENV = {
+    "AWS_DEFAULT_REGION": "eu-west-3",
+    "AWS_ACCESS_KEY_ID": "local",
+    "AWS_SECRET_ACCESS_KEY": "local",
+    "SCORES_TABLE": "local-scores",
+    "SIGNALS_TABLE": "local-signals",
+    "RAW_BUCKET": "local-raw",
+    "ARTIFACTS_BUCKET": "local-artifacts",
+    "BEDROCK_CACHE_TABLE": "local-cache",
+    "RATE_LIMIT_TABLE": "local-cache",
+    "JOBS_TABLE": "local-jobs",
+    "PORTFOLIO_STATE_MACHINE_ARN": "arn:aws:states:eu-west-3:000000000000:stateMachine:local-portfolio",
+    "CHANGES_QUEUE_URL": "https://sqs.eu-west-3.amazonaws.com/000000000000/local-changes",
+}
+
+INGESTION_STATES = [("StampExecution", None), ("ExtractText", "textract"), ("StructureSignals", "bedrock")]
+SCORING_STATES = [("ScoreAllIris", "scoring"), ("PublishScores", "publish")]
+
+
+class LocalRuntime:
+    """Fakes AWS installés + handlers importés : l'équivalent local du stack déployé."""
+
+    def __init__(self, latency: dict = None, jitter: float = 0.0, throttle: dict = None,
+                 rate: dict = None, seed: int = 0, gazetteer_path: str = None, bad_json: float = 0.0):
+        self.aws = FakeAWS(latency, jitter, seed, throttle, rate)
+        self.boto3 = FakeBoto3(self.aws, bad_json)
+        self.scores = self.boto3.dynamodb.create_table(LOCAL_ENV["SCORES_TABLE"], "iris_id", "version")
+        self.signals = self.boto3.dynamodb.create_table(
+            LOCAL_ENV["SIGNALS_TABLE"], "pk", "sk", indexes={"ByIris": ("iris_id", "created_at")})
+        self.cache = self.boto3.dynamodb.create_table(LOCAL_ENV["BEDROCK_CACHE_TABLE"], "pk")
+        self.jobs = self.boto3.dynamodb.create_table(LOCAL_ENV["JOBS_TABLE"], "job_id")
+        self.s3 = self.boto3.s3
+        os.environ.update(LOCAL_ENV)
+        if gazetteer_path:
+            os.environ["GAZETTEER_PATH"] = gazetteer_path
+        self._restore = self.boto3.install()
+        self.modules = {}
+
+    def handler(self, name: str):
+        """Importe <name>_handler avec les fakes (rechargé s'il avait été importé avant l'installation)."""
+        if name not in self.modules:
+            module_name = f"{name}_handler"
+            if module_name in sys.modules:
+                module = importlib.reload(sys.modules[module_name])
+            else:
+                module = importlib.import_module(module_name)
+            self.modules[name] = module
+        return self.modules[name].handler
+
+    def invoke(self, name: str, event: dict) -> dict:
+        return self.handler(name)(event, LambdaContext())
+
+    def put_document(self, key: str, body: bytes, bucket: str = None):
+        self.s3.objects[(bucket or LOCAL_ENV["RAW_BUCKET"], key)] = body
+
+    def close(self):
+        self._restore()
+
+
+class StepFunctionsDriver:
+    """Exécute une chaîne d'états (Pass / LambdaInvoke) comme la machine à états déployée."""
+
+    def __init__(self, runtime: LocalRuntime, states: list):
+        self.runtime = runtime
+        self.states = states
+
+    def start_execution(self, payload: dict, name: str = None) -> dict:
+        name = name or str(uuid.uuid4())
+        started = datetime.now(timezone.utc)
+        history = []
+        status, error, state_input = "SUCCEEDED", None, payload
+        for state, handler_name in self.states:
+            t0 = time.perf_counter()
+            try:
+                if handler_name is None:
+                    # Pass StampExecution : result_path="$.execution"
+                    state_output = {**state_input, "execution": {"start": started.isoformat(), "name": name}}
+                else:
+                    state_output = self.runtime.invoke(handler_name, state_input)
+            except Exception as e:
+                status, error = "FAILED", {"state": state, "error": "States.TaskFailed", "cause": repr(e)}
+                history.append({"state": state, "ms": (time.perf_counter() - t0) * 1000})
+                break
+            history.append({"state": state, "ms": (time.perf_counter() - t0) * 1000,
+                            "status_code": state_output.get("statusCode")})
+            state_input = state_output
+        return {
+            "name": name,
+            "status": status,
+            "start": started.isoformat(),
+            "output": state_input if status == "SUCCEEDED" else None,
+            "error": error,
+            "history": history,
+        }
+
+
+def _doc_payload(key: str, city: str) -> dict:
+    stem = os.path.basename(key).lower()
+    doc_type = "zoning" if ("plu" in stem or "zon" in stem) else "permit" if "permis" in stem else "unknown"
+    return {"s3_bucket": LOCAL_ENV["RAW_BUCKET"], "s3_key": key, "doc_type": doc_type, "city": city,
+            "submitted_at": datetime.now(timezone.utc).isoformat()}
+
+
+def load_corpus(runtime: LocalRuntime, corpus: str) -> list[str]:
+    """Copie les PDF / .txt du dossier dans le bucket brut ; retourne les clés."""
+    keys = []
+    for root, _, files in os.walk(corpus):
+        for fname in sorted(files):
+            if not fname.lower().endswith((".pdf", ".txt")):
+                continue
+            path = os.path.join(root, fname)
+            key = "pdfs/" + os.path.relpath(path, corpus).replace(os.sep, "/")
+            with open(path, "rb") as f:
+                runtime.put_document(key, f.read())
+            keys.append(key)
+    return keys
+
+
+def _iris_universe(runtime: LocalRuntime, city: str, iris_csv: str = None) -> str:
+    """Clé S3 du CSV IRIS de la ville : fichier fourni, sinon les IRIS rencontrés dans les signaux."""
+    import cities  # après LOCAL_ENV (constantes lues à l'import)
+    if iris_csv:
+        with open(iris_csv, "rb") as f:
+            body = f.read()
+    else:
+        seen = sorted({it["iris_id"] for it in runtime.signals._items.values() if it.get("iris_id")})
+        body = ("iris_id,city,lat,lng\n" + "".join(f"{i},{city},,\n" for i in seen)).encode("utf-8")
+    key = cities.artifact_key(city, cities.IRIS_INDEX_NAME)
+    runtime.put_document(key, body, LOCAL_ENV["ARTIFACTS_BUCKET"])
+    return key
+
+
+def run_portfolio(runtime: LocalRuntime, csv_path: str, fmt: str = "csv") -> dict:
+    """Job de portefeuille de bout en bout : dépôt, POST /jobs, boucle de la machine à états, statut."""
+    with open(csv_path, "rb") as f:
+        runtime.put_document("portfolios/" + os.path.basename(csv_path), f.read())
+    submit = http_event("/jobs", {}, method="POST")
+    submit["body"] = json.dumps({"s3_key": "portfolios/" + os.path.basename(csv_path), "format": fmt})
+    resp = runtime.invoke("jobs", submit)
+    if resp["statusCode"] != 202:
+        raise RuntimeError(f"POST /jobs: {resp['statusCode']} {resp['body']}")
+    job_id = json.loads(resp["body"])["job_id"]
+
+    state, calls = runtime.boto3.stepfunctions.executions[-1]["input"], 0
+    while True:
+        try:
+            state = runtime.invoke("portfolio", state)
+        except Exception as e:
+            # Catch de ScorePortfolioChunk (result_path="$.error") puis AbortPortfolioJob
+            state = runtime.invoke("portfolio", {**state, "error": {"Error": type(e).__name__, "Cause": str(e)}})
+        calls += 1
+        if state["status"] != "running":
+            break
+    status = http_event(f"/jobs/{job_id}", {})
+    status["routeKey"] = "GET /jobs/{job_id}"
+    status["pathParameters"] = {"job_id": job_id}
+    status["headers"].pop("accept-encoding")
+    out = json.loads(runtime.invoke("jobs", status)["body"])
+    out["invocations"] = calls
+    return out
+
+
+def _state_summary(executions: list) -> list:
+    per_state = {}
+    for ex in executions:
+        for h in ex["history"]:
+            per_state.setdefault(h["state"], []).append(h["ms"])
+    return [(state, len(v), percentile(v, 50), percentile(v, 95), max(v)) for state, v in per_state.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ingestion (and scoring) pipeline offline")
+    parser.add_argument("--corpus", help="Directory of PDF / .txt documents")
+    parser.add_argument("--city", default="Paris")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent executions")
+    parser.add_argument("--repeat", type=int, default=1, help="Ingest the corpus N times (reruns, cache effects)")
+    parser.add_argument("--latency", default="", help="Injected latency (s), e.g. textract=0.8,bedrock=1.2")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--throttle", default="", help="Throttle probability, e.g. bedrock=0.05")
+    parser.add_argument("--rate", default="", help="Max calls per second, e.g. textract=2,bedrock=5")
+    parser.add_argument("--bad-json", type=float, default=0.0,
+                        help="Probability that Nova answers with prose before the JSON (stream abort + retry)")
+    parser.add_argument("--gazetteer", help="Local gazetteer artifact (GAZETTEER_PATH)")
+    parser.add_argument("--score", action="store_true", help="Then run ScoreAllIris → PublishScores (numpy)")
+    parser.add_argument("--iris", help="IRIS centroids CSV for scoring (default: IRIS seen in signals)")
+    parser.add_argument("--profile", help="cProfile the whole run into this .pstats file")
+    parser.add_argument("--emf", action="store_true", help="Keep the handlers' EMF metric lines on stdout")
+    parser.add_argument("--log-level", default="ERROR", help="Handler log lines shown on stderr")
+    parser.add_argument("--out", help="Write executions (NDJSON, one per document, trace_report-compatible)")
+    parser.add_argument("--portfolio", help="Only run a portfolio job on this CSV (id,lat,lng) against --iris")
+    parser.add_argument("--format", default="csv", choices=["csv", "ndjson"], help="Portfolio result format")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if not (args.corpus or args.portfolio):
+        parser.error("--corpus or --portfolio required")
+
+    # Les handlers mettent le logger racine à INFO : seul ce handler filtre ce qui s'affiche
+    log_handler = logging.StreamHandler()
+    log_handler.setLevel(args.log_level.upper())
+    log_handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    logging.getLogger().addHandler(log_handler)
+
+    runtime = LocalRuntime(parse_latency(args.latency), args.jitter, parse_latency(args.throttle),
+                           parse_latency(args.rate), args.seed, args.gazetteer, args.bad_json)
+    if args.portfolio:
+        # Univers IRIS de la ville, scores publiés sans signal, puis le job
+        sink = contextlib.nullcontext() if args.emf else contextlib.redirect_stdout(open(os.devnull, "w"))
+        with sink:
+            iris_key = _iris_universe(runtime, args.city, args.iris)
+            scoring = StepFunctionsDriver(runtime, SCORING_STATES).start_execution({"iris_key": iris_key, "city": args.city})
+            t0 = time.perf_counter()
+            job = run_portfolio(runtime, args.portfolio, args.format)
+            elapsed = time.perf_counter() - t0
+        print(f"scoring: {scoring['status']}")
+        print(f"portfolio job {job['job_id']}: {job['status']} — {job['rows_done']} rows ({job['rows_ok']} ok) "
+              f"in {elapsed:.2f}s over {job['invocations']} invocations, "
+              f"{job['rows_done'] / elapsed:,.0f} rows/s; result {job.get('result_key')}")
+        print(f"AWS calls: {dict(sorted(runtime.aws.calls.items()))}")
+        runtime.close()
+        return
+    keys = load_corpus(runtime, args.corpus)
+    if not keys:
+        parser.error(f"no .pdf/.txt under {args.corpus}")
+
+    ingestion = StepFunctionsDriver(runtime, INGESTION_STATES)
+    # Les documents tournent sur les threads du pool : un profiler par tâche (le profiler
+    # cProfile ne suit que le thread qui l'active), fusionnés à la fin avec pstats
+    profiles = []
+    sink = contextlib.nullcontext() if args.emf else contextlib.redirect_stdout(open(os.devnull, "w"))
+
+    def ingest(key):
+        if not args.profile:
+            return ingestion.start_execution(_doc_payload(key, args.city))
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return ingestion.start_execution(_doc_payload(key, args.city))
+        finally:
+            profiler.disable()
+            profiles.append(profiler)
+
+    with sink:
+        for name in ("textract", "bedrock"):
+            runtime.handler(name)  # imports hors du chronométrage (cold start mesuré à part)
+        pass_times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                executions = list(pool.map(ingest, keys))
+            pass_times.append(time.perf_counter() - t0)
+        ingest_s = pass_times[-1]
+
+        scoring_execution = None
+        if args.score:
+            profiler = cProfile.Profile() if args.profile else None
+            if profiler:
+                profiler.enable()
+            iris_key = _iris_universe(runtime, args.city, args.iris)
+            scoring_execution = StepFunctionsDriver(runtime, SCORING_STATES).start_execution({"iris_key": iris_key, "city": args.city})
+            if profiler:
+                profiler.disable()
+                profiles.append(profiler)
+        if profiles:
+            stats = pstats.Stats(profiles[0])
+            for profiler in profiles[1:]:
+                stats.add(profiler)
+            stats.dump_stats(args.profile)
+
+    failed = [ex for ex in executions if ex["status"] != "SUCCEEDED"]
+    handler_errors = [ex for ex in executions if ex["status"] == "SUCCEEDED" and ex["output"].get("statusCode") != 200]
+    stored = sum(json.loads(ex["output"]["body"]).get("signals_stored", 0)
+                 for ex in executions if ex["status"] == "SUCCEEDED" and ex["output"].get("statusCode") == 200)
+    totals = [sum(h["ms"] for h in ex["history"]) for ex in executions]
+
+    if len(pass_times) > 1:
+        print("passes: " + ", ".join(f"{t:.2f}s" for t in pass_times) + " (stats below: last pass)")
+    print(f"{len(keys)} documents in {ingest_s:.2f}s — {len(keys) / ingest_s:.2f} docs/s "
+          f"(concurrency {args.concurrency}), {stored} signals stored")
+    print(f"executions: {len(executions) - len(failed)} succeeded, {len(failed)} failed, "
+          f"{len(handler_errors)} with a non-200 handler result")
+    print(f"{'state':<18} {'count':>6} {'p50_ms':>10} {'p95_ms':>10} {'max_ms':>10}")
+    for state, n, p50, p95, mx in _state_summary(executions):
+        print(f"{state:<18} {n:>6} {p50:>10.1f} {p95:>10.1f} {mx:>10.1f}")
+    print(f"{'EXECUTION':<18} {len(totals):>6} {statistics.median(totals):>10.1f} "
+          f"{percentile(totals, 95):>10.1f} {max(totals):>10.1f}")
+    print(f"AWS calls: {dict(sorted(runtime.aws.calls.items()))}")
+    if runtime.aws.throttled:
+        print(f"throttled: {dict(sorted(runtime.aws.throttled.items()))}")
+    if scoring_execution:
+        out = scoring_execution["output"] or {}
+        print(f"scoring: {scoring_execution['status']} "
+              f"{out.get('body') if out else scoring_execution['error']}")
+        for h in scoring_execution["history"]:
+            print(f"  {h['state']:<16} {h['ms']:>10.1f} ms")
+    if args.profile:
+        print(f"profile written to {args.profile} (python -m pstats {args.profile})")
+
+    if args.out:
+        # champ "trace" au premier niveau : lisible par tools/trace_report.py --file
+        with open(args.out, "w", encoding="utf-8") as f:
+            for ex in executions:
+                body = (ex["output"] or {}).get("body")
+                trace = json.loads(body).get("trace") if isinstance(body, str) else None
+                f.write(json.dumps({**ex, "trace": trace} if trace else ex) + "\n")
+    runtime.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Résumé p50/p95 par étape des traces par document (voir infra/lambda/tracing.py).
+
+Sources :
+  --table <PrenSignalsTable> [--run-id <execution>]   items sk=TRACE
+  --file traces.ndjson                                 une trace JSON par ligne
+                                                       (champ "trace" des sorties Step Functions)
+
+Pour chaque étape, les spans d'un document sont sommés (ex. extract_page = toutes les
+pages), puis les percentiles sont calculés sur les documents du run.
+
+Usage :
+  python tools/trace_report.py --table PrenLiteStack-PrenSignalsTable... --run-id <exec-name>
+"""
+import argparse
+import json
+import math
+
+
+def percentile(values, q):
+    """Percentile par rang le plus proche (q entre 0 et 100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def stage_totals(trace: dict) -> dict:
+    totals = {}
+    for span in trace.get("spans", []):
+        totals[span["stage"]] = totals.get(span["stage"], 0.0) + float(span["ms"])
+    return totals
+
+
+def load_from_table(table_name: str, run_id: str = None) -> list:
+    import boto3
+    from boto3.dynamodb.conditions import Attr
+    table = boto3.resource("dynamodb").Table(table_name)
+    condition = Attr("sk").eq("TRACE")
+    if run_id:
+        condition = condition & Attr("run_id").eq(run_id)
+    kwargs = {"FilterExpression": condition, "ProjectionExpression": "#t", "ExpressionAttributeNames": {"#t": "trace"}}
+    traces = []
+    while True:
+        resp = table.scan(**kwargs)
+        traces.extend(json.loads(it["trace"]) for it in resp.get("Items", []))
+        if "LastEvaluatedKey" not in resp:
+            return traces
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def load_from_file(path: str, run_id: str = None) -> list:
+    traces = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            doc = json.loads(line)
+            trace = doc.get("trace", doc)
+            if run_id and trace.get("run_id") != run_id:
+                continue
+            traces.append(trace)
+    return traces
+
+
+def summarize(traces: list) -> list:
+    per_stage = {}
+    end_to_end = []
+    for trace in traces:
+        totals = stage_totals(trace)
+        for stage, ms in totals.items():
+            per_stage.setdefault(stage, []).append(ms)
+        end_to_end.append(sum(totals.values()))
+    rows = [
+        (stage, len(v), percentile(v, 50), percentile(v, 95), max(v))
+        for stage, v in sorted(per_stage.items(), key=lambda kv: -percentile(kv[1], 95))
+    ]
+    if end_to_end:
+        rows.append(("TOTAL", len(end_to_end), percentile(end_to_end, 50), percentile(end_to_end, 95), max(end_to_end)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage p50/p95 across document traces")
+    parser.add_argument("--table", help="PrenSignalsTable name")
+    parser.add_argument("--file", help="NDJSON file of traces")
+    parser.add_argument("--run-id", help="Only traces of this Step Functions execution")
+    args = parser.parse_args()
+
+    if args.file:
+        traces = load_from_file(args.file, args.run_id)
+    elif args.table:
+        traces = load_from_table(args.table, args.run_id)
+    else:
+        parser.error("--table or --file required")
+
+    print(f"{len(traces)} documents")
+    print(f"{'stage':<20} {'docs':>6} {'p50_ms':>10} {'p95_ms':>10} {'max_ms':>10}")
+    for stage, n, p50, p95, mx in summarize(traces):
+        print(f"{stage:<20} {n:>6} {p50:>10.1f} {p95:>10.1f} {mx:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()